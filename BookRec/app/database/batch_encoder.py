@@ -0,0 +1,111 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class BatchEncoder:
+    """
+    Shared encoder worker that micro-batches concurrent encode requests.
+
+    Callers from any thread call encode(text); a single background thread collects the
+    requests that arrive within batch_window_ms (up to max_batch_size) and runs them through
+    encode_fn as one batch, then hands each caller its own vector. One batched forward pass
+    is much cheaper than N single-sentence passes on a multi-core CPU.
+    """
+
+    def __init__(self, encode_fn, max_batch_size=32, batch_window_ms=5.0):
+        """
+        Parameters:
+        - encode_fn: function taking a list of strings and returning an array of vectors
+          (e.g. SentenceTransformer.encode)
+        - max_batch_size: maximum number of texts encoded in one call
+        - batch_window_ms: how long to wait for more requests after the first one arrives
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window_ms / 1000.0
+
+        self.batches = 0
+        self.encoded = 0
+
+        self._requests = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="batch-encoder", daemon=True)
+        self._worker.start()
+
+    def submit(self, text):
+        """Queue text for encoding and return a Future that resolves to its vector"""
+        future = Future()
+        with self._lock:
+            if self._stopped.is_set():
+                raise RuntimeError("BatchEncoder is closed")
+            self._requests.put((text, future))
+        return future
+
+    def encode(self, text, timeout=None):
+        """Encode a single text through the shared batch and wait for its vector"""
+        return self.submit(text).result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until the window closes or the batch is full"""
+        first = self._requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopped.set()
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if batch is None:
+                break
+            texts = [text for text, _ in batch]
+            try:
+                vectors = np.asarray(self.encode_fn(texts))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.encoded += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+        # Fail anything still waiting so callers never hang after close()
+        while True:
+            try:
+                item = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("BatchEncoder is closed"))
+
+    def close(self):
+        """Stop the worker thread after the current batch"""
+        with self._lock:
+            self._stopped.set()
+            self._requests.put(None)
+        self._worker.join(timeout=5)
+
+    def stats(self):
+        """Return batch counters for the debug panel"""
+        return {
+            "batches": self.batches,
+            "encoded": self.encoded,
+            "mean_batch_size": round(self.encoded / self.batches, 2) if self.batches else 0.0
+        }
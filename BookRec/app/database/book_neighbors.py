@@ -0,0 +1,364 @@
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Multipliers of the vector fingerprints (fixed, so fingerprints from different runs compare)
+_FINGERPRINT_MIXERS = np.random.default_rng(20240601).integers(1, 2 ** 63, 4096, dtype=np.uint64) | np.uint64(1)
+
+
+class BookNeighborTable:
+    """
+    Precomputed "more like this" table: the top-K most similar books (cosine similarity of their
+    embeddings, the collection's distance) of every point in the books collection.
+
+    Flat arrays, all memory-mappable:
+      - ids: int64 point ids, one per row, ascending
+      - positions: int32 row of every point id (indexed by the id itself, -1 for unknown ids),
+        so a lookup is a single array access
+      - neighbors: int32 (rows, K) point ids of the neighbours, most similar first, -1 padded
+      - scores: float16 (rows, K) their cosine similarity
+      - fingerprints: uint64 hash of every row's vector, used by refresh() to find changed books
+
+    build() scores the whole collection with blocked matrix products spread over all cores;
+    refresh() recomputes only the rows that new, changed or removed books can affect.
+    """
+
+    ARRAYS = ("ids", "positions", "neighbors", "scores", "fingerprints")
+
+    def __init__(self, ids, positions, neighbors, scores, fingerprints):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.positions = np.asarray(positions, dtype=np.int32)
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)
+        self.scores = np.asarray(scores, dtype=np.float16)
+        self.fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        # Version directory the table was loaded from or saved to (see save())
+        self.version = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def k(self):
+        return self.neighbors.shape[1]
+
+    @classmethod
+    def build(cls, ids, vectors, k=50, max_block_bytes=64 * 2 ** 20, workers=None, log=print):
+        """
+        Build the table from point ids and their vectors.
+
+        Parameters:
+        - ids: non-negative integer point ids
+        - vectors: (len(ids), dim) embeddings; they are L2-normalized here
+        - k: neighbours kept per book
+        - max_block_bytes: memory of the similarity block each worker scores at a time
+        - workers: threads scoring blocks in parallel (default: all cores)
+
+        Returns:
+        - BookNeighborTable
+        """
+        ids, vectors = _prepare(ids, vectors)
+        start = time.perf_counter()
+        neighbors, scores = _top_k(vectors, vectors, ids, k, self_cols=np.arange(len(ids)),
+                                   max_block_bytes=max_block_bytes, workers=workers)
+        log(f"Scored {len(ids)} books against each other ({time.perf_counter() - start:.1f}s)")
+        return cls(ids, _positions(ids), neighbors, scores, _fingerprints(vectors))
+
+    def refresh(self, ids, vectors, min_depth=None, max_block_bytes=64 * 2 ** 20, workers=None, log=print):
+        """
+        Return the table for the collection's current ids and vectors (e.g. after an upsert),
+        reusing the rows of this one where possible:
+          - new and changed books are scored against the whole collection
+          - every other book drops the changed and removed books from its list and merges in
+            the changed books that score at least as high as its old K-th neighbour. The merged
+            list is exact down to that score, so a book that lost neighbours keeps a shorter list
+            (and lookups beyond it go to the live search) until it falls under min_depth
+            (default K/2) neighbours, when it is scored against the whole collection too
+        Returns (table, stats); the table is self when nothing changed.
+        """
+        min_depth = self.k // 2 if min_depth is None else min_depth
+        ids, vectors = _prepare(ids, vectors)
+        fingerprints = _fingerprints(vectors)
+        old_rows = np.full(len(ids), -1, dtype=np.int64)
+        in_range = ids < len(self.positions)
+        old_rows[in_range] = self.positions[ids[in_range]]
+        unchanged = old_rows >= 0
+        unchanged[unchanged] = self.fingerprints[old_rows[unchanged]] == fingerprints[unchanged]
+
+        changed = np.flatnonzero(~unchanged)
+        removed = np.setdiff1d(self.ids, ids, assume_unique=True)
+        stats = {"books": len(ids), "changed": len(changed), "removed": len(removed), "rescored": 0, "merged": 0}
+        if not len(changed) and not len(removed):
+            return self, stats
+
+        start = time.perf_counter()
+        neighbors = np.empty((len(ids), self.k), dtype=np.int32)
+        scores = np.empty((len(ids), self.k), dtype=np.float16)
+        merge = np.flatnonzero(unchanged)
+        if len(merge):
+            prior_ids = np.array(self.neighbors[old_rows[merge]])
+            prior_scores = np.array(self.scores[old_rows[merge]])
+            # Scores of changed books below the old last neighbour's are not comparable with the
+            # unchanged books that were cut off there
+            depth = (prior_ids >= 0).sum(axis=1)
+            floor = np.where(depth > 0, prior_scores[np.arange(len(merge)), np.maximum(depth - 1, 0)], -np.inf)
+            stale = np.isin(prior_ids, np.concatenate([ids[changed], removed]))
+            prior_ids[stale], prior_scores[stale] = -1, -np.inf
+            if len(changed):
+                neighbors[merge], scores[merge] = _top_k(
+                    vectors[merge], vectors[changed], ids[changed], self.k, prior=(prior_ids, prior_scores),
+                    floor=floor, max_block_bytes=max_block_bytes, workers=workers)
+            else:
+                order = np.argsort(-prior_scores.astype(np.float32), axis=1, kind="stable")
+                neighbors[merge] = np.take_along_axis(prior_ids, order, axis=1)
+                scores[merge] = np.take_along_axis(prior_scores, order, axis=1)
+
+        shallow = merge[(neighbors[merge] >= 0).sum(axis=1) < min(min_depth, len(ids) - 1)]
+        rescore = np.union1d(changed, shallow)
+        if len(rescore):
+            neighbors[rescore], scores[rescore] = _top_k(
+                vectors[rescore], vectors, ids, self.k, self_cols=rescore,
+                max_block_bytes=max_block_bytes, workers=workers)
+
+        stats.update(rescored=len(rescore), merged=len(merge) - len(shallow), seconds=time.perf_counter() - start)
+        log(f"Refreshed neighbour table: {len(changed)} new or changed, {len(removed)} removed, "
+            f"{stats['rescored']} rows rescored, {stats['merged']} merged ({stats['seconds']:.1f}s)")
+        return BookNeighborTable(ids, _positions(ids), neighbors, scores, fingerprints), stats
+
+    def save(self, path):
+        """
+        Save the table as one .npy file per array in a new version directory inside path, then
+        point path/CURRENT at it with an atomic rename. Readers see either the old or the new
+        table, never a mix, and processes that have the old one memory-mapped keep reading it.
+        Versions older than the one replaced are removed.
+        """
+        os.makedirs(path, exist_ok=True)
+        previous = self.current_version(path)
+        version = f"v{time.time_ns()}-{os.getpid()}"
+        tmp_dir = os.path.join(path, f".{version}.tmp")
+        os.makedirs(tmp_dir)
+        for name in self.ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), getattr(self, name))
+        os.rename(tmp_dir, os.path.join(path, version))
+
+        tmp_pointer = os.path.join(path, f".CURRENT.{version}.tmp")
+        with open(tmp_pointer, "w") as f:
+            f.write(version)
+        os.replace(tmp_pointer, os.path.join(path, "CURRENT"))
+        self.version = version
+
+        for entry in os.listdir(path):
+            if entry.startswith("v") and entry not in (version, previous):
+                shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+        for name in self.ARRAYS:
+            # Flat layout of tables saved before versioning
+            legacy = os.path.join(path, f"{name}.npy")
+            if os.path.exists(legacy):
+                os.remove(legacy)
+
+    @staticmethod
+    def current_version(path):
+        """Version directory path/CURRENT points at, or None for a missing or unversioned table"""
+        try:
+            with open(os.path.join(path, "CURRENT")) as f:
+                return f.read().strip() or None
+        except (OSError, TypeError):
+            return None
+
+    @classmethod
+    def _array_dir(cls, path):
+        version = cls.current_version(path)
+        return (os.path.join(path, version) if version else path), version
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load the current version of a table saved with save(); with mmap=True the arrays are memory-mapped"""
+        array_dir, version = cls._array_dir(path)
+        arrays = [np.load(os.path.join(array_dir, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in cls.ARRAYS]
+        ids, _, neighbors, scores, fingerprints = arrays
+        if not len(ids) == len(neighbors) == len(scores) == len(fingerprints):
+            raise ValueError(f"Inconsistent neighbour table at {array_dir}")
+        table = cls(*arrays)
+        table.version = version
+        return table
+
+    @classmethod
+    def exists(cls, path):
+        if not path:
+            return False
+        array_dir, _ = cls._array_dir(path)
+        return all(os.path.exists(os.path.join(array_dir, f"{name}.npy")) for name in cls.ARRAYS)
+
+    def row(self, point_id):
+        """Row of point_id, or None if it is not in the table"""
+        try:
+            point_id = int(point_id)
+        except (TypeError, ValueError):
+            return None
+        if 0 <= point_id < len(self.positions):
+            row = int(self.positions[point_id])
+            return row if row >= 0 else None
+        return None
+
+    def lookup(self, point_id, limit=5, exclude_ids=None):
+        """
+        Return [(point_id, score)] of the limit books most similar to point_id, like the live
+        search: the book itself first (score 1.0), skipping exclude_ids and scores below 0.
+        Returns None when the table cannot answer: point_id is unknown, or its list runs out
+        (after exclusions) before limit results while the book may have more neighbours.
+        """
+        row = self.row(point_id)
+        if row is None:
+            return None
+        neighbors = np.concatenate([[int(point_id)], self.neighbors[row]])
+        scores = np.concatenate([[1.0], np.asarray(self.scores[row], dtype=np.float32)])
+        # A negative score ends the live result list too; -1 padding only ends what the table knows
+        complete = bool(((neighbors >= 0) & (scores < 0)).any())
+        keep = (neighbors >= 0) & (scores >= 0)
+        if exclude_ids:
+            keep &= ~np.isin(neighbors, [int(i) for i in exclude_ids])
+        rows = np.flatnonzero(keep)[:limit]
+        if len(rows) < limit and not complete:
+            return None
+        return [(int(neighbors[i]), float(scores[i])) for i in rows]
+
+
+def _prepare(ids, vectors):
+    """Sort by point id and L2-normalize"""
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) and ids.min() < 0:
+        raise ValueError("point ids must be non-negative integers")
+    order = np.argsort(ids, kind="stable")
+    vectors = np.asarray(vectors, dtype=np.float32)[order]
+    vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    return ids[order], np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def _positions(ids):
+    positions = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int32)
+    positions[ids] = np.arange(len(ids), dtype=np.int32)
+    return positions
+
+
+def _fingerprints(vectors):
+    """uint64 hash of every row of a float32 matrix"""
+    words = vectors.view(np.uint32).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        return (words * _FINGERPRINT_MIXERS[:words.shape[1]]).sum(axis=1, dtype=np.uint64)
+
+
+def _top_k(queries, candidates, candidate_ids, k, self_cols=None, prior=None, floor=None,
+           max_block_bytes=64 * 2 ** 20, workers=None):
+    """
+    (neighbors, scores) of the k candidates most similar to each query row, from blocked
+    matrix products run by a thread pool (NumPy releases the GIL in both the product and the
+    partition). self_cols[i] is the candidate column of query i itself, which is skipped;
+    prior = (ids, scores) of lists to merge the candidates into, and candidates scoring below
+    floor[i] are left out of query i's list.
+    """
+    block = max(1, max_block_bytes // max(1, 4 * len(candidates)))
+    starts = range(0, len(queries), block)
+
+    def score_block(lo):
+        hi = min(lo + block, len(queries))
+        sims = queries[lo:hi] @ candidates.T
+        if self_cols is not None:
+            sims[np.arange(hi - lo), self_cols[lo:hi]] = -np.inf
+        if floor is not None:
+            sims[sims < floor[lo:hi, None]] = -np.inf
+        ids = np.broadcast_to(candidate_ids.astype(np.int32), sims.shape)
+        if prior is not None:
+            sims = np.hstack([np.asarray(prior[1][lo:hi], dtype=np.float32), sims])
+            ids = np.hstack([np.asarray(prior[0][lo:hi]), ids])
+        n = min(k, sims.shape[1])
+        top = np.argpartition(-sims, n - 1, axis=1)[:, :n] if n else np.empty((hi - lo, 0), dtype=np.int64)
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+        neighbors = np.full((hi - lo, k), -1, dtype=np.int32)
+        scores = np.full((hi - lo, k), -np.inf, dtype=np.float16)
+        valid = np.isfinite(top_scores)
+        neighbors[:, :n] = np.where(valid, np.take_along_axis(ids, top, axis=1), -1)
+        scores[:, :n] = top_scores
+        return neighbors, scores
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        parts = list(pool.map(score_block, starts))
+    if not parts:
+        return np.empty((0, k), dtype=np.int32), np.empty((0, k), dtype=np.float16)
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+def fetch_vectors(client, collection_name, batch_size=1000, log=print):
+    """Scroll a Qdrant collection and return (ids, vectors)"""
+    ids, vectors = [], []
+    next_offset = None
+    while True:
+        points, next_offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=next_offset,
+            with_payload=False,
+            with_vectors=True
+        )
+        ids.extend(int(p.id) for p in points)
+        vectors.extend(p.vector for p in points)
+        if not points or next_offset is None:
+            break
+    log(f"Fetched {len(ids)} vectors from '{collection_name}'")
+    return np.asarray(ids, dtype=np.int64), np.asarray(vectors, dtype=np.float32)
+
+
+def update_table(ids, vectors, path, k=None, full=False, log=print):
+    """
+    Build the table at path, or refresh the one already there (unless full=True or k differs
+    from its K; k=None keeps the existing K, 50 for a new table), and save it.
+    Returns the refresh stats ("books" and "rescored" rows for a full build).
+    """
+    if not full and BookNeighborTable.exists(path):
+        table = BookNeighborTable.load(path, mmap=False)
+        if k is None or table.k == k:
+            table, stats = table.refresh(ids, vectors, log=log)
+            table.save(path)
+            return stats
+        log(f"Existing table has K={table.k}; rebuilding with K={k}")
+    table = BookNeighborTable.build(ids, vectors, k=k or 50, log=log)
+    table.save(path)
+    return {"books": len(table), "rescored": len(table)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the book-to-book neighbour table")
+    parser.add_argument("--out", default=os.getenv("QDRANT_NEIGHBORS_PATH", "book_neighbors"), help="Output directory")
+    parser.add_argument("--k", type=int, help="neighbours kept per book (default: the existing table's, or 50)")
+    parser.add_argument("--snapshot", help="read the vectors from a local index snapshot (python -m database.local_index) "
+                                           "instead of the Qdrant collection")
+    parser.add_argument("--full", action="store_true", help="rebuild from scratch instead of refreshing")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.snapshot:
+        from database.local_index import LocalVectorIndex
+        index = LocalVectorIndex(args.snapshot)
+        ids, vectors = index.ids, np.asarray(index.vectors)
+    else:
+        from database.qdrant_connector import QdrantConnector
+        connector = QdrantConnector()
+        status, message = connector.connect_remote()
+        if not status:
+            print(message)
+            return
+        ids, vectors = fetch_vectors(connector.client, connector.collection_name)
+
+    stats = update_table(ids, vectors, args.out, k=args.k, full=args.full)
+    print(f"Saved neighbour table for {stats['books']} books to {args.out} ({stats['rescored']} rows scored) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from qdrant_client.http import models
+
+from database.book_neighbors import BookNeighborTable, fetch_vectors, update_table
+from database.payload_sync import filter_payload
+from database.table_files import iter_chunks
+
+# Model used by the encoder worker processes (set by _init_worker)
+_model = None
+
+
+def _init_worker(backend, model_name, onnx_model_dir, threads):
+    """Load the embedding model once per worker process"""
+    global _model
+    if backend in ("onnx", "onnx-int8"):
+        from database.onnx_encoder import OnnxSentenceEncoder
+        _model = OnnxSentenceEncoder(onnx_model_dir, quantized=backend == "onnx-int8", threads=threads)
+    else:
+        import torch
+        # Split the cores between the workers instead of every worker using all of them
+        torch.set_num_threads(threads)
+        from sentence_transformers import SentenceTransformer
+        _model = SentenceTransformer(model_name)
+
+
+def _encode(texts, batch_size):
+    return np.asarray(_model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+def content_hash(model_name, title, summary):
+    """Hash of everything that determines a book's point, stored in its payload as content_hash"""
+    return hashlib.sha1(f"{model_name}\x1f{title}\x1f{summary}".encode("utf-8")).hexdigest()
+
+
+def existing_hashes(client, collection_name, batch_size=1000):
+    """
+    Scan the collection's payloads. Returns (known, stray_ids, max_id):
+    - known: {work_id: (point_id, content_hash)}, one point per work_id
+    - stray_ids: points without a work_id, and extra points of a work_id (left by the old
+      row-numbered ids), which a run over the whole file deletes
+    - max_id: highest point id in the collection (-1 when empty)
+    """
+    known, stray_ids, max_id, offset = {}, [], -1, None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=["work_id", "content_hash"],
+            with_vectors=False
+        )
+        for point in points:
+            max_id = max(max_id, int(point.id))
+            work_id = (point.payload or {}).get("work_id")
+            if work_id in (None, ""):
+                stray_ids.append(point.id)
+            elif int(work_id) in known:
+                stray_ids.append(point.id)
+            else:
+                known[int(work_id)] = (point.id, point.payload.get("content_hash"))
+        if offset is None:
+            return known, stray_ids, max_id
+
+
+def file_work_ids(path, chunk_size):
+    """Every work_id in the CSV or Parquet file at path"""
+    work_ids = set()
+    for chunk in iter_chunks(path, chunk_size, columns=["work_id"]):
+        work_ids.update(int(w) for w in chunk["work_id"].dropna())
+    return work_ids
+
+
+def run_key(csv_path, column_name, collection_name, model_name):
+    """
+    What a checkpoint is valid for: the settings and the file's size and modification time, so an
+    interrupted run is only resumed against the same, unchanged file
+    """
+    stat = os.stat(csv_path)
+    return {"csv": os.path.abspath(csv_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "column": column_name, "collection": collection_name, "model": model_name}
+
+
+def load_checkpoint(path, run):
+    """Return the number of CSV rows already uploaded by an interrupted run with the same settings"""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        state = json.load(f)
+    return state["rows_done"] if state.get("run") == run else 0
+
+
+def save_checkpoint(path, run, rows_done):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"run": run, "rows_done": rows_done}, f)
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(path):
+    """Remove the checkpoint of a finished run, so the next run checks every row again"""
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def embed_books(qdrant_conn, csv_path, column_name="summary", chunk_size=10000, encode_batch_size=256,
+                workers=None, upload_workers=4, upload_batch_size=256, checkpoint_path=None,
+                recreate=False, pg_conn=None, encode=None, log=print):
+    """
+    Embed the books in csv_path (a CSV or Parquet file with title, summary and work_id columns, one point per
+    work_id) and upsert them into the books collection.
+
+    - The CSV is read in chunks of chunk_size rows, so memory does not grow with the file.
+    - Texts are encoded by `workers` processes, each with its own copy of the model.
+    - Points are upserted in batches of upload_batch_size by upload_workers threads while
+      encoding continues.
+    - After every chunk the number of finished rows is written to checkpoint_path, and a rerun
+      of an interrupted run with the same settings and an unchanged file resumes after it. A
+      finished run removes the checkpoint.
+    - Points are keyed by work_id: a work_id already in the collection keeps its point id, new
+      work_ids get ids after the highest existing one, and rows without a work_id are skipped.
+      Each point's payload stores a content_hash of the model name, title and summary, and rows
+      whose work_id is already in the collection with the same hash are not re-embedded, so a
+      rebuild only pays for new and changed books.
+    - Once the whole file is done, points whose work_id is no longer in it are deleted.
+    - With pg_conn (a PostgresConnector), the payload of every upserted point also gets the
+      Postgres filter columns (see database.payload_sync), which the upsert would otherwise drop.
+
+    encode (a callable from a list of texts to an array of vectors) replaces the worker processes
+    and encodes in this process, e.g. with a model that is already loaded.
+
+    Returns a dict of counters (rows, skipped, embedded, missing_work_id, deleted, seconds).
+    """
+    client = qdrant_conn.client
+    collection_name = qdrant_conn.collection_name
+    backend = qdrant_conn.backend
+    model_name = qdrant_conn.model_name
+
+    if backend in ("onnx", "onnx-int8"):
+        from database.onnx_encoder import OnnxSentenceEncoder
+        if not OnnxSentenceEncoder.is_exported(qdrant_conn.onnx_model_dir, quantized=backend == "onnx-int8"):
+            log(f"Exporting {model_name} to ONNX in {qdrant_conn.onnx_model_dir}")
+            OnnxSentenceEncoder.export(model_name, qdrant_conn.onnx_model_dir, quantize=backend == "onnx-int8")
+
+    exists = any(c.name == collection_name for c in client.get_collections().collections)
+    if exists and recreate:
+        log(f"Collection '{collection_name}' already exists. Recreating...")
+        client.delete_collection(collection_name=collection_name)
+        exists = False
+
+    run = run_key(csv_path, column_name, collection_name, model_name)
+    if recreate:
+        clear_checkpoint(checkpoint_path)
+    rows_done = load_checkpoint(checkpoint_path, run)
+    if rows_done:
+        log(f"Resuming after {rows_done} rows (checkpoint {checkpoint_path})")
+    known, stray_ids, max_id = existing_hashes(client, collection_name) if exists else ({}, [], -1)
+    next_id = max_id + 1
+
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    counters = {"rows": 0, "skipped": 0, "embedded": 0, "missing_work_id": 0, "deleted": 0}
+    start = time.perf_counter()
+
+    if encode is None:
+        encoders = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend, model_name, qdrant_conn.onnx_model_dir, threads)
+        )
+        submit = lambda texts: encoders.submit(_encode, texts, encode_batch_size)
+    else:
+        encoders = ThreadPoolExecutor(max_workers=1)
+        submit = lambda texts: encoders.submit(lambda: np.asarray(encode(texts), dtype=np.float32))
+    uploaders = ThreadPoolExecutor(max_workers=upload_workers)
+    try:
+        offset = rows_done
+        # The finished rows are skipped without parsing them
+        for chunk in iter_chunks(csv_path, chunk_size, skip_rows=rows_done):
+            if chunk.empty:
+                continue
+            titles = chunk["title"].fillna("").astype(str).tolist() if "title" in chunk else [""] * len(chunk)
+            texts = chunk[column_name].fillna("").astype(str).tolist()
+            work_ids = [None if pd.isna(w) else int(w) for w in chunk["work_id"]] if "work_id" in chunk \
+                else [None] * len(chunk)
+            hashes = [content_hash(model_name, title, text) for title, text in zip(titles, texts)]
+
+            ids, todo = [None] * len(chunk), []
+            for i, work_id in enumerate(work_ids):
+                if work_id is None:
+                    continue
+                if work_id not in known:
+                    known[work_id] = (next_id, None)
+                    next_id += 1
+                ids[i] = known[work_id][0]
+                if known[work_id][1] != hashes[i]:
+                    todo.append(i)
+            filter_rows = {}
+            if pg_conn is not None and todo:
+                filter_rows = {int(row["work_id"]): filter_payload(row)
+                               for row in pg_conn.get_filter_metadata({work_ids[i] for i in todo})}
+            jobs = [
+                (rows, submit([texts[i] for i in rows]))
+                for rows in (todo[s:s + encode_batch_size] for s in range(0, len(todo), encode_batch_size))
+            ]
+
+            uploads = []
+            for rows, job in jobs:
+                vectors = job.result()
+                if not exists:
+                    client.create_collection(
+                        collection_name=collection_name,
+                        vectors_config=models.VectorParams(size=vectors.shape[1], distance=models.Distance.COSINE),
+                        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=10000)
+                    )
+                    exists = True
+                points = [
+                    models.PointStruct(
+                        id=int(ids[i]),
+                        vector=vector.tolist(),
+                        payload={
+                            **filter_rows.get(work_ids[i], {}),
+                            "title": titles[i],
+                            "summary": texts[i],
+                            "work_id": work_ids[i],
+                            "content_hash": hashes[i]
+                        }
+                    )
+                    for i, vector in zip(rows, vectors)
+                ]
+                for s in range(0, len(points), upload_batch_size):
+                    uploads.append(uploaders.submit(
+                        client.upsert, collection_name=collection_name, points=points[s:s + upload_batch_size], wait=True
+                    ))
+            for upload in uploads:
+                upload.result()
+            for i in todo:
+                known[work_ids[i]] = (ids[i], hashes[i])
+
+            offset += len(chunk)
+            counters["rows"] += len(chunk)
+            counters["embedded"] += len(todo)
+            counters["skipped"] += len(chunk) - len(todo)
+            counters["missing_work_id"] += work_ids.count(None)
+            save_checkpoint(checkpoint_path, run, offset)
+            elapsed = time.perf_counter() - start
+            log(f"{offset} rows done: {counters['embedded']} embedded, {counters['skipped']} unchanged "
+                f"({counters['rows'] / elapsed:.0f} rows/s)")
+        clear_checkpoint(checkpoint_path)
+    finally:
+        encoders.shutdown(cancel_futures=True)
+        uploaders.shutdown()
+
+    if counters["missing_work_id"]:
+        log(f"Skipped {counters['missing_work_id']} rows without a work_id")
+
+    # Books no longer in the file (and points left over from row-numbered ids) are removed
+    if exists:
+        in_file = file_work_ids(csv_path, chunk_size)
+        removed = stray_ids + [point_id for work_id, (point_id, _) in known.items() if work_id not in in_file]
+        for s in range(0, len(removed), upload_batch_size):
+            client.delete(collection_name=collection_name,
+                          points_selector=models.PointIdsList(points=removed[s:s + upload_batch_size]), wait=True)
+        counters["deleted"] = len(removed)
+        if removed:
+            log(f"Deleted {len(removed)} points whose work_id is no longer in {csv_path}")
+
+    if pg_conn is not None and exists:
+        qdrant_conn.ensure_payload_indexes()
+    elif counters["embedded"]:
+        log("Upserted points have no filter payload fields; run `python -m database.payload_sync` to add them")
+    counters["seconds"] = time.perf_counter() - start
+    return counters
+
+
+def main():
+    from database.qdrant_connector import QdrantConnector
+
+    parser = argparse.ArgumentParser(description="Embed book summaries and upsert them into the Qdrant books collection")
+    parser.add_argument("--csv", required=True, help="CSV or Parquet file with title, summary and work_id columns (e.g. book_sum.csv)")
+    parser.add_argument("--column", default="summary", help="column to embed")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=256, help="texts per encode call")
+    parser.add_argument("--workers", type=int, help="encoder processes (default: half the cores)")
+    parser.add_argument("--upload-workers", type=int, default=4)
+    parser.add_argument("--upload-batch-size", type=int, default=256)
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <csv>.checkpoint.json)")
+    parser.add_argument("--backend", choices=["torch", "onnx", "onnx-int8"], help="defaults to EMBEDDING_BACKEND")
+    parser.add_argument("--recreate", action="store_true", help="drop the collection and embed everything")
+    parser.add_argument("--neighbors", default=os.getenv("QDRANT_NEIGHBORS_PATH"),
+                        help="neighbour table to refresh after the upload (default: QDRANT_NEIGHBORS_PATH)")
+    parser.add_argument("--no-postgres", action="store_true",
+                        help="do not copy the Postgres filter columns into the payloads")
+    args = parser.parse_args()
+
+    connector = QdrantConnector()
+    if args.backend:
+        connector.backend = args.backend
+    status, message = connector.connect_remote()
+    # A missing books collection is fine here: it is created on the first upload
+    if not status and connector.client is None:
+        print(message)
+        return
+
+    pg_conn = None
+    if not args.no_postgres:
+        from database.postgres_connector import PostgresConnector
+        pg_conn = PostgresConnector()
+        if not pg_conn.connect():
+            pg_conn = None
+
+    counters = embed_books(
+        connector, args.csv,
+        column_name=args.column,
+        chunk_size=args.chunk_size,
+        encode_batch_size=args.batch_size,
+        workers=args.workers,
+        upload_workers=args.upload_workers,
+        upload_batch_size=args.upload_batch_size,
+        checkpoint_path=args.checkpoint or f"{args.csv}.checkpoint.json",
+        recreate=args.recreate,
+        pg_conn=pg_conn
+    )
+    if pg_conn is not None:
+        pg_conn.close()
+    print(f"Processed {counters['rows']} rows in {counters['seconds']:.1f}s: "
+          f"{counters['embedded']} embedded, {counters['skipped']} unchanged, {counters['deleted']} deleted")
+
+    if args.neighbors and (counters["embedded"] or counters["deleted"] or args.recreate or not BookNeighborTable.exists(args.neighbors)):
+        # Only rows affected by the upserted books are rescored
+        ids, vectors = fetch_vectors(connector.client, connector.collection_name)
+        stats = update_table(ids, vectors, args.neighbors, full=args.recreate)
+        print(f"Neighbour table at {args.neighbors}: {stats['rescored']} of {stats['books']} rows scored")
+
+
+if __name__ == "__main__":
+    main()
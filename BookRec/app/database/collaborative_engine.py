@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from database.table_files import iter_chunks, read_table
+
+
+class CollaborativeEngine:
+    """
+    In-process user-based collaborative filtering over a sparse user x book rating matrix.
+
+    Computes the same scores as Neo4jConnector.get_collaborative_recommendations without neighbour pruning:
+      - per common book, similarity = 1 - |target_rating - other_rating| / 4
+      - user similarity = mean over common books, kept if common books >= min_common_books
+      - candidate score = sum(user_similarity * rating) / number of similar users who rated it,
+        over books the target has not rated
+    but with sparse matrix products instead of a graph traversal, so the whole interaction
+    table is loaded once and each request is a few milliseconds of in-memory math.
+    """
+
+    def __init__(self, user_ids, work_ids, ratings, titles=None):
+        """
+        Parameters:
+        - user_ids, work_ids, ratings: parallel arrays of INTERACTED edges
+          (duplicate user/book pairs keep the last rating, like MERGE + SET)
+        - titles: optional dict mapping work_id to title for the returned rows
+        """
+        edges = pd.DataFrame({
+            "user_id": np.asarray(user_ids).astype(str),
+            "work_id": np.asarray(work_ids).astype(np.int64),
+            "rating": np.asarray(ratings, dtype=np.float32)
+        }).drop_duplicates(subset=["user_id", "work_id"], keep="last")
+
+        user_codes, self.user_ids = pd.factorize(edges["user_id"].to_numpy())
+        book_codes, self.work_ids = pd.factorize(edges["work_id"].to_numpy(), sort=True)
+        self.user_index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        self.titles = {int(k): v for k, v in (titles or {}).items()}
+
+        shape = (len(self.user_ids), len(self.work_ids))
+        self.ratings, self.presence = _rating_matrices(user_codes, book_codes, edges["rating"].to_numpy(), shape)
+        self.presence_t = self.presence.T.tocsr()
+        self.ratings_t = self.ratings.T.tocsr()
+
+    @classmethod
+    def from_csv(cls, path, books_path=None, chunksize=1_000_000):
+        """
+        Load the engine from the cleaned interactions CSV or Parquet file (user_id, work_id, rating
+        columns). books_path optionally points at a books file with work_id and title columns.
+        """
+        chunks = [
+            chunk.dropna(subset=["work_id"])
+            for chunk in iter_chunks(path, chunksize, columns=["user_id", "work_id", "rating"])
+        ]
+        edges = pd.concat(chunks, ignore_index=True)
+        titles = None
+        if books_path:
+            books = read_table(books_path, columns=["work_id", "title"])
+            titles = dict(zip(books["work_id"].astype(np.int64), books["title"]))
+        return cls(edges["user_id"], edges["work_id"], edges["rating"].fillna(0), titles=titles)
+
+    def _profile_matrices(self, profiles):
+        """Build (ratings, presence) CSR matrices with one row per rated_books_data profile"""
+        rows, cols, values = [], [], []
+        for row, rated_books_data in enumerate(profiles):
+            ids = np.array([int(w) for w in rated_books_data], dtype=np.int64)
+            vals = np.array([float(d["rating"]) for d in rated_books_data.values()], dtype=np.float32)
+            pos = np.minimum(np.searchsorted(self.work_ids, ids), len(self.work_ids) - 1)
+            found = self.work_ids[pos] == ids
+            rows.append(np.full(found.sum(), row))
+            cols.append(pos[found])
+            values.append(vals[found])
+
+        shape = (len(profiles), len(self.work_ids))
+        return _rating_matrices(np.concatenate(rows), np.concatenate(cols), np.concatenate(values), shape)
+
+    def _score(self, target_ratings, target_presence, exclude_users, min_common_books, limit, candidate_rows=None):
+        """
+        Score a batch of target rows; exclude_users[i] is the matrix row of target i or -1.
+        candidate_rows (single target only) limits the neighbours to those user rows.
+        """
+        n_targets = target_presence.shape[0]
+
+        if candidate_rows is None:
+            # Expand every (target, book) rating against every other user who rated that book
+            target_coo = target_ratings.tocoo()
+            starts = self.ratings_t.indptr[target_coo.col]
+            lengths = self.ratings_t.indptr[target_coo.col + 1] - starts
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            pair_targets = np.repeat(target_coo.row, lengths)
+            pair_others = self.ratings_t.indices[offsets]
+            pair_sims = 1.0 - np.abs(np.repeat(target_coo.data, lengths) - self.ratings_t.data[offsets]) / 4.0
+        else:
+            # Read only the candidates' rows and keep the books the target rated
+            target_values = np.full(len(self.work_ids), np.nan, dtype=np.float32)
+            target_values[target_ratings.indices] = target_ratings.data
+            starts = self.ratings.indptr[candidate_rows]
+            lengths = self.ratings.indptr[candidate_rows + 1] - starts
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            targets = target_values[self.ratings.indices[offsets]]
+            common = ~np.isnan(targets)
+            pair_others = np.repeat(candidate_rows, lengths)[common]
+            pair_targets = np.zeros(len(pair_others), dtype=np.int64)
+            pair_sims = 1.0 - np.abs(targets[common] - self.ratings.data[offsets][common]) / 4.0
+
+        keep = pair_others != np.asarray(exclude_users)[pair_targets]
+        pair_targets, pair_others, pair_sims = pair_targets[keep], pair_others[keep], pair_sims[keep]
+
+        # Aggregate per (target, other) pair: number of common books and summed similarity.
+        # Similarities are offset by 1 so no summed entry is zero and both matrices keep
+        # the same sparsity structure.
+        shape = (n_targets, len(self.user_ids))
+        common = sparse.csr_matrix((np.ones(len(pair_others)), (pair_targets, pair_others)), shape=shape)
+        sim_sums = sparse.csr_matrix((pair_sims + 1.0, (pair_targets, pair_others)), shape=shape)
+        for matrix in (common, sim_sums):
+            matrix.sum_duplicates()
+            matrix.sort_indices()
+
+        similar = common.data >= min_common_books
+        user_similarity = common.copy()
+        user_similarity.data = np.where(similar, (sim_sums.data - common.data) / common.data, 0.0)
+        neighbors = common.copy()
+        neighbors.data = similar.astype(np.float64)
+        user_similarity.eliminate_zeros()
+        neighbors.eliminate_zeros()
+
+        weighted_sums = (user_similarity @ self.ratings).tocsr()
+        rating_counts = (neighbors @ self.presence).tocsr()
+
+        results = []
+        for row in range(n_targets):
+            lo, hi = rating_counts.indptr[row], rating_counts.indptr[row + 1]
+            candidates = rating_counts.indices[lo:hi]
+            counts = rating_counts.data[lo:hi]
+            rated = target_presence.indices[target_presence.indptr[row]:target_presence.indptr[row + 1]]
+            unrated = ~np.isin(candidates, rated)
+            candidates, counts = candidates[unrated], counts[unrated]
+
+            scores = weighted_sums[row].toarray().ravel()[candidates] / counts
+            top = np.argpartition(-scores, limit - 1)[:limit] if len(scores) > limit else np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            results.append([
+                {
+                    "work_id": str(self.work_ids[candidates[i]]),
+                    "title": self.titles.get(int(self.work_ids[candidates[i]])),
+                    "cf_score": float(scores[i])
+                }
+                for i in top
+            ])
+        return results
+
+    def recommend(self, rated_books_data, min_common_books=2, limit=10, candidate_users=None):
+        """
+        Returns recommendations for an ad-hoc rating profile (the "temp_user" flow).
+        rated_books_data has the same shape as in Neo4jConnector.insert_user_ratings.
+        candidate_users (e.g. from UserLSHIndex.candidates) restricts the neighbours to those
+        user_ids, so only their histories are read.
+        """
+        if candidate_users is None:
+            return self.recommend_profiles([rated_books_data], min_common_books, limit)[0]
+        if not rated_books_data:
+            return []
+        rows = np.array([self.user_index[u] for u in candidate_users if u in self.user_index], dtype=np.int64)
+        ratings, presence = self._profile_matrices([rated_books_data])
+        return self._score(ratings, presence, [-1], min_common_books, limit, candidate_rows=rows)[0]
+
+    def recommend_profiles(self, profiles, min_common_books=2, limit=10, batch_size=256):
+        """Returns one recommendation list per rated_books_data profile, scored in batches"""
+        results = []
+        for start in range(0, len(profiles), batch_size):
+            batch = profiles[start:start + batch_size]
+            if not any(batch):
+                results.extend([] for _ in batch)
+                continue
+            ratings, presence = self._profile_matrices(batch)
+            results.extend(self._score(ratings, presence, [-1] * len(batch), min_common_books, limit))
+        return results
+
+    def recommend_for_users(self, user_ids, min_common_books=2, limit=10, batch_size=256):
+        """
+        Returns a dict mapping each known user_id to its recommendations, scoring many users
+        per batch (e.g. for the nightly email job). Unknown user_ids map to an empty list.
+        """
+        results = {user_id: [] for user_id in user_ids}
+        rows = [self.user_index[u] for u in user_ids if u in self.user_index]
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            scored = self._score(self.ratings[batch], self.presence[batch], batch, min_common_books, limit)
+            for row, recommendations in zip(batch, scored):
+                results[self.user_ids[row]] = recommendations
+        return results
+
+
+def _rating_matrices(rows, cols, values, shape):
+    """
+    Build (ratings, presence) CSR matrices that share one sparsity structure. Built directly
+    from sorted indices so zero ratings stay as explicit entries (they are still edges).
+    """
+    order = np.lexsort((cols, rows))
+    indices = cols[order].astype(np.int32)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=shape[0]))])
+    ratings = sparse.csr_matrix((values[order].astype(np.float32), indices, indptr), shape=shape)
+    presence = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices.copy(), indptr.copy()), shape=shape)
+    return ratings, presence
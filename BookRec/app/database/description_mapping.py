@@ -0,0 +1,144 @@
+import io
+import json
+import os
+from array import array
+
+import numpy as np
+
+
+class DescriptionMapping:
+    """
+    Compact, read-only work_id -> description mapping.
+
+    All descriptions are stored back to back as UTF-8 bytes with an int64 offsets array
+    (count + 1 entries), next to an int64 work_id array; a description is decoded only when it
+    is looked up. That is a few bytes of overhead per book instead of a Python str plus a dict
+    slot, and a saved mapping can be memory-mapped so the text stays in the page cache.
+
+    It supports the read side of the dict returned by PostgresConnector.get_description_mapping
+    (mapping[work_id], get, in, len, keys/items); if a work_id appears more than once the last
+    description wins, as it would in the dict.
+    """
+
+    def __init__(self, work_ids, offsets, data, nulls):
+        """
+        Parameters:
+        - work_ids: int64 array of work_ids, in row order
+        - offsets: int64 array of count + 1 byte offsets into data
+        - data: uint8 array (or memmap) with the concatenated UTF-8 descriptions
+        - nulls: bool array, True where the description is NULL
+        """
+        self.work_ids = work_ids
+        self.offsets = offsets
+        self.data = data
+        self.nulls = nulls
+
+        order = np.argsort(work_ids, kind="stable")
+        self._sorted_ids = work_ids[order]
+        self._sorted_rows = order
+        self._count = int(np.count_nonzero(np.diff(self._sorted_ids))) + 1 if len(work_ids) else 0
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def _consume(batches, out):
+        """Write descriptions from batches to the binary stream out; return (work_ids, offsets, nulls)"""
+        work_ids, offsets, nulls = array("q"), array("q", [0]), array("b")
+        size = 0
+        for batch in batches:
+            for work_id, description in batch:
+                work_ids.append(int(work_id))
+                nulls.append(description is None)
+                if description is not None:
+                    size += out.write(description.encode("utf-8"))
+                offsets.append(size)
+        return (
+            np.frombuffer(work_ids, dtype=np.int64),
+            np.frombuffer(offsets, dtype=np.int64),
+            np.frombuffer(nulls, dtype=np.int8).astype(bool)
+        )
+
+    @classmethod
+    def from_batches(cls, batches):
+        """Build an in-memory mapping from an iterable of [(work_id, description), ...] batches"""
+        buffer = io.BytesIO()
+        work_ids, offsets, nulls = cls._consume(batches, buffer)
+        return cls(work_ids, offsets, np.frombuffer(buffer.getbuffer(), dtype=np.uint8), nulls)
+
+    @classmethod
+    def write_batches(cls, batches, path):
+        """
+        Stream batches straight into a saved mapping at path, so the descriptions are never all
+        in memory at once; load(path) afterwards to use it.
+        """
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "descriptions.bin"), "wb") as f:
+            work_ids, offsets, nulls = cls._consume(batches, f)
+        cls._save_index(path, work_ids, offsets, nulls)
+
+    @staticmethod
+    def _save_index(path, work_ids, offsets, nulls):
+        np.save(os.path.join(path, "work_ids.npy"), work_ids)
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+        np.save(os.path.join(path, "nulls.npy"), nulls)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"count": len(work_ids), "bytes": int(offsets[-1])}, f)
+
+    def save(self, path):
+        """Write the mapping to a directory of .npy files plus a raw descriptions.bin"""
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "descriptions.bin"), "wb") as f:
+            f.write(memoryview(self.data))
+        self._save_index(path, self.work_ids, self.offsets, self.nulls)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved mapping; with mmap=True the description bytes are memory-mapped, not read"""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        data_path = os.path.join(path, "descriptions.bin")
+        if meta["bytes"] == 0:
+            data = np.zeros(0, dtype=np.uint8)
+        elif mmap:
+            data = np.memmap(data_path, dtype=np.uint8, mode="r", shape=(meta["bytes"],))
+        else:
+            data = np.fromfile(data_path, dtype=np.uint8)
+        return cls(
+            np.load(os.path.join(path, "work_ids.npy")),
+            np.load(os.path.join(path, "offsets.npy")),
+            data,
+            np.load(os.path.join(path, "nulls.npy"))
+        )
+
+    def _row(self, work_id):
+        # Rightmost match, so duplicates resolve to the last row like dict assignment
+        pos = np.searchsorted(self._sorted_ids, int(work_id), side="right") - 1
+        if pos >= 0 and self._sorted_ids[pos] == int(work_id):
+            return int(self._sorted_rows[pos])
+        return None
+
+    def _description(self, row):
+        if self.nulls[row]:
+            return None
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return bytes(self.data[start:end]).decode("utf-8")
+
+    def __getitem__(self, work_id):
+        row = self._row(work_id)
+        if row is None:
+            raise KeyError(work_id)
+        return self._description(row)
+
+    def __contains__(self, work_id):
+        return self._row(work_id) is not None
+
+    def get(self, work_id, default=None):
+        row = self._row(work_id)
+        return default if row is None else self._description(row)
+
+    def keys(self):
+        return (int(work_id) for work_id in np.unique(self._sorted_ids))
+
+    def items(self):
+        return ((work_id, self[work_id]) for work_id in self.keys())
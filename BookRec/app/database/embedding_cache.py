@@ -0,0 +1,295 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+
+import numpy as np
+
+from database.ttl_cache import TTLCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so no disk tier shared between processes
+    fcntl = None
+
+
+def normalize_query(text):
+    """Normalize a query string so trivially different spellings share one cache entry"""
+    text = unicodedata.normalize("NFKC", text).lower().strip()
+    return re.sub(r"\s+", " ", text)
+
+
+def _key_hash(key):
+    """64-bit hash of a cache key, stored next to its row so readers can check what the row holds"""
+    return np.uint64(int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little"))
+
+
+class EmbeddingCache:
+    """
+    Bounded cache of query embeddings keyed by the normalized query string.
+
+    The memory tier is a TTLCache. The optional disk tier stores vectors
+    in a memory-mapped float32 file (one row per entry), a parallel file with the hash of each
+    row's key, and an append-only JSON lines key index, so cached embeddings survive restarts
+    and are shared by processes on one host:
+      - row allocation, vector writes and index appends happen under an exclusive flock of the
+        directory's lock file, after replaying what other processes appended to the index
+      - reads take a shared lock and only return a row whose stored key hash matches the key,
+        so a row another process reused is a miss, never another query's vector
+      - meta.json records the namespace (model and backend) and dimension the vectors were
+        made with; a directory written for another namespace or dimension is ignored
+    When the disk tier is full, the oldest rows are overwritten. Without fcntl (Windows) the
+    cache is memory only.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, persist_path=None, max_disk_entries=100_000, namespace=None):
+        """
+        Parameters:
+        - max_entries: maximum number of embeddings kept in memory
+        - ttl: seconds an entry stays valid (None = no expiry)
+        - persist_path: directory for the on-disk tier (None = memory only)
+        - max_disk_entries: number of rows in the on-disk tier
+        - namespace: what produced the vectors (e.g. "all-MiniLM-L6-v2/onnx-int8"); disk tiers
+          written under another namespace are not used
+        """
+        self.ttl = ttl
+        self.persist_path = persist_path if fcntl is not None else None
+        self.max_disk_entries = max_disk_entries
+        self.namespace = namespace
+
+        self.memory = TTLCache(max_entries=max_entries, ttl=ttl)
+        # Guards the disk tier; the memory tier has its own lock
+        self._lock = threading.Lock()
+        self._reset_disk_tier()
+
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.persist_path and os.path.exists(os.path.join(self.persist_path, "meta.json")):
+            self._open_disk_tier()
+
+    def _reset_disk_tier(self):
+        self._disk_vectors = None
+        self._disk_hashes = None
+        self._disk_dim = None
+        self._disk_index = {}
+        self._disk_keys = [None] * self.max_disk_entries
+        self._next_row = 0
+        self._index_inode = None
+        self._index_offset = 0
+        self.disk_status = "enabled" if self.persist_path else "off"
+
+    def set_namespace(self, namespace):
+        """
+        Switch to embeddings from another model or backend: the memory tier is dropped and the
+        disk tier is reopened (or ignored) for the new namespace on next use.
+        """
+        with self._lock:
+            if namespace == self.namespace:
+                return
+            self.namespace = namespace
+            self.memory.clear()
+            self._reset_disk_tier()
+            if self.persist_path and os.path.exists(os.path.join(self.persist_path, "meta.json")):
+                self._open_disk_tier()
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, text):
+        """Return the cached embedding for text, or None"""
+        key = normalize_query(text)
+        vector = self.memory.get(key)
+        if vector is not None:
+            return vector
+
+        with self._lock:
+            if self._disk_vectors is not None:
+                disk_entry = self._read_disk(key)
+                if disk_entry is not None:
+                    vector, created = disk_entry
+                    self.memory.put(key, vector, created=created)
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, text, vector):
+        """Store the embedding for text in memory and, if enabled, on disk"""
+        key = normalize_query(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        created = time.time()
+        with self._lock:
+            self.memory.put(key, vector, created=created)
+            if self.persist_path and self.disk_status == "enabled":
+                self._write_disk(key, vector, created)
+
+    def get_or_compute(self, text, encode):
+        """Return the cached embedding for text, calling encode(text) and caching the result on a miss"""
+        vector = self.get(text)
+        if vector is None:
+            vector = np.asarray(encode(text), dtype=np.float32)
+            self.put(text, vector)
+        return vector
+
+    @contextmanager
+    def _file_lock(self, operation):
+        """flock (fcntl.LOCK_SH or LOCK_EX) on the disk tier's lock file, shared with other processes"""
+        with open(os.path.join(self.persist_path, "lock"), "a") as f:
+            fcntl.flock(f, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _open_disk_tier(self, dim=None):
+        """
+        Open (or create with dimension dim) the memory-mapped files and replay the key index.
+        Returns False, and leaves the disk tier off, when the directory holds vectors of another
+        namespace or dimension.
+        """
+        os.makedirs(self.persist_path, exist_ok=True)
+        meta_path = os.path.join(self.persist_path, "meta.json")
+        with self._file_lock(fcntl.LOCK_EX):
+            if os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                if meta.get("namespace") != self.namespace or (dim is not None and meta["dim"] != dim):
+                    self.disk_status = (f"ignored: written for {meta.get('namespace')} ({meta['dim']}-d), "
+                                        f"not {self.namespace}")
+                    return False
+                mode = "r+"
+            elif dim is None:
+                return False
+            else:
+                meta = {"namespace": self.namespace, "dim": dim, "rows": self.max_disk_entries}
+                with open(meta_path + ".tmp", "w") as f:
+                    json.dump(meta, f)
+                os.replace(meta_path + ".tmp", meta_path)
+                mode = "w+"
+
+            self.max_disk_entries = meta["rows"]
+            self._disk_keys = [None] * self.max_disk_entries
+            self._disk_dim = meta["dim"]
+            self._disk_vectors = np.memmap(os.path.join(self.persist_path, "vectors.f32"), dtype=np.float32,
+                                           mode=mode, shape=(meta["rows"], meta["dim"]))
+            self._disk_hashes = np.memmap(os.path.join(self.persist_path, "keys.u64"), dtype=np.uint64,
+                                          mode=mode, shape=(meta["rows"],))
+
+            # Compact the append-only index once overwritten rows dominate it
+            index_path = os.path.join(self.persist_path, "keys.jsonl")
+            if self._sync_index() > 2 * self.max_disk_entries:
+                with open(index_path + ".tmp", "w") as f:
+                    for key, (row, created) in self._disk_index.items():
+                        f.write(json.dumps({"key": key, "row": row, "created": created, "next": self._next_row}) + "\n")
+                os.replace(index_path + ".tmp", index_path)
+                stat = os.stat(index_path)
+                self._index_inode, self._index_offset = stat.st_ino, stat.st_size
+        return True
+
+    def _sync_index(self):
+        """
+        Replay the key index records appended since the last call (all of them after a
+        compaction replaced the file). Call with the file lock held. Returns the records replayed.
+        """
+        index_path = os.path.join(self.persist_path, "keys.jsonl")
+        try:
+            stat = os.stat(index_path)
+        except FileNotFoundError:
+            return 0
+        if stat.st_ino != self._index_inode or stat.st_size < self._index_offset:
+            self._disk_index = {}
+            self._disk_keys = [None] * self.max_disk_entries
+            self._index_inode, self._index_offset = stat.st_ino, 0
+        if stat.st_size == self._index_offset:
+            return 0
+
+        with open(index_path, "rb") as f:
+            f.seek(self._index_offset)
+            data = f.read()
+        complete = data.rfind(b"\n") + 1  # a partially written last line is read on a later call
+        replayed = 0
+        for line in data[:complete].splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # line of a writer that died mid-append
+            self._assign_row(record["key"], record["row"], record["created"])
+            self._next_row = record["next"]
+            replayed += 1
+        self._index_offset += complete
+        return replayed
+
+    def _assign_row(self, key, row, created):
+        previous = self._disk_keys[row]
+        if previous is not None and self._disk_index.get(previous, (None,))[0] == row:
+            del self._disk_index[previous]
+        self._disk_keys[row] = key
+        self._disk_index[key] = (row, created)
+
+    def _read_disk(self, key):
+        """(vector, created) of key from the disk tier, or None"""
+        key_hash = _key_hash(key)
+        with self._file_lock(fcntl.LOCK_SH):
+            disk_entry = self._disk_index.get(key)
+            if disk_entry is None or self._disk_hashes[disk_entry[0]] != key_hash:
+                # Unknown here, or its row was reused: pick up the other processes' writes
+                self._sync_index()
+                disk_entry = self._disk_index.get(key)
+                if disk_entry is None or self._disk_hashes[disk_entry[0]] != key_hash:
+                    return None
+            if self._expired(disk_entry[1]):
+                return None
+            return np.array(self._disk_vectors[disk_entry[0]]), disk_entry[1]
+
+    def _write_disk(self, key, vector, created):
+        if self._disk_vectors is None and not self._open_disk_tier(dim=len(vector)):
+            return
+        if len(vector) != self._disk_dim:
+            return
+
+        index_path = os.path.join(self.persist_path, "keys.jsonl")
+        with self._file_lock(fcntl.LOCK_EX):
+            self._sync_index()
+            existing = self._disk_index.get(key)
+            row = existing[0] if existing is not None else self._next_row
+            if existing is None:
+                self._next_row = (self._next_row + 1) % self.max_disk_entries
+
+            # The vector goes in before the key hash that makes the row readable for key
+            self._disk_vectors[row] = vector
+            self._disk_vectors.flush()
+            self._disk_hashes[row] = _key_hash(key)
+            self._disk_hashes.flush()
+            self._assign_row(key, row, created)
+            with open(index_path, "ab") as f:
+                f.write((json.dumps({"key": key, "row": row, "created": created, "next": self._next_row}) + "\n")
+                        .encode("utf-8"))
+                end = f.tell()
+            stat = os.stat(index_path)
+            self._index_inode, self._index_offset = stat.st_ino, end
+
+    def clear(self):
+        """Drop all in-memory entries (the disk tier is kept)"""
+        self.memory.clear()
+
+    def stats(self):
+        """Return hit/miss counters and sizes for the debug panel"""
+        # memory.misses also counts the lookups the disk tier answered
+        hits = self.memory.hits
+        lookups = hits + self.disk_hits + self.misses
+        return {
+            "hits": hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.memory.evictions,
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self._disk_index),
+            "disk_tier": self.disk_status
+        }
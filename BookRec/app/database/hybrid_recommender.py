@@ -0,0 +1,215 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from database.embedding_cache import normalize_query
+
+
+def _timeout_env(name, default):
+    value = os.getenv(name, default)
+    return float(value) if value else None
+
+
+def _work_id(value):
+    """Neo4j stores work_id as a string and the Qdrant payload may hold either; merge on int"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class HybridRecommender:
+    """
+    Combines collaborative filtering (Neo4j) and vector search (Qdrant) candidates and enriches
+    them with book metadata from Postgres.
+
+    The CF query and the vector search are submitted to a thread pool together, each with its
+    own timeout, so a request takes about as long as the slower of the two rather than their
+    sum. A backend that fails or misses its deadline is listed in "degraded" and contributes no
+    candidates; the others still produce results. Candidates are merged by work_id and ranked
+    by a weighted sum of each source's scores (normalized by that source's top score), then the
+    whole union is enriched with a single get_books_metadata call.
+
+    CF results are cached by the Neo4j connector; vector results go through the same
+    recommendation cache, keyed by user, rating set, query and filters.
+    """
+
+    def __init__(self, neo4j_conn, qdrant_conn, pg_conn, cf_weight=None, vector_weight=None,
+                 timeouts=None, candidate_multiplier=3, max_workers=None, cache=None):
+        """
+        Parameters:
+        - neo4j_conn, qdrant_conn, pg_conn: the app's connectors (connected lazily if needed)
+        - cf_weight, vector_weight: weights of the normalized CF and vector scores
+        - timeouts: {"cf": s, "vector": s, "metadata": s} overriding the HYBRID_*_TIMEOUT settings
+          (None = wait indefinitely)
+        - candidate_multiplier: each source is asked for limit * candidate_multiplier candidates
+        - max_workers: size of the thread pool shared by all requests
+        - cache: RecommendationCache for vector results (default: the Neo4j connector's)
+        """
+        self.neo4j_conn = neo4j_conn
+        self.qdrant_conn = qdrant_conn
+        self.pg_conn = pg_conn
+        self.cache = cache if cache is not None else getattr(neo4j_conn, "recommendation_cache", None)
+
+        self.cf_weight = cf_weight if cf_weight is not None else float(os.getenv("HYBRID_CF_WEIGHT", "0.5"))
+        self.vector_weight = vector_weight if vector_weight is not None else \
+            float(os.getenv("HYBRID_VECTOR_WEIGHT", "0.5"))
+        self.timeouts = {
+            "cf": _timeout_env("HYBRID_CF_TIMEOUT", "2.0"),
+            "vector": _timeout_env("HYBRID_VECTOR_TIMEOUT", "2.0"),
+            "metadata": _timeout_env("HYBRID_METADATA_TIMEOUT", "2.0"),
+            **(timeouts or {})
+        }
+        self.candidate_multiplier = candidate_multiplier
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("HYBRID_MAX_WORKERS", "8")),
+            thread_name_prefix="hybrid"
+        )
+
+    def log(self, message, level="info"):
+        """Log message to console"""
+        print(f"[{level.upper()}] {message}")
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    def recommend(self, query_text=None, rated_books_data=None, user_id=None, limit=10, filters=None):
+        """
+        Recommend books from any combination of a text query and the user's ratings.
+
+        Parameters:
+        - query_text: description of the wanted book, for the vector search (optional)
+        - rated_books_data: {work_id: {"rating": ...}} ratings for CF that are never written
+          to the graph (optional)
+        - user_id: an existing Neo4j user for CF, used when rated_books_data is not given (optional)
+        - limit: number of results
+        - filters: get_books_metadata filters, applied in the vector search and to the enriched results
+
+        Returns a dict with:
+        - results: list of {work_id, title, score, cf_score, vector_score, book_id, summary,
+          sources, metadata} ordered by descending score
+        - timings: seconds spent in each backend and in total
+        - degraded: backends that failed or timed out
+        """
+        start = time.perf_counter()
+        timings, degraded = {}, []
+        candidates = limit * self.candidate_multiplier
+
+        futures = {}
+        if rated_books_data or user_id:
+            futures["cf"] = self.executor.submit(self._timed, self._cf_candidates, rated_books_data, user_id, candidates)
+        if query_text:
+            futures["vector"] = self.executor.submit(self._timed, self._cached_vector_candidates, query_text,
+                                                     candidates, filters, user_id, rated_books_data)
+        rows = {name: self._collect(name, future, start, timings, degraded) for name, future in futures.items()}
+
+        exclude = {_work_id(work_id) for work_id in (rated_books_data or {})}
+        merged = self.merge(rows.get("cf", []), rows.get("vector", []), exclude)
+
+        if merged:
+            metadata_start = time.perf_counter()
+            future = self.executor.submit(self._timed, self.pg_conn.get_books_metadata,
+                                          [entry["work_id"] for entry in merged], filters)
+            metadata = self._collect("metadata", future, metadata_start, timings, degraded, default=None)
+            if metadata is not None:
+                by_work_id = {}
+                for row in metadata:
+                    by_work_id.setdefault(_work_id(row["work_id"]), row)
+                for entry in merged:
+                    entry["metadata"] = by_work_id.get(entry["work_id"])
+                    if entry["metadata"]:
+                        entry["title"] = entry["metadata"].get("title") or entry["title"]
+                if filters:
+                    # get_books_metadata only returns the books that pass the filters
+                    merged = [entry for entry in merged if entry["metadata"] is not None]
+
+        timings["total"] = time.perf_counter() - start
+        return {"results": merged[:limit], "timings": timings, "degraded": degraded}
+
+    @staticmethod
+    def _timed(fn, *args):
+        start = time.perf_counter()
+        return fn(*args), time.perf_counter() - start
+
+    def _collect(self, name, future, started, timings, degraded, default=()):
+        """Wait for a backend until its deadline (measured from started); failures yield default"""
+        timeout = self.timeouts.get(name)
+        remaining = None if timeout is None else max(0.0, started + timeout - time.perf_counter())
+        try:
+            result, elapsed = future.result(timeout=remaining)
+            timings[name] = elapsed
+            return result
+        except FutureTimeoutError:
+            self.log(f"{name} backend timed out after {timeout}s", level="warning")
+        except Exception as e:
+            self.log(f"{name} backend failed: {e}", level="error")
+        timings[name] = time.perf_counter() - started
+        degraded.append(name)
+        return default
+
+    def _cf_candidates(self, rated_books_data, user_id, limit):
+        if self.neo4j_conn.driver is None and not self.neo4j_conn.connect():
+            raise RuntimeError("Neo4j is unavailable")
+        if rated_books_data:
+            return self.neo4j_conn.get_ephemeral_recommendations(rated_books_data, limit=limit, user_id=user_id)
+        return self.neo4j_conn.get_collaborative_recommendations(user_id, limit=limit)
+
+    def _cached_vector_candidates(self, query_text, limit, filters, user_id, rated_books_data):
+        if self.cache is None:
+            return self._vector_candidates(query_text, limit, filters)
+        return self.cache.get_or_compute(
+            user_id, "vector", lambda: self._vector_candidates(query_text, limit, filters),
+            rated_books_data=rated_books_data, query=normalize_query(query_text), limit=limit, filters=filters
+        )
+
+    def _vector_candidates(self, query_text, limit, filters):
+        if self.qdrant_conn.client is None and self.qdrant_conn.local_index is None:
+            status, message = self.qdrant_conn.connect()
+            if not status:
+                raise RuntimeError(message)
+        points = self.qdrant_conn.search_similar_books(query_text=query_text, limit=limit, filters=filters)
+        return [
+            {
+                "work_id": (point.payload or {}).get("work_id"),
+                "book_id": point.id,
+                "title": (point.payload or {}).get("title"),
+                "summary": (point.payload or {}).get("summary"),
+                "vector_score": point.score
+            }
+            for point in points
+        ]
+
+    def merge(self, cf_rows, vector_rows, exclude_work_ids=()):
+        """
+        Merge CF rows ({work_id, title, cf_score}) and vector rows ({work_id, book_id, title,
+        summary, vector_score}) by work_id and rank them by weighted, normalized score.
+        """
+        merged = {}
+        for source, rows, key in (("cf", cf_rows, "cf_score"), ("vector", vector_rows, "vector_score")):
+            for row in rows:
+                work_id = _work_id(row.get("work_id"))
+                if work_id is None or work_id in exclude_work_ids:
+                    continue
+                entry = merged.setdefault(work_id, {
+                    "work_id": work_id, "title": None, "score": 0.0, "cf_score": None,
+                    "vector_score": None, "book_id": None, "summary": None, "sources": [], "metadata": None
+                })
+                if entry[key] is None or row[key] > entry[key]:
+                    entry[key] = row[key]
+                for field in ("title", "book_id", "summary"):
+                    if entry[field] is None and row.get(field) is not None:
+                        entry[field] = row[field]
+                if source not in entry["sources"]:
+                    entry["sources"].append(source)
+
+        entries = list(merged.values())
+        for key, weight in (("cf_score", self.cf_weight), ("vector_score", self.vector_weight)):
+            top = max((max(entry[key], 0.0) for entry in entries if entry[key] is not None), default=0.0)
+            if top <= 0:
+                continue
+            for entry in entries:
+                if entry[key] is not None:
+                    entry["score"] += weight * max(entry[key], 0.0) / top
+
+        entries.sort(key=lambda entry: (-entry["score"], entry["work_id"]))
+        return entries
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+
+import numpy as np
+from qdrant_client.http import models
+
+# Payload fields kept in the snapshot (the ones format_results and get_book_by_id read)
+PAYLOAD_FIELDS = ("title", "summary", "work_id")
+
+
+class LocalVectorIndex:
+    """
+    In-process copy of a Qdrant collection for exact nearest-neighbour search.
+
+    A snapshot directory holds:
+      - vectors.f32: memory-mapped float32 matrix of L2-normalized vectors (one row per point)
+      - ids.npy: int64 point ids, in row order
+      - payloads.jsonl + payload_offsets.npy: one JSON payload per line (count + 1 offsets), read on demand
+
+    Search is a single matrix-vector product over the normalized vectors (cosine similarity,
+    same as the collection's distance), and results are returned as qdrant ScoredPoint /
+    Record objects so format_results and callers see the same shape as remote search.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.path = path
+        self.collection_name = meta["collection_name"]
+        self.ids = np.load(os.path.join(path, "ids.npy"))
+        self.vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r",
+                                 shape=(meta["count"], meta["dim"]))
+        self.payload_offsets = np.load(os.path.join(path, "payload_offsets.npy"))
+        self._payload_fd = os.open(os.path.join(path, "payloads.jsonl"), os.O_RDONLY)
+
+        order = np.argsort(self.ids)
+        self._sorted_ids = self.ids[order]
+        self._sorted_rows = order
+
+    def __len__(self):
+        return len(self.ids)
+
+    def close(self):
+        os.close(self._payload_fd)
+
+    @staticmethod
+    def snapshot(client, collection_name, path, batch_size=1000, log=print):
+        """
+        Scroll through a Qdrant collection and write its vectors and payloads to path.
+        Returns the number of points written.
+        """
+        info = client.get_collection(collection_name)
+        dim = info.config.params.vectors.size
+        os.makedirs(path, exist_ok=True)
+
+        ids, offsets, count = [], [], 0
+        vector_path = os.path.join(path, "vectors.f32")
+        with open(vector_path, "wb") as vector_file, open(os.path.join(path, "payloads.jsonl"), "wb") as payload_file:
+            next_offset = None
+            while True:
+                points, next_offset = client.scroll(
+                    collection_name=collection_name,
+                    limit=batch_size,
+                    offset=next_offset,
+                    with_payload=list(PAYLOAD_FIELDS),
+                    with_vectors=True
+                )
+                if not points:
+                    break
+                vectors = np.asarray([p.vector for p in points], dtype=np.float32)
+                vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+                vector_file.write(vectors.tobytes())
+                for point in points:
+                    ids.append(int(point.id))
+                    offsets.append(payload_file.tell())
+                    payload = {k: point.payload.get(k) for k in PAYLOAD_FIELDS if k in (point.payload or {})}
+                    payload_file.write(json.dumps(payload).encode("utf-8") + b"\n")
+                count += len(points)
+                log(f"Snapshotted {count} points from '{collection_name}'")
+                if next_offset is None:
+                    break
+            offsets.append(payload_file.tell())
+
+        np.save(os.path.join(path, "ids.npy"), np.asarray(ids, dtype=np.int64))
+        np.save(os.path.join(path, "payload_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"collection_name": collection_name, "count": count, "dim": dim}, f)
+        return count
+
+    def _row(self, point_id):
+        pos = np.searchsorted(self._sorted_ids, int(point_id))
+        if pos < len(self._sorted_ids) and self._sorted_ids[pos] == int(point_id):
+            return int(self._sorted_rows[pos])
+        return None
+
+    def _payload(self, row):
+        # pread keeps concurrent lookups from different sessions independent of a shared file position
+        start, end = int(self.payload_offsets[row]), int(self.payload_offsets[row + 1])
+        return json.loads(os.pread(self._payload_fd, end - start, start))
+
+    def retrieve(self, point_id, with_vectors=False):
+        """Return a list with the Record for point_id (empty if unknown), like QdrantClient.retrieve"""
+        row = self._row(point_id)
+        if row is None:
+            return []
+        vector = self.vectors[row].tolist() if with_vectors else None
+        return [models.Record(id=int(self.ids[row]), payload=self._payload(row), vector=vector)]
+
+    def search(self, query_vector, limit=5, exclude_ids=None, score_threshold=0.0):
+        """Exact cosine search; returns ScoredPoint objects ordered by descending score"""
+        query = np.array(query_vector, dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+        scores = self.vectors @ query
+
+        if exclude_ids:
+            rows = [self._row(i) for i in exclude_ids]
+            scores[[r for r in rows if r is not None]] = -np.inf
+        if score_threshold is not None:
+            scores[scores < score_threshold] = -np.inf
+
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            models.ScoredPoint(id=int(self.ids[row]), version=0, score=float(scores[row]), payload=self._payload(row))
+            for row in top if np.isfinite(scores[row])
+        ]
+
+
+def main():
+    from database.qdrant_connector import QdrantConnector
+
+    parser = argparse.ArgumentParser(description="Snapshot the Qdrant books collection for local search")
+    parser.add_argument("--out", default=os.getenv("QDRANT_LOCAL_INDEX_PATH", "qdrant_local_index"))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    connector = QdrantConnector()
+    # Always the service: connect() would load the snapshot itself in the local/fallback modes
+    status, message = connector.connect_remote()
+    if not status:
+        print(message)
+        return
+    count = LocalVectorIndex.snapshot(connector.client, connector.collection_name, args.out, args.batch_size)
+    print(f"Wrote {count} points to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Upper bounds (seconds) of the latency histogram buckets, the Prometheus client defaults
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Span:
+    """Handle yielded by Metrics.timed(); set items (rows, points) and error before the block ends"""
+    __slots__ = ("items", "error")
+
+    def __init__(self):
+        self.items = None
+        self.error = False
+
+
+class _Operation:
+    def __init__(self, n_buckets, window):
+        self.buckets = [0] * n_buckets
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.items = 0
+        self.recent = deque(maxlen=window)
+
+
+class Metrics:
+    """
+    Instrumentation shared by the connectors: a latency histogram, item count (rows or points)
+    and error counter per (backend, operation), plus the stats() of the registered caches.
+
+    Connectors wrap their calls in timed(); snapshot() returns everything as a dict (with
+    p50/p95/p99 over the last `window` calls of each operation), prometheus_text() in the
+    Prometheus text format, and serve() exposes both over HTTP.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window=1024):
+        """
+        Parameters:
+        - buckets: upper bounds in seconds of the latency histogram buckets
+        - window: number of recent calls per operation the percentiles are computed from
+        """
+        self.buckets = tuple(buckets)
+        self.window = window
+        self._operations = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def observe(self, backend, operation, seconds, items=None, error=False):
+        """Record one call of backend.operation"""
+        with self._lock:
+            key = (backend, operation)
+            op = self._operations.get(key)
+            if op is None:
+                op = self._operations[key] = _Operation(len(self.buckets), self.window)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    op.buckets[i] += 1
+                    break
+            op.count += 1
+            op.total += seconds
+            op.errors += bool(error)
+            op.items += items or 0
+            op.recent.append(seconds)
+
+    @contextmanager
+    def timed(self, backend, operation):
+        """
+        Time the enclosed block as one call of backend.operation. An exception counts as an
+        error and is re-raised (GeneratorExit from a generator closed early does not count);
+        code that handles its own errors sets span.error instead.
+        """
+        span = Span()
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception:
+            span.error = True
+            raise
+        finally:
+            self.observe(backend, operation, time.perf_counter() - start, span.items, span.error)
+
+    def register_cache(self, name, stats):
+        """Report a cache's stats() (hits, misses, hit_rate, ...) under name"""
+        with self._lock:
+            self._caches[name] = stats
+
+    def reset(self):
+        """Forget all recorded calls (registered caches are kept)"""
+        with self._lock:
+            self._operations.clear()
+
+    def snapshot(self):
+        """
+        Returns {"operations": {"backend.operation": {...}}, "caches": {name: stats}} where each
+        operation has count, errors, items, mean_ms and p50/p95/p99_ms of the recent calls.
+        """
+        with self._lock:
+            operations = {key: (op.count, op.errors, op.items, op.total, list(op.recent))
+                          for key, op in self._operations.items()}
+            caches = dict(self._caches)
+
+        result = {"operations": {}, "caches": {}}
+        for (backend, operation), (count, errors, items, total, recent) in sorted(operations.items()):
+            ms = np.asarray(recent) * 1000.0
+            result["operations"][f"{backend}.{operation}"] = {
+                "count": count,
+                "errors": errors,
+                "items": items,
+                "mean_ms": round(total * 1000.0 / count, 3) if count else 0.0,
+                "p50_ms": round(float(np.percentile(ms, 50)), 3) if len(ms) else 0.0,
+                "p95_ms": round(float(np.percentile(ms, 95)), 3) if len(ms) else 0.0,
+                "p99_ms": round(float(np.percentile(ms, 99)), 3) if len(ms) else 0.0
+            }
+        for name, stats in caches.items():
+            try:
+                result["caches"][name] = stats()
+            except Exception as e:
+                result["caches"][name] = {"error": str(e)}
+        return result
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            operations = {key: (list(op.buckets), op.count, op.total, op.errors, op.items)
+                          for key, op in self._operations.items()}
+            caches = dict(self._caches)
+
+        lines = [
+            "# HELP bookrec_operation_seconds Latency of connector operations",
+            "# TYPE bookrec_operation_seconds histogram"
+        ]
+        for (backend, operation), (buckets, count, total, _, _) in sorted(operations.items()):
+            labels = f'backend="{backend}",operation="{operation}"'
+            cumulative = 0
+            for bound, n in zip(self.buckets, buckets):
+                cumulative += n
+                lines.append(f'bookrec_operation_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'bookrec_operation_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"bookrec_operation_seconds_sum{{{labels}}} {total}")
+            lines.append(f"bookrec_operation_seconds_count{{{labels}}} {count}")
+
+        for name, index, help_text in (("errors", 3, "Failed connector operations"),
+                                       ("items", 4, "Rows or points returned by connector operations")):
+            lines.append(f"# HELP bookrec_operation_{name}_total {help_text}")
+            lines.append(f"# TYPE bookrec_operation_{name}_total counter")
+            for (backend, operation), values in sorted(operations.items()):
+                lines.append(f'bookrec_operation_{name}_total{{backend="{backend}",operation="{operation}"}} '
+                             f"{values[index]}")
+
+        lines.append("# HELP bookrec_cache Cache statistics (hits, misses, hit_rate, entries, ...)")
+        lines.append("# TYPE bookrec_cache gauge")
+        for name, stats in sorted(caches.items()):
+            try:
+                values = stats()
+            except Exception:
+                continue
+            for field, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'bookrec_cache{{cache="{name}",field="{field}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="0.0.0.0"):
+        """
+        Serve /metrics (Prometheus text) and /metrics.json (snapshot) from a daemon thread.
+        Returns the server; calling it again returns the running one.
+        """
+        if self._server is not None:
+            return self._server
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.prometheus_text(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot(), default=str), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        return self._server
+
+
+# Registry used by all connectors in the process
+METRICS = Metrics()
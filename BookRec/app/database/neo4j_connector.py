@@ -1,6 +1,138 @@
 from neo4j import GraphDatabase
 import os
+import uuid
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from database.metrics import METRICS
+from database.recommendation_cache import RecommendationCache
+from database.similarity_index import ItemSimilarityIndex
+from database.user_lsh import UserLSHIndex
+
+
+CF_QUERY = """
+// Step 1: Find other users who rated the same books and compute similarity per common book.
+// The target's rating is the tr relationship on the same path, so no per-book lookup is needed.
+MATCH (target:User {user_id: $user_id})-[tr:INTERACTED]->(b:Book)<-[r1:INTERACTED]-(other:User)
+WHERE other <> target
+WITH target, other, (1 - abs(tr.rating - r1.rating)/4.0) AS simScore
+// Step 2: For each similar user, average the similarity scores over common books
+WITH target, other, avg(simScore) AS user_similarity, count(*) AS commonCount
+WHERE commonCount >= $min_common_books AND user_similarity >= $min_similarity
+// Step 3: With a $max_neighbors cap, keep the users with the most common books (the best
+// evidence) before expanding their ratings
+WITH target, other, user_similarity
+ORDER BY commonCount DESC, user_similarity DESC, other.user_id
+LIMIT $max_neighbors
+// Step 4: Get candidate recommendations from similar users (books not rated by target)
+MATCH (other)-[r2:INTERACTED]->(rec:Book)
+WHERE ($min_rating IS NULL OR r2.rating >= $min_rating) AND NOT (target)-[:INTERACTED]->(rec)
+// Step 5: For each candidate book, sum weighted ratings from all similar users and compute average
+WITH rec, sum(user_similarity * r2.rating) AS weightedSum, count(r2.rating) AS ratingCount
+RETURN rec.work_id AS work_id, rec.title AS title, weightedSum / ratingCount AS cf_score
+ORDER BY cf_score DESC
+LIMIT $limit
+"""
+
+# Same scoring as CF_QUERY, but the target's ratings come in as the $ratings parameter
+# instead of INTERACTED edges, so nothing is written to the graph. $rated maps the same
+# work_ids to their ratings, so excluding rated books is a map lookup per candidate.
+PARAMETER_CF_QUERY = """
+// Step 1: Find other users who rated the same books and compute similarity per common book
+UNWIND $ratings AS t
+MATCH (b:Book {work_id: t.work_id})<-[r1:INTERACTED]-(other:User)
+WITH other, (1 - abs(t.rating - r1.rating)/4.0) AS simScore
+// Step 2: For each similar user, average the similarity scores over common books
+WITH other, avg(simScore) AS user_similarity, count(*) AS commonCount
+WHERE commonCount >= $min_common_books AND user_similarity >= $min_similarity
+// Step 3: With a $max_neighbors cap, keep the users with the most common books (the best
+// evidence) before expanding their ratings
+WITH other, user_similarity
+ORDER BY commonCount DESC, user_similarity DESC, other.user_id
+LIMIT $max_neighbors
+// Step 4: Get candidate recommendations from similar users (books not rated by target)
+MATCH (other)-[r2:INTERACTED]->(rec:Book)
+WHERE ($min_rating IS NULL OR r2.rating >= $min_rating) AND $rated[rec.work_id] IS NULL
+// Step 5: For each candidate book, sum weighted ratings from all similar users and compute average
+WITH rec, sum(user_similarity * r2.rating) AS weightedSum, count(r2.rating) AS ratingCount
+RETURN rec.work_id AS work_id, rec.title AS title, weightedSum / ratingCount AS cf_score
+ORDER BY cf_score DESC
+LIMIT $limit
+"""
+
+# CF_QUERY with the neighbours restricted to $candidates (from the user LSH index): the
+# traversal starts from the candidates' ratings instead of every rater of the target's books
+LSH_CF_QUERY = """
+// Step 1: Compare only the candidate users with the target, per common book
+UNWIND $candidates AS candidate_id
+MATCH (other:User {user_id: candidate_id})-[r1:INTERACTED]->(b:Book)<-[tr:INTERACTED]-(target:User {user_id: $user_id})
+WITH target, other, (1 - abs(tr.rating - r1.rating)/4.0) AS simScore
+// Step 2: For each similar user, average the similarity scores over common books
+WITH target, other, avg(simScore) AS user_similarity, count(*) AS commonCount
+WHERE commonCount >= $min_common_books AND user_similarity >= $min_similarity
+// Step 3: With a $max_neighbors cap, keep the users with the most common books (the best
+// evidence) before expanding their ratings
+WITH target, other, user_similarity
+ORDER BY commonCount DESC, user_similarity DESC, other.user_id
+LIMIT $max_neighbors
+// Step 4: Get candidate recommendations from similar users (books not rated by target)
+MATCH (other)-[r2:INTERACTED]->(rec:Book)
+WHERE ($min_rating IS NULL OR r2.rating >= $min_rating) AND NOT (target)-[:INTERACTED]->(rec)
+// Step 5: For each candidate book, sum weighted ratings from all similar users and compute average
+WITH rec, sum(user_similarity * r2.rating) AS weightedSum, count(r2.rating) AS ratingCount
+RETURN rec.work_id AS work_id, rec.title AS title, weightedSum / ratingCount AS cf_score
+ORDER BY cf_score DESC
+LIMIT $limit
+"""
+
+# PARAMETER_CF_QUERY with the neighbours restricted to $candidates
+LSH_PARAMETER_CF_QUERY = """
+// Step 1: Compare only the candidate users with the $rated ratings, per common book
+UNWIND $candidates AS candidate_id
+MATCH (other:User {user_id: candidate_id})-[r1:INTERACTED]->(b:Book)
+WHERE $rated[b.work_id] IS NOT NULL
+WITH other, (1 - abs($rated[b.work_id] - r1.rating)/4.0) AS simScore
+// Step 2: For each similar user, average the similarity scores over common books
+WITH other, avg(simScore) AS user_similarity, count(*) AS commonCount
+WHERE commonCount >= $min_common_books AND user_similarity >= $min_similarity
+// Step 3: With a $max_neighbors cap, keep the users with the most common books (the best
+// evidence) before expanding their ratings
+WITH other, user_similarity
+ORDER BY commonCount DESC, user_similarity DESC, other.user_id
+LIMIT $max_neighbors
+// Step 4: Get candidate recommendations from similar users (books not rated by target)
+MATCH (other)-[r2:INTERACTED]->(rec:Book)
+WHERE ($min_rating IS NULL OR r2.rating >= $min_rating) AND $rated[rec.work_id] IS NULL
+// Step 5: For each candidate book, sum weighted ratings from all similar users and compute average
+WITH rec, sum(user_similarity * r2.rating) AS weightedSum, count(r2.rating) AS ratingCount
+RETURN rec.work_id AS work_id, rec.title AS title, weightedSum / ratingCount AS cf_score
+ORDER BY cf_score DESC
+LIMIT $limit
+"""
+
+USER_WORK_IDS_QUERY = """
+MATCH (:User {user_id: $user_id})-[:INTERACTED]->(b:Book)
+RETURN b.work_id AS work_id
+"""
+
+# LIMIT needs an integer; this stands in for "no cap on the number of neighbours"
+UNLIMITED_NEIGHBORS = 2 ** 31 - 1
+
+INSERT_RATINGS_QUERY = """
+MERGE (u:User {user_id: $user_id})
+WITH u
+UNWIND $ratings AS ratingData
+MATCH (b:Book {work_id: ratingData.work_id})
+MERGE (u)-[r:INTERACTED]->(b)
+SET r.rating = ratingData.rating
+"""
+
+MOST_ACTIVE_USERS_QUERY = """
+MATCH (u:User)-[r:INTERACTED]->()
+RETURN u.user_id AS user_id, count(r) AS ratings
+ORDER BY ratings DESC
+LIMIT $limit
+"""
+
 
 class Neo4jConnector:
     def __init__(self):
@@ -11,11 +143,48 @@ class Neo4jConnector:
         self.password = os.getenv("NEO4J_PASSWORD")
         self.driver = None
 
+        # Driver connection pool and session settings (defaults match the neo4j driver's)
+        self.max_connection_pool_size = int(os.getenv("NEO4J_MAX_POOL_SIZE", "100"))
+        self.connection_acquisition_timeout = float(os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "60"))
+        self.max_connection_lifetime = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
+        self.database = os.getenv("NEO4J_DATABASE")
+        self.fetch_size = int(os.getenv("NEO4J_FETCH_SIZE", "1000"))
+
+        self.similarity_index_path = os.getenv("CF_INDEX_PATH")
+        self.similarity_index = None
+
+        # MinHash LSH index of users (python -m database.user_lsh); when CF_LSH_PATH is set the
+        # CF queries only compare the target with the CF_LSH_CANDIDATES users it returns
+        self.user_lsh_path = os.getenv("CF_LSH_PATH")
+        self.user_lsh = None
+        self.cf_lsh_candidates = int(os.getenv("CF_LSH_CANDIDATES", "5000"))
+
+        # Results per user and rating set; insert_user_ratings moves the user to new entries.
+        # RECOMMENDATION_CACHE_PATH adds a SQLite tier shared by the processes on this host.
+        ttl = os.getenv("RECOMMENDATION_CACHE_TTL", "3600")
+        self.recommendation_cache = RecommendationCache(
+            max_entries=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "1000")),
+            ttl=float(ttl) if ttl else None,
+            sqlite_path=os.getenv("RECOMMENDATION_CACHE_PATH")
+        )
+        METRICS.register_cache("recommendations", self.recommendation_cache.stats)
+
+        # Neighbour pruning for the CF queries: users less similar than CF_MIN_SIMILARITY are
+        # dropped and, when CF_MAX_NEIGHBORS is set, only the users with the most common books are
+        # expanded. Off by default: cf_score averages over every neighbour that rated a book, so
+        # any cap changes the top results (see benchmarks/bench_cf_query.py)
+        self.cf_min_similarity = float(os.getenv("CF_MIN_SIMILARITY", "0.0"))
+        max_neighbors = os.getenv("CF_MAX_NEIGHBORS", "")
+        self.cf_max_neighbors = int(max_neighbors) if max_neighbors else None
+
     def connect(self):
         try:
             self.driver = GraphDatabase.driver(
                 self.uri, 
-                auth=(self.user, self.password)
+                auth=(self.user, self.password),
+                max_connection_pool_size=self.max_connection_pool_size,
+                connection_acquisition_timeout=self.connection_acquisition_timeout,
+                max_connection_lifetime=self.max_connection_lifetime
             )
             print("Connected to Neo4j database")
             return True
@@ -28,54 +197,205 @@ class Neo4jConnector:
             self.driver.close()
             print("Neo4j connection closed")
     
+    def session(self):
+        """Opens a session with the configured database and fetch size"""
+        assert self.driver is not None, "Driver not initialized. Call connect() first."
+        return self.driver.session(database=self.database, fetch_size=self.fetch_size)
+
     def execute_query(self, query, parameters=None):
         assert self.driver is not None, "Driver not initialized. Call connect() first."
         
-        try:
-            with self.driver.session() as session:
-                result = session.run(query, parameters or {})
-                return [record.data() for record in result]
-        except Exception as e:
-            print(f"Query execution error: {str(e)}")
-            return []
+        with METRICS.timed("neo4j", "query") as span:
+            try:
+                with self.session() as session:
+                    result = session.run(query, parameters or {})
+                    rows = [record.data() for record in result]
+                span.items = len(rows)
+                return rows
+            except Exception as e:
+                span.error = True
+                print(f"Query execution error: {str(e)}")
+                return []
 
-    def get_collaborative_recommendations(self, user_id, min_rating=4.0, min_common_books=2, limit=10):
+    def get_collaborative_recommendations(self, user_id, min_rating=None, min_common_books=2, limit=10,
+                                          min_similarity=None, max_neighbors=None, refresh=False):
         """
         Returns collaborative filtering recommendations based on the user's ratings.
         The query assumes that each user has INTERACTED relationships with Book nodes, 
         with a 'rating' property.
+        Results come from recommendation_cache when possible; refresh=True recomputes them.
+
+        Parameters:
+        - min_rating: only books the similar users rated at least this high are candidates (None = all)
+        - min_common_books: books a user must share with user_id to count as similar
+        - limit: number of results
+        - min_similarity, max_neighbors: neighbour pruning, defaulting to cf_min_similarity and
+          cf_max_neighbors (max_neighbors=0 = no cap)
         """
-        cf_query = """
-        // Step 1: Get target user's ratings for common books
-        MATCH (target:User {user_id: "temp_user"})-[r:INTERACTED]->(b:Book)
-        WITH target, collect({work_id: b.work_id, rating: r.rating}) AS targetRatings
-        // Step 2: Find common books between target and other users and compute similarity per common book
-        MATCH (target)-[r1:INTERACTED]->(b:Book)<-[:INTERACTED]-(other:User)
-        WHERE other.user_id <> target.user_id
-        WITH target, targetRatings, other, b.work_id AS commonBook, r1.rating AS otherRating,
-                head([t IN targetRatings WHERE t.work_id = b.work_id]) AS targetRating
-        WITH target, targetRatings, other, (1 - abs(targetRating.rating - otherRating)/4.0) AS simScore
-        // Step 3: For each similar user, average the similarity scores over common books
-        WITH target, targetRatings, other, collect(simScore) AS simScores, count(*) AS commonCount
-        WHERE commonCount >= 2
-        WITH target, targetRatings, other, reduce(s = 0.0, x IN simScores | s + x) / size(simScores) AS user_similarity
-        // Step 4: Get candidate recommendations from similar users (books not rated by target)
-        MATCH (other)-[r2:INTERACTED]->(rec:Book)
-        WHERE NOT rec.work_id IN [t IN targetRatings | t.work_id]
-        WITH rec, user_similarity, r2.rating AS candidateRating
-        // Step 5: For each candidate book, sum weighted ratings from all similar users and compute average
-        WITH rec, sum(user_similarity * candidateRating) AS weightedSum, count(candidateRating) AS ratingCount
-        RETURN rec.work_id AS work_id, rec.title AS title, weightedSum / ratingCount AS cf_score
-        ORDER BY cf_score DESC
-        LIMIT 10
+        params = self._cf_params(min_rating, min_common_books, limit, min_similarity, max_neighbors)
+
+        def compute():
+            candidates = self.get_lsh_candidates(user_id=user_id)
+            if candidates:
+                return self.execute_query(LSH_CF_QUERY, {**params, "user_id": user_id, "candidates": candidates})
+            return self.execute_query(CF_QUERY, {**params, "user_id": user_id})
+
+        with METRICS.timed("neo4j", "collaborative_recommendations") as span:
+            result = self.recommendation_cache.get_or_compute(user_id, "cf", compute, refresh=refresh, **params)
+            span.items = len(result)
+            return result
+
+    def _cf_params(self, min_rating, min_common_books, limit, min_similarity, max_neighbors):
+        """Parameters shared by CF_QUERY and PARAMETER_CF_QUERY, with the connector's pruning defaults"""
+        if min_similarity is None:
+            min_similarity = self.cf_min_similarity
+        if max_neighbors is None:
+            max_neighbors = self.cf_max_neighbors
+        return {
+            "min_rating": None if min_rating is None else float(min_rating),
+            "min_common_books": int(min_common_books),
+            "min_similarity": float(min_similarity),
+            "max_neighbors": int(max_neighbors) if max_neighbors else UNLIMITED_NEIGHBORS,
+            "limit": int(limit)
+        }
+
+    def load_user_lsh(self, path=None):
         """
-        params = {
-            "user_id": user_id,
-            "min_rating": min_rating,
-            "min_common_books": min_common_books,
-            "limit": limit
+        Loads the user LSH index built by `python -m database.user_lsh`
+        (defaults to the CF_LSH_PATH env variable).
+        """
+        path = path or self.user_lsh_path
+        if not path or not os.path.isdir(path):
+            print(f"User LSH index not found at: {path}")
+            self.user_lsh_path = None
+            return False
+        self.user_lsh = UserLSHIndex.load(path)
+        print(f"Loaded user LSH index with {len(self.user_lsh)} users")
+        return True
+
+    def get_lsh_candidates(self, work_ids=None, user_id=None):
+        """
+        Returns the candidate neighbours of a set of work_ids (or of user_id's rated books) from
+        the user LSH index, or None when no index is configured so the caller compares with
+        every user.
+        """
+        if self.user_lsh is None and (not self.user_lsh_path or not self.load_user_lsh()):
+            return None
+        if work_ids is None:
+            work_ids = [row["work_id"] for row in self.execute_query(USER_WORK_IDS_QUERY, {"user_id": user_id})]
+        with METRICS.timed("neo4j", "lsh_candidates") as span:
+            candidates = self.user_lsh.candidates(work_ids, max_candidates=self.cf_lsh_candidates, exclude=user_id)
+            span.items = len(candidates)
+            return candidates
+
+    def get_most_active_users(self, limit=50):
+        """Returns the user_ids with the most ratings, most first"""
+        return [row["user_id"] for row in self.execute_query(MOST_ACTIVE_USERS_QUERY, {"limit": limit})]
+
+    def load_similarity_index(self, path=None):
+        """
+        Loads the precomputed item-item similarity index built by
+        `python -m database.similarity_index` (defaults to the CF_INDEX_PATH env variable).
+        """
+        path = path or self.similarity_index_path
+        if not path or not os.path.isdir(path):
+            print(f"Similarity index not found at: {path}")
+            return False
+        self.similarity_index = ItemSimilarityIndex.load(path)
+        print(f"Loaded similarity index with {len(self.similarity_index)} books")
+        return True
+
+    def get_item_based_recommendations(self, rated_books_data, limit=10):
+        """
+        Returns recommendations from the precomputed item-item similarity index instead of
+        traversing the graph. rated_books_data has the same shape as in insert_user_ratings.
+        Titles are filled in with a single indexed lookup on the returned work_ids.
+        Results have the same keys as get_collaborative_recommendations.
+        """
+        if self.similarity_index is None and not self.load_similarity_index():
+            return []
+
+        with METRICS.timed("neo4j", "item_similarity_index") as span:
+            recommendations = self.similarity_index.recommend(rated_books_data, limit=limit)
+            span.items = len(recommendations)
+        if not recommendations or self.driver is None:
+            return recommendations
+
+        query = """
+        MATCH (b:Book) WHERE b.work_id IN $work_ids
+        RETURN b.work_id AS work_id, b.title AS title
+        """
+        titles = {
+            row["work_id"]: row["title"]
+            for row in self.execute_query(query, {"work_ids": [r["work_id"] for r in recommendations]})
         }
-        return self.execute_query(cf_query, params)
+        return [
+            {"work_id": r["work_id"], "title": titles.get(r["work_id"]), "cf_score": r["cf_score"]}
+            for r in recommendations
+        ]
+
+    @contextmanager
+    def ephemeral_user(self, rated_books_data, user_id=None):
+        """
+        Inserts ratings for a throwaway user inside a single explicit transaction that is always
+        rolled back on exit, so nothing is committed and no DETACH DELETE is needed afterwards.
+        Yields (tx, user_id); queries run on tx see the user's ratings.
+        A unique user_id is generated by default so concurrent sessions never contend for
+        the same User node.
+        """
+        user_id = user_id or f"temp_user_{uuid.uuid4().hex}"
+        with self.session() as session:
+            tx = session.begin_transaction()
+            try:
+                tx.run(INSERT_RATINGS_QUERY, {"user_id": user_id, "ratings": _ratings_param(rated_books_data)})
+                yield tx, user_id
+            finally:
+                if not tx.closed():
+                    tx.rollback()
+
+    def get_ephemeral_recommendations(self, rated_books_data, min_common_books=2, limit=10, mode="parameter",
+                                      user_id=None, min_rating=None, min_similarity=None, max_neighbors=None):
+        """
+        Returns collaborative filtering recommendations for ratings that are never committed.
+        mode="parameter" passes the ratings as a query parameter in a read transaction (no writes at all);
+        mode="rollback" does insert, score and cleanup in one transaction that is rolled back.
+        Results have the same keys as get_collaborative_recommendations and are cached by the hash of
+        rated_books_data (and user_id, if given, so the refresher can find them).
+        """
+        if not rated_books_data:
+            return []
+        params = self._cf_params(min_rating, min_common_books, limit, min_similarity, max_neighbors)
+        with METRICS.timed("neo4j", "ephemeral_recommendations") as span:
+            result = self.recommendation_cache.get_or_compute(
+                user_id, "cf", lambda: self._ephemeral_recommendations(rated_books_data, params, mode),
+                rated_books_data=rated_books_data, **params
+            )
+            span.items = len(result)
+            return result
+
+    def _ephemeral_recommendations(self, rated_books_data, params, mode):
+        with METRICS.timed("neo4j", f"ephemeral_query_{mode}") as span:
+            try:
+                candidates = self.get_lsh_candidates(work_ids=list(rated_books_data))
+                if candidates:
+                    params = {**params, "candidates": candidates}
+
+                if mode == "rollback":
+                    with self.ephemeral_user(rated_books_data) as (tx, user_id):
+                        result = tx.run(LSH_CF_QUERY if candidates else CF_QUERY, {**params, "user_id": user_id})
+                        rows = [record.data() for record in result]
+                else:
+                    ratings = _ratings_param(rated_books_data)
+                    params = {**params, "ratings": ratings, "rated": {r["work_id"]: r["rating"] for r in ratings}}
+                    query = LSH_PARAMETER_CF_QUERY if candidates else PARAMETER_CF_QUERY
+                    with self.session() as session:
+                        rows = session.execute_read(lambda tx: [record.data() for record in tx.run(query, params)])
+                span.items = len(rows)
+                return rows
+            except Exception as e:
+                span.error = True
+                print(f"Query execution error: {str(e)}")
+                return []
 
     def get_all_book_titles(self, limit=1000):
         """
@@ -90,19 +410,13 @@ class Neo4jConnector:
         rated_books_data should be a dictionary where each key is a work_id and each value is a dictionary
         with at least a 'rating' key.
         """
-        query = """
-        UNWIND $ratings AS ratingData
-        MERGE (u:User {user_id: $user_id})
-        WITH u, ratingData
-        MATCH (b:Book {work_id: ratingData.work_id})
-        MERGE (u)-[r:INTERACTED]->(b)
-        SET r.rating = ratingData.rating
-        """
         params = {
             "user_id": user_id,
-            "ratings": [{"work_id": work_id, "rating": data["rating"]} for work_id, data in rated_books_data.items()]
+            "ratings": _ratings_param(rated_books_data)
         }
-        return self.execute_query(query, params)
+        result = self.execute_query(INSERT_RATINGS_QUERY, params)
+        self.recommendation_cache.record_ratings(user_id, rated_books_data)
+        return result
 
     def clear_temp_user(self, user_id):
         """
@@ -112,4 +426,14 @@ class Neo4jConnector:
         MATCH (u:User {user_id: $user_id})
         DETACH DELETE u
         """
-        return self.execute_query(query, {"user_id": user_id})
+        result = self.execute_query(query, {"user_id": user_id})
+        self.recommendation_cache.invalidate_user(user_id)
+        return result
+
+
+def _ratings_param(rated_books_data):
+    """
+    Converts {work_id: {"rating": ...}} into the list of maps the rating queries UNWIND.
+    Book.work_id is a string in the graph (LOAD CSV), so int keys are converted to match it.
+    """
+    return [{"work_id": str(work_id), "rating": data["rating"]} for work_id, data in rated_books_data.items()]
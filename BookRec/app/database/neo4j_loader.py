@@ -0,0 +1,229 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from database.table_files import column_names, iter_chunks, read_table
+
+CONSTRAINT_QUERIES = [
+    "CREATE CONSTRAINT book_unique IF NOT EXISTS FOR (b:Book) REQUIRE b.work_id IS UNIQUE",
+    "CREATE CONSTRAINT user_unique IF NOT EXISTS FOR (u:User) REQUIRE u.user_id IS UNIQUE"
+]
+
+BOOKS_QUERY = """
+UNWIND $rows AS row
+MERGE (b:Book {work_id: row.work_id})
+SET b.title = row.title,
+    b.authors = row.authors,
+    b.ratings_count = row.ratings_count,
+    b.average_rating = row.average_rating
+"""
+
+USERS_QUERY = """
+UNWIND $user_ids AS user_id
+MERGE (:User {user_id: user_id})
+"""
+
+# Users and books already exist, so both ends are index lookups
+INTERACTIONS_QUERY = """
+UNWIND $rows AS row
+MATCH (u:User {user_id: row.user_id})
+MATCH (b:Book {work_id: row.work_id})
+MERGE (u)-[r:INTERACTED]->(b)
+SET r.rating = row.rating,
+    r.timestamp = row.timestamp
+"""
+
+# For an empty graph: the pairs are deduplicated up front, so CREATE cannot add duplicates
+CREATE_INTERACTIONS_QUERY = """
+UNWIND $rows AS row
+MATCH (u:User {user_id: row.user_id})
+MATCH (b:Book {work_id: row.work_id})
+CREATE (u)-[:INTERACTED {rating: row.rating, timestamp: row.timestamp}]->(b)
+"""
+
+
+def _nullable(series):
+    """Object array of Python scalars with NaN / NA replaced by None, so the driver sends null"""
+    values = series.astype(object).to_numpy(copy=True)
+    values[pd.isna(values)] = None
+    return values
+
+
+def read_books(path):
+    """
+    Read the cleaned Neo4j books CSV or Parquet file, keeping the last row per work_id (what
+    MERGE + SET ends up with). work_id stays a string, like LOAD CSV stores it.
+    """
+    books = read_table(path, dtype={"work_id": str})
+    if "authors" not in books:
+        # The notebooks write author_ids; LOAD CSV sets a missing column to null
+        books["authors"] = None
+    books = books.dropna(subset=["work_id"]).drop_duplicates("work_id", keep="last")
+    books["ratings_count"] = pd.to_numeric(books.get("ratings_count"), errors="coerce").astype("Int64")
+    books["average_rating"] = pd.to_numeric(books.get("average_rating"), errors="coerce")
+    return books.reset_index(drop=True)
+
+
+def read_interactions(path, book_ids, chunksize=1_000_000):
+    """
+    Read the cleaned interactions CSV or Parquet file in chunks and return one row per (user_id, work_id) pair,
+    the last one in the file (what MERGE + SET ends up with). Rows for books that are not in
+    book_ids are dropped, since the MATCH in the import would skip them anyway.
+    """
+    header = column_names(path)
+    columns = ["user_id", "work_id", "rating"] + (["timestamp"] if "timestamp" in header else [])
+    book_ids = pd.Index(book_ids)
+    chunks = []
+    for chunk in iter_chunks(path, chunksize, columns=columns, dtype={"user_id": str, "work_id": str}):
+        chunk = chunk.dropna(subset=["user_id", "work_id"])
+        chunks.append(chunk[chunk["work_id"].isin(book_ids)])
+    interactions = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+    interactions = interactions.drop_duplicates(["user_id", "work_id"], keep="last")
+    if "timestamp" not in interactions:
+        interactions["timestamp"] = None
+    interactions["rating"] = interactions["rating"].astype(float)
+    return interactions.reset_index(drop=True)
+
+
+def _records(frame, columns):
+    arrays = [_nullable(frame[c]) for c in columns]
+    return [dict(zip(columns, values)) for values in zip(*arrays)]
+
+
+def _report(log, phase, rows, seconds):
+    log(f"{phase}: {rows} rows in {seconds:.1f}s ({rows / max(seconds, 1e-9):.0f} rows/s)")
+
+
+def load_books(connector, books, batch_size=10000, log=print):
+    start = time.perf_counter()
+    with connector.session() as session:
+        for query in CONSTRAINT_QUERIES:
+            session.run(query).consume()
+        for s in range(0, len(books), batch_size):
+            rows = _records(books.iloc[s:s + batch_size],
+                            ["work_id", "title", "authors", "ratings_count", "average_rating"])
+            session.execute_write(lambda tx: tx.run(BOOKS_QUERY, rows=rows).consume())
+    _report(log, "Books", len(books), time.perf_counter() - start)
+
+
+def _partitions(interactions, workers):
+    """
+    Split the rows by user so no two sessions ever write relationships for the same User node.
+    Returns a list of (user_ids, rows) per partition.
+    """
+    codes, user_ids = pd.factorize(interactions["user_id"])
+    partition = codes % workers
+    return [
+        (user_ids[p::workers], interactions.iloc[np.flatnonzero(partition == p)])
+        for p in range(workers)
+    ]
+
+
+def _load_partition(connector, users, rows, batch_size, query, progress):
+    with connector.session() as session:
+        for s in range(0, len(users), batch_size):
+            user_ids = users[s:s + batch_size].tolist()
+            session.execute_write(lambda tx: tx.run(USERS_QUERY, user_ids=user_ids).consume())
+        for s in range(0, len(rows), batch_size):
+            batch = _records(rows.iloc[s:s + batch_size], ["user_id", "work_id", "rating", "timestamp"])
+            # execute_write retries transient errors, e.g. a deadlock on a popular Book node
+            session.execute_write(lambda tx: tx.run(query, rows=batch).consume())
+            progress(len(batch))
+
+
+def load_interactions(connector, interactions, workers=4, batch_size=20000, fresh=False, log=print):
+    """
+    Load users and INTERACTED relationships with `workers` parallel sessions. Each session owns
+    the users whose index falls in its partition, creates them, then sends its relationships in
+    UNWIND batches of batch_size. fresh=True uses CREATE instead of MERGE for relationships,
+    which is only correct when the graph has no INTERACTED relationships yet.
+    """
+    start = time.perf_counter()
+    query = CREATE_INTERACTIONS_QUERY if fresh else INTERACTIONS_QUERY
+    partitions = _partitions(interactions, workers)
+    log(f"Loading {len(interactions)} interactions from {sum(len(u) for u, _ in partitions)} users "
+        f"with {workers} sessions")
+
+    lock = threading.Lock()
+    state = {"done": 0, "reported": start}
+
+    def progress(count):
+        with lock:
+            state["done"] += count
+            now = time.perf_counter()
+            if now - state["reported"] >= 10:
+                state["reported"] = now
+                _report(log, "Interactions so far", state["done"], now - start)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_load_partition, connector, users, rows, batch_size, query, progress)
+            for users, rows in partitions
+        ]
+        for future in futures:
+            future.result()
+    _report(log, "Interactions", len(interactions), time.perf_counter() - start)
+
+
+def write_admin_import(books, interactions, out_dir, log=print):
+    """
+    Write node and relationship CSVs for an offline `neo4j-admin database import full`, which
+    builds the store files directly and is the fastest way to load an empty database.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    books_path = os.path.join(out_dir, "books.csv")
+    users_path = os.path.join(out_dir, "users.csv")
+    interactions_path = os.path.join(out_dir, "interacted.csv")
+
+    books[["work_id", "title", "authors", "ratings_count", "average_rating"]].to_csv(
+        books_path, index=False,
+        header=["work_id:ID(Book)", "title", "authors", "ratings_count:long", "average_rating:double"]
+    )
+    pd.DataFrame({"user_id:ID(User)": interactions["user_id"].unique()}).to_csv(users_path, index=False)
+    interactions[["user_id", "work_id", "rating", "timestamp"]].to_csv(
+        interactions_path, index=False,
+        header=[":START_ID(User)", ":END_ID(Book)", "rating:double", "timestamp"]
+    )
+    command = (f"neo4j-admin database import full --nodes=Book={books_path} --nodes=User={users_path} "
+               f"--relationships=INTERACTED={interactions_path} neo4j")
+    log(f"Wrote {len(books)} books and {len(interactions)} interactions to {out_dir}")
+    log(f"Stop Neo4j, then run:\n  {command}\nand create the constraints afterwards")
+    return command
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load the cleaned Goodreads CSVs into Neo4j")
+    parser.add_argument("--books", default="../neo4j_import/goodreads_books_comics_graphic_cleaned_neo4j.csv")
+    parser.add_argument("--interactions", default="../neo4j_import/goodreads_interactions_comics_graphic_cleaned.csv")
+    parser.add_argument("--workers", type=int, default=4, help="parallel sessions for users and relationships")
+    parser.add_argument("--batch-size", type=int, default=20000, help="rows per UNWIND transaction")
+    parser.add_argument("--fresh", action="store_true", help="the graph has no INTERACTED edges yet; use CREATE")
+    parser.add_argument("--admin-csv-dir", help="write neo4j-admin import CSVs here instead of loading online")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    books = read_books(args.books)
+    interactions = read_interactions(args.interactions, books["work_id"])
+    print(f"Read {len(books)} books and {len(interactions)} unique interactions in {time.perf_counter() - start:.1f}s")
+
+    if args.admin_csv_dir:
+        write_admin_import(books, interactions, args.admin_csv_dir)
+        return
+
+    from database.neo4j_connector import Neo4jConnector
+    connector = Neo4jConnector()
+    if not connector.connect():
+        return
+    load_books(connector, books)
+    load_interactions(connector, interactions, workers=args.workers, batch_size=args.batch_size, fresh=args.fresh)
+    _report(print, "Total", len(books) + len(interactions), time.perf_counter() - start)
+    connector.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import os
+
+import numpy as np
+
+
+class OnnxSentenceEncoder:
+    """
+    ONNX Runtime version of a sentence-transformers mean-pooling model (e.g. all-MiniLM-L6-v2).
+
+    Runs tokenization with the `tokenizers` library and inference with onnxruntime, so serving
+    does not import torch at all. The exported model (and its int8 dynamically quantized variant)
+    is cached on disk; export() is the only step that needs torch/transformers.
+    encode() mirrors SentenceTransformer.encode: mean pooling over the attention mask followed
+    by L2 normalization, returning a 1-D array for a single string and a 2-D array for a list.
+    """
+
+    def __init__(self, model_dir, quantized=False, max_seq_length=256, threads=None):
+        """
+        Parameters:
+        - model_dir: directory written by export()
+        - quantized: load the int8 model instead of the float32 one
+        - max_seq_length: truncation length (256 for all-MiniLM-L6-v2)
+        - threads: intra-op thread count for onnxruntime (None = runtime default)
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_seq_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        model_file = "model_int8.onnx" if quantized else "model.onnx"
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        """Encode a string or list of strings into normalized sentence embeddings"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+            token_embeddings = self.session.run(None, feeds)[0]
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32))
+
+        vectors = np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+        return vectors[0] if single else vectors
+
+    @staticmethod
+    def is_exported(model_dir, quantized=False):
+        """Check whether export() has already written the requested model to model_dir"""
+        model_file = "model_int8.onnx" if quantized else "model.onnx"
+        return os.path.exists(os.path.join(model_dir, model_file)) and \
+            os.path.exists(os.path.join(model_dir, "tokenizer.json"))
+
+    @staticmethod
+    def export(model_name, model_dir, quantize=True):
+        """
+        Export the Hugging Face transformer behind a sentence-transformers model to ONNX
+        (dynamic batch and sequence axes), save its fast tokenizer, and optionally write an
+        int8 dynamically quantized copy. Needs torch and transformers.
+        """
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        os.makedirs(model_dir, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(hub_name)
+        model = AutoModel.from_pretrained(hub_name).eval()
+        tokenizer.backend_tokenizer.save(os.path.join(model_dir, "tokenizer.json"))
+
+        sample = tokenizer(["an example sentence"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+
+        class TokenEmbeddings(torch.nn.Module):
+            """Positional-input wrapper returning only last_hidden_state"""
+            def __init__(self):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *inputs):
+                return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+        with torch.no_grad():
+            torch.onnx.export(
+                TokenEmbeddings(),
+                tuple(sample[name] for name in input_names),
+                os.path.join(model_dir, "model.onnx"),
+                input_names=input_names,
+                output_names=["token_embeddings"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(
+                os.path.join(model_dir, "model.onnx"),
+                os.path.join(model_dir, "model_int8.onnx"),
+                weight_type=QuantType.QInt8
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a sentence-transformers model to ONNX (+ int8)")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--out", default=os.getenv("ONNX_MODEL_DIR", "onnx_models/all-MiniLM-L6-v2"))
+    parser.add_argument("--no-quantize", action="store_true")
+    args = parser.parse_args()
+
+    OnnxSentenceEncoder.export(args.model, args.out, quantize=not args.no_quantize)
+    print(f"Exported {args.model} to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+
+from qdrant_client.http import models
+
+from database.qdrant_connector import FILTER_PAYLOAD_SCHEMA, date_to_payload
+
+
+def filter_payload(row):
+    """Convert a PostgresConnector.get_filter_metadata row into Qdrant payload fields (None values dropped)"""
+    payload = {}
+    for field in FILTER_PAYLOAD_SCHEMA:
+        value = row.get(field)
+        if value is None:
+            continue
+        payload[field] = date_to_payload(value) if field == "publication_date" else value
+    return payload
+
+
+def sync_filter_payloads(qdrant_conn, pg_conn, batch_size=1000, log=print):
+    """
+    Mirror the get_books_metadata filter columns from Postgres into the payload of every point
+    in the books collection, then make sure the payload indexes exist.
+    Returns the number of points updated.
+    """
+    client = qdrant_conn.client
+    qdrant_conn.ensure_payload_indexes()
+
+    updated, offset = 0, None
+    while True:
+        points, offset = client.scroll(
+            collection_name=qdrant_conn.collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=["work_id"],
+            with_vectors=False
+        )
+        work_ids = {int(p.payload["work_id"]) for p in points if p.payload.get("work_id") not in (None, "")}
+        rows = {int(row["work_id"]): filter_payload(row) for row in pg_conn.get_filter_metadata(work_ids)}
+
+        operations = [
+            models.SetPayloadOperation(set_payload=models.SetPayload(
+                payload=rows[int(p.payload["work_id"])], points=[p.id]))
+            for p in points
+            if p.payload.get("work_id") not in (None, "") and rows.get(int(p.payload["work_id"]))
+        ]
+        if operations:
+            client.batch_update_points(qdrant_conn.collection_name, update_operations=operations)
+        updated += len(operations)
+        log(f"Updated filter payloads for {updated} points")
+
+        if offset is None:
+            break
+    return updated
+
+
+def main():
+    from database.postgres_connector import PostgresConnector
+    from database.qdrant_connector import QdrantConnector
+
+    parser = argparse.ArgumentParser(description="Mirror Postgres filter columns into Qdrant payload indexes")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    qdrant_conn = QdrantConnector()
+    status, message = qdrant_conn.connect_remote()
+    if not status:
+        print(message)
+        return
+    pg_conn = PostgresConnector()
+    if not pg_conn.connect():
+        return
+    sync_filter_payloads(qdrant_conn, pg_conn, batch_size=args.batch_size)
+    pg_conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,70 @@
 import psycopg2
+from psycopg2 import pool
 from psycopg2.extras import RealDictCursor
 import os
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
 from dotenv import load_dotenv
+from database.description_mapping import DescriptionMapping
+from database.metrics import METRICS
+from database.ttl_cache import TTLCache
 
 load_dotenv()
 
+# Errors that mean the connection itself is unusable (server restart, network drop, idle timeout)
+RECONNECT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+# One row per book with its author names aggregated in author_ids order. Unnesting author_ids and
+# joining on the authors primary key replaces the per-row correlated string_agg subquery; the
+# work_id lookup uses the btree index on books.work_id when it exists.
+BOOKS_METADATA_QUERY = """
+SELECT
+    b.work_id,
+    b.title,
+    b.isbn,
+    b.num_pages,
+    b.average_rating,
+    b.publisher,
+    b.description,
+    b.link,
+    b.publication_date,
+    b.is_ebook,
+    b.format,
+    b.ratings_count,
+    string_agg(a.name, ', ' ORDER BY ba.ord) AS author_names
+FROM books b
+LEFT JOIN LATERAL unnest(b.author_ids) WITH ORDINALITY AS ba(author_id, ord) ON true
+LEFT JOIN authors a ON a.author_id = ba.author_id
+WHERE b.work_id = ANY(%s)
+GROUP BY b.book_id
+"""
+
+# get_books_metadata filter keys -> (column, comparison). Rows with a NULL column never match,
+# the same as the SQL predicates these replace.
+METADATA_FILTERS = {
+    "max_pages": ("num_pages", lambda value, bound: value <= bound),
+    "min_pub_date": ("publication_date", lambda value, bound: value >= bound),
+    "is_ebook": ("is_ebook", lambda value, bound: value == bound),
+    "format": ("format", lambda value, bound: value == bound),
+    "min_average_rating": ("average_rating", lambda value, bound: value >= bound),
+    "min_rating_count": ("ratings_count", lambda value, bound: value >= bound)
+}
+
+
+def matches_filters(row, filters):
+    """Check a get_books_metadata row against a filters dictionary (None values are ignored)"""
+    for key, (column, compare) in METADATA_FILTERS.items():
+        bound = filters.get(key)
+        if bound is None:
+            continue
+        value = row.get(column)
+        if value is None or not compare(value, bound):
+            return False
+    return True
+
+
 class PostgresConnector:
     def __init__(self):
         self.host = os.getenv("POSTGRES_HOST", "localhost")
@@ -12,27 +72,123 @@ class PostgresConnector:
         self.user = os.getenv("POSTGRES_USER", "postgres")
         self.password = os.getenv("POSTGRES_PASSWORD", "postgres_password")
         self.database = os.getenv("POSTGRES_DB", "booksdb")
-        self.conn = None
+        self.pool = None
+
+        # Connection pool shared by all Streamlit sessions. Checkouts block for up to pool_timeout
+        # seconds when every connection is in use, and a connection idle for longer than
+        # health_check_interval seconds is pinged before it is handed out.
+        self.min_connections = int(os.getenv("POSTGRES_POOL_MIN", "1"))
+        self.max_connections = int(os.getenv("POSTGRES_POOL_MAX", "10"))
+        self.pool_timeout = float(os.getenv("POSTGRES_POOL_TIMEOUT", "10"))
+        self.health_check_interval = float(os.getenv("POSTGRES_HEALTH_CHECK_INTERVAL", "30"))
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._pool_lock = threading.Lock()
+        self._last_used = {}
+
+        # Read-through cache of get_books_metadata rows by work_id
+        cache_ttl = os.getenv("METADATA_CACHE_TTL", "600")
+        self.metadata_cache = TTLCache(
+            max_entries=int(os.getenv("METADATA_CACHE_SIZE", "10000")),
+            ttl=float(cache_ttl) if cache_ttl else None
+        )
+        METRICS.register_cache("book_metadata", self.metadata_cache.stats)
 
     def connect(self):
+        with self._pool_lock:
+            if self.pool is not None and not self.pool.closed:
+                return True
+            try:
+                self.pool = pool.ThreadedConnectionPool(
+                    self.min_connections,
+                    self.max_connections,
+                    host=self.host,
+                    port=self.port,
+                    user=self.user,
+                    password=self.password,
+                    dbname=self.database
+                )
+                self._last_used = {}
+                print("Connected to PostgreSQL")
+                return True
+            except Exception as e:
+                print(f"Failed to connect to PostgreSQL: {e}")
+                return False
+
+    def close(self):
+        with self._pool_lock:
+            if self.pool and not self.pool.closed:
+                self.pool.closeall()
+                print("PostgreSQL connection pool closed")
+            self.pool = None
+
+    def _healthy(self, conn):
+        """Return False if conn is closed, or idle for a while and no longer answering"""
+        if conn.closed:
+            return False
         try:
-            self.conn = psycopg2.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                dbname=self.database
-            )
-            print("Connected to PostgreSQL")
+            conn.autocommit = True
+            last_used = self._last_used.get(id(conn))
+            if last_used is not None and time.time() - last_used < self.health_check_interval:
+                return True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
             return True
-        except Exception as e:
-            print(f"Failed to connect to PostgreSQL: {e}")
+        except psycopg2.Error:
             return False
 
-    def close(self):
-        if self.conn:
-            self.conn.close()
-            print("PostgreSQL connection closed")
+    def _checkout(self):
+        """Take a healthy connection from the pool, replacing broken ones"""
+        if self.pool is None or self.pool.closed:
+            if not self.connect():
+                raise psycopg2.OperationalError("PostgreSQL is unavailable")
+        # Broken connections are closed, so the pool opens a fresh one on the next getconn
+        for _ in range(self.max_connections + 1):
+            conn = self.pool.getconn()
+            if self._healthy(conn):
+                return conn
+            self._last_used.pop(id(conn), None)
+            self.pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("No healthy PostgreSQL connection available")
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a pooled connection (autocommit, so reads never hold a transaction open).
+        Connections that fail with a connection-level error are closed instead of returned.
+        """
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise pool.PoolError(f"Timed out after {self.pool_timeout}s waiting for a PostgreSQL connection")
+        conn = None
+        broken = False
+        try:
+            conn = self._checkout()
+            yield conn
+        except RECONNECT_ERRORS:
+            broken = True
+            raise
+        finally:
+            if conn is not None and self.pool is not None and not self.pool.closed:
+                if broken or conn.closed:
+                    self._last_used.pop(id(conn), None)
+                    self.pool.putconn(conn, close=True)
+                else:
+                    self._last_used[id(conn)] = time.time()
+                    self.pool.putconn(conn)
+            self._slots.release()
+
+    def _fetchall(self, query, params=None):
+        """Run a read query and return RealDictCursor rows, retrying once on a dropped connection"""
+        with METRICS.timed("postgres", "query") as span:
+            for attempt in range(2):
+                try:
+                    with self.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+                        cur.execute(query, params)
+                        rows = cur.fetchall()
+                    span.items = len(rows)
+                    return rows
+                except RECONNECT_ERRORS:
+                    if attempt:
+                        raise
 
     def get_books_metadata(self, work_ids, filters=None):
         """
@@ -45,76 +201,113 @@ class PostgresConnector:
           - format: (str) Book format (e.g., "Paperback", "Hardcover", etc.).
           - min_average_rating: (float) Minimum average rating.
           - min_rating_count: (int) Minimum rating count.
+        work_ids that are not integers (None, "") are skipped.
+        Rows are served from metadata_cache when possible; only uncached work_ids are queried,
+        and the filters are applied to the cached rows so every filter combination shares them.
         Returns a list of dictionaries with keys:
-          title, isbn, num_pages, average_rating, publisher, description, link, publication_date, author_names.
+          work_id, title, isbn, num_pages, average_rating, publisher, description, link,
+          publication_date, is_ebook, format, ratings_count, author_names.
         """
-        if not self.conn:
-            if not self.connect():
-                return []
+        with METRICS.timed("postgres", "books_metadata") as span:
+            keys = []
+            for work_id in work_ids:
+                try:
+                    keys.append(int(work_id))
+                except (TypeError, ValueError):
+                    # e.g. a Qdrant point without a work_id; it has no metadata to return
+                    print(f"Skipping invalid work_id: {work_id!r}")
+            keys = list(dict.fromkeys(keys))
+            cached, missing = self.metadata_cache.get_many(keys)
+
+            if missing:
+                try:
+                    rows = self._fetchall(BOOKS_METADATA_QUERY, [missing])
+                except Exception as e:
+                    span.error = True
+                    print(f"Error querying PostgreSQL: {e}")
+                    rows = None
+                if rows is not None:
+                    fetched = {work_id: [] for work_id in missing}
+                    for row in rows:
+                        fetched[row["work_id"]].append(dict(row))
+                    # Unknown work_ids are cached as empty so they are not queried again either
+                    self.metadata_cache.put_many(fetched)
+                    cached.update(fetched)
+
+            results = []
+            for work_id in keys:
+                for row in cached.get(work_id, ()):
+                    if not filters or matches_filters(row, filters):
+                        results.append(dict(row))
+            span.items = len(results)
+            return results
 
+    def get_filter_metadata(self, work_ids):
+        """
+        Given a list of work_ids, return the columns get_books_metadata filters on
+        (work_id, num_pages, publication_date, is_ebook, format, average_rating, ratings_count).
+        Used to mirror those fields into the Qdrant payload.
+        """
         query = """
-        SELECT 
-            b.title,
-            b.isbn,
-            b.num_pages,
-            b.average_rating,
-            b.publisher,
-            b.description,
-            b.link,
-            b.publication_date,
-            (
-              SELECT string_agg(a.name, ', ')
-              FROM authors a
-              WHERE a.author_id = ANY(b.author_ids)
-            ) AS author_names
-        FROM books b
-        WHERE b.work_id = ANY(%s)
+        SELECT work_id, num_pages, publication_date, is_ebook, format, average_rating, ratings_count
+        FROM books
+        WHERE work_id = ANY(%s)
         """
-        params = [work_ids]
-
-        if filters:
-            if filters.get("max_pages") is not None:
-                query += " AND b.num_pages <= %s"
-                params.append(filters["max_pages"])
-            if filters.get("min_pub_date") is not None:
-                query += " AND b.publication_date >= %s"
-                params.append(filters["min_pub_date"])
-            if filters.get("is_ebook") is not None:
-                query += " AND b.is_ebook = %s"
-                params.append(filters["is_ebook"])
-            if filters.get("format") is not None:
-                query += " AND b.format = %s"
-                params.append(filters["format"])
-            if filters.get("min_average_rating") is not None:
-                query += " AND b.average_rating >= %s"
-                params.append(filters["min_average_rating"])
-            if filters.get("min_rating_count") is not None:
-                query += " AND b.ratings_count >= %s"
-                params.append(filters["min_rating_count"])
-
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(query, params)
-                results = cur.fetchall()
-                return results
+            return self._fetchall(query, [list(work_ids)])
         except Exception as e:
-            print(f"Error querying PostgreSQL: {e}")
+            print(f"Error querying filter metadata: {e}")
             return []
-    
+
+    def iter_description_batches(self, batch_size=10000):
+        """
+        Stream (work_id, description) tuples from the books table in lists of up to batch_size.
+        Rows come from a named (server-side) cursor fetching itersize rows per round trip, so
+        only one batch is held client-side at a time. The pooled connection stays checked out
+        until the generator is exhausted or closed.
+        """
+        with METRICS.timed("postgres", "description_batches") as span, self.connection() as conn:
+            # Named cursors live inside a transaction
+            conn.autocommit = False
+            try:
+                with conn.cursor(name="description_stream") as cur:
+                    cur.itersize = batch_size
+                    cur.execute("SELECT work_id, description FROM books")
+                    while True:
+                        batch = list(islice(cur, batch_size))
+                        if not batch:
+                            break
+                        span.items = (span.items or 0) + len(batch)
+                        yield batch
+            finally:
+                if not conn.closed:
+                    conn.rollback()
+
     def get_description_mapping(self):
         """
         Returns a dictionary mapping work_id (as an integer) to book description.
         """
-        if not self.conn:
-            if not self.connect():
-                return {}
-        query = "SELECT work_id, description FROM books"
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(query)
-                results = cur.fetchall()
-                mapping = {int(row['work_id']): row['description'] for row in results}
-                return mapping
+            return {
+                int(work_id): description
+                for batch in self.iter_description_batches()
+                for work_id, description in batch
+            }
         except Exception as e:
             print(f"Error querying description mapping: {e}")
             return {}
+
+    def get_compact_description_mapping(self, path=None, batch_size=10000):
+        """
+        Like get_description_mapping, but returns a DescriptionMapping that keeps all descriptions
+        in one UTF-8 buffer. If path is given the rows are streamed into a mapping saved there,
+        which is returned memory-mapped so the descriptions are paged in from disk on demand.
+        """
+        try:
+            if path:
+                DescriptionMapping.write_batches(self.iter_description_batches(batch_size), path)
+                return DescriptionMapping.load(path, mmap=True)
+            return DescriptionMapping.from_batches(self.iter_description_batches(batch_size))
+        except Exception as e:
+            print(f"Error querying description mapping: {e}")
+            return DescriptionMapping.from_batches([])
@@ -0,0 +1,183 @@
+import argparse
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+from database.table_files import is_parquet, iter_chunks
+
+# Secondary indexes, built after the data is loaded: work_id for every get_books_metadata /
+# get_filter_metadata lookup, a GIN index for author_id -> books lookups on author_ids, and
+# one btree per get_books_metadata filter column
+INDEXES = {
+    "books_work_id_idx": "CREATE INDEX IF NOT EXISTS books_work_id_idx ON books (work_id)",
+    "books_author_ids_idx": "CREATE INDEX IF NOT EXISTS books_author_ids_idx ON books USING GIN (author_ids)",
+    "books_num_pages_idx": "CREATE INDEX IF NOT EXISTS books_num_pages_idx ON books (num_pages)",
+    "books_publication_date_idx": "CREATE INDEX IF NOT EXISTS books_publication_date_idx ON books (publication_date)",
+    "books_format_idx": "CREATE INDEX IF NOT EXISTS books_format_idx ON books (format, is_ebook)",
+    "books_average_rating_idx": "CREATE INDEX IF NOT EXISTS books_average_rating_idx ON books (average_rating)",
+    "books_ratings_count_idx": "CREATE INDEX IF NOT EXISTS books_ratings_count_idx ON books (ratings_count)"
+}
+
+
+def table_columns(conn, table):
+    """Return [(column_name, data_type, udt_name)] for table, in column order"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name, data_type, udt_name
+            FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s
+            ORDER BY ordinal_position
+        """, [table])
+        return cur.fetchall()
+
+
+def _array_literal(value):
+    """
+    Turn a list (from Parquet) or a Python set/list repr such as "{185613, 458201}" or
+    "['1', '2']" (from the notebook CSVs) into "{185613,458201}"
+    """
+    if isinstance(value, (list, tuple, np.ndarray)):
+        items = [str(item) for item in value]
+    elif pd.isna(value):
+        return None
+    else:
+        items = [item.strip().strip("'\"") for item in str(value).strip("{}[]() ").split(",")]
+    items = [item for item in items if item]
+    return "{" + ",".join(items) + "}" if items else None
+
+
+def normalize_chunk(chunk, columns):
+    """
+    Convert a chunk of a file written by the cleaning notebooks or pipeline into values COPY accepts for the
+    table columns (matched by position): integers written as floats ("400.0"), Python set
+    reprs for arrays, timestamps for dates and "true"/"false" strings for booleans.
+    """
+    chunk = chunk.copy()
+    chunk.columns = [name for name, _, _ in columns]
+    for name, data_type, udt_name in columns:
+        values = chunk[name]
+        if data_type in ("integer", "bigint", "smallint"):
+            chunk[name] = pd.to_numeric(values, errors="coerce").round().astype("Int64")
+        elif data_type == "ARRAY":
+            chunk[name] = values.map(_array_literal)
+        elif data_type == "date":
+            chunk[name] = pd.to_datetime(values, errors="coerce").dt.date
+        elif data_type == "boolean":
+            chunk[name] = values.map(lambda v: None if pd.isna(v) else str(v).strip().lower() in ("true", "t", "1"))
+    return chunk
+
+
+def copy_file(conn, table, path, chunksize=50000, log=print):
+    """
+    Stream a CSV or Parquet file into table with COPY FROM STDIN, one chunk of rows at a time.
+    File columns are matched to the table columns by position (the notebooks and the pipeline
+    write them in schema order). Returns the number of rows loaded.
+    """
+    columns = table_columns(conn, table)
+    names = ", ".join(name for name, _, _ in columns)
+    start, rows = time.perf_counter(), 0
+    with conn.cursor() as cur:
+        for chunk in iter_chunks(path, chunksize, keep_default_na=False, na_values=[""],
+                                 dtype=None if is_parquet(path) else str):
+            if len(chunk.columns) != len(columns):
+                raise ValueError(f"{path} has {len(chunk.columns)} columns, table {table} has {len(columns)}")
+            buffer = io.StringIO()
+            normalize_chunk(chunk, columns).to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cur.copy_expert(f"COPY {table} ({names}) FROM STDIN WITH (FORMAT csv)", buffer)
+            rows += len(chunk)
+            elapsed = time.perf_counter() - start
+            log(f"{table}: {rows} rows copied ({rows / elapsed:.0f} rows/s)")
+    return rows
+
+
+def drop_indexes(conn):
+    """Drop the secondary indexes so COPY does not have to maintain them row by row"""
+    with conn.cursor() as cur:
+        for name in INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def create_indexes(conn, log=print):
+    """Build the secondary indexes (one sorted pass each) and return {index: seconds}"""
+    timings = {}
+    with conn.cursor() as cur:
+        for name, statement in INDEXES.items():
+            start = time.perf_counter()
+            cur.execute(statement)
+            timings[name] = time.perf_counter() - start
+            log(f"Built {name} in {timings[name]:.1f}s")
+    return timings
+
+
+def analyze(conn, tables=("books", "authors")):
+    """Refresh planner statistics after a bulk load"""
+    with conn.cursor() as cur:
+        for table in tables:
+            cur.execute(f"ANALYZE {table}")
+
+
+def ingest(conn, books_csv=None, authors_csv=None, schema_path=None, truncate=False,
+           chunksize=50000, build_indexes=True, maintenance_work_mem="512MB", log=print):
+    """
+    Load the cleaned books and authors files (CSV or Parquet) in a single transaction: create the tables from
+    schema_path if they do not exist, optionally truncate them, drop the secondary indexes,
+    COPY both files in chunks, rebuild the indexes (unless build_indexes is False) and ANALYZE.
+    """
+    start = time.perf_counter()
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('books') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            if not schema_path:
+                raise ValueError("The books table does not exist; pass the schema file")
+            with open(schema_path) as f:
+                cur.execute(f.read())
+            log(f"Created tables from {schema_path}")
+        # Only affects this transaction: faster index builds, no flush wait per commit
+        cur.execute("SET LOCAL maintenance_work_mem = %s", [maintenance_work_mem])
+        cur.execute("SET LOCAL synchronous_commit = off")
+        if truncate:
+            cur.execute("TRUNCATE books, authors")
+
+        drop_indexes(conn)
+        if authors_csv:
+            copy_file(conn, "authors", authors_csv, chunksize, log)
+        if books_csv:
+            copy_file(conn, "books", books_csv, chunksize, log)
+        if build_indexes:
+            create_indexes(conn, log)
+        analyze(conn)
+    log(f"Ingest finished in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    from database.postgres_connector import PostgresConnector
+
+    parser = argparse.ArgumentParser(description="Bulk load the cleaned Goodreads CSV or Parquet files into PostgreSQL with COPY")
+    parser.add_argument("--books", help="e.g. goodreads_books_cleaned_postgres.csv or .parquet")
+    parser.add_argument("--authors", help="e.g. goodreads_authors_cleaned.csv or .parquet")
+    parser.add_argument("--schema", help="postgres_schema.txt, used if the tables do not exist yet")
+    parser.add_argument("--truncate", action="store_true", help="empty the tables before loading")
+    parser.add_argument("--chunksize", type=int, default=50000)
+    parser.add_argument("--indexes-only", action="store_true", help="only (re)build the indexes and ANALYZE")
+    args = parser.parse_args()
+
+    connector = PostgresConnector()
+    if not connector.connect():
+        return
+    with connector.connection() as conn:
+        conn.autocommit = False
+        if args.indexes_only:
+            with conn:
+                create_indexes(conn)
+                analyze(conn)
+        else:
+            ingest(conn, args.books, args.authors, schema_path=args.schema,
+                   truncate=args.truncate, chunksize=args.chunksize)
+    connector.close()
+
+
+if __name__ == "__main__":
+    main()
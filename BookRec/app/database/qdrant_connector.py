@@ -1,8 +1,42 @@
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.http import models
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 import os
 from dotenv import load_dotenv
 import socket
+import time
+from database.embedding_cache import EmbeddingCache
+from database.metrics import METRICS
+from database.batch_encoder import BatchEncoder
+from database.onnx_encoder import OnnxSentenceEncoder
+from database.local_index import LocalVectorIndex
+from database.book_neighbors import BookNeighborTable
+
+# Payload fields returned with search results (the ones format_results reads)
+RESULT_PAYLOAD_FIELDS = ["title", "summary", "work_id"]
+
+# Book metadata mirrored from Postgres into the payload (see database.payload_sync) and indexed,
+# so the get_books_metadata filters can run inside the ANN search
+FILTER_PAYLOAD_SCHEMA = {
+    "num_pages": models.PayloadSchemaType.INTEGER,
+    "publication_date": models.PayloadSchemaType.INTEGER,  # stored as YYYYMMDD
+    "is_ebook": models.PayloadSchemaType.BOOL,
+    "format": models.PayloadSchemaType.KEYWORD,
+    "average_rating": models.PayloadSchemaType.FLOAT,
+    "ratings_count": models.PayloadSchemaType.INTEGER
+}
+
+
+# Order of the log levels; messages below QdrantConnector.log_level are dropped
+LOG_LEVELS = {"debug": 10, "info": 20, "success": 20, "warning": 30, "error": 40}
+
+
+def date_to_payload(value):
+    """Convert a date to the YYYYMMDD integer stored in the publication_date payload field"""
+    return value.year * 10000 + value.month * 100 + value.day
+
 
 class QdrantConnector:
     def __init__(self):
@@ -11,93 +45,346 @@ class QdrantConnector:
         self.qdrant_url = os.getenv("QDRANT_URL")
         self.api_key = os.getenv("QDRANT_API_KEY")
         self.client = None
+        self.async_client = None
         self.model = None
+
+        # Transport: REST by default, gRPC (port 6334) with QDRANT_PREFER_GRPC=true.
+        # REST requests reuse a pool of keep-alive connections; gRPC multiplexes over one channel.
+        self.prefer_grpc = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+        self.grpc_port = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+        self.timeout = int(os.getenv("QDRANT_TIMEOUT", "30"))
+        self.pool_size = int(os.getenv("QDRANT_POOL_SIZE", "20"))
+        self.keepalive_expiry = float(os.getenv("QDRANT_KEEPALIVE_EXPIRY", "60"))
+        self._collection_verified = False
+        self._async_collection_verified = False
         self.model_name = "all-MiniLM-L6-v2"  # Default model
+        # Embedding backend: "torch" (sentence-transformers), "onnx" or "onnx-int8" (onnxruntime)
+        self.backend = os.getenv("EMBEDDING_BACKEND", "torch")
+        self.onnx_model_dir = os.getenv("ONNX_MODEL_DIR", os.path.join("onnx_models", self.model_name))
         self.collection_name = "books"  # Fixed collection name
 
+        # "remote" uses the Qdrant service, "local" serves everything from the snapshot at
+        # QDRANT_LOCAL_INDEX_PATH, "fallback" uses the snapshot only when the service is unreachable
+        self.search_mode = os.getenv("QDRANT_SEARCH_MODE", "remote")
+        self.local_index_path = os.getenv("QDRANT_LOCAL_INDEX_PATH")
+        self.local_index = None
+
+        # Precomputed top-K neighbours of every book (python -m database.book_neighbors); book_id
+        # searches are served from it and only unknown ids go to the live search
+        self.neighbor_table_path = os.getenv("QDRANT_NEIGHBORS_PATH")
+        self.neighbor_table = None
+        self.neighbor_hits = 0
+        self.neighbor_misses = 0
+        METRICS.register_cache("neighbor_table", self.neighbor_table_stats)
+
+        # Cache of query embeddings so repeat searches skip the model forward pass; entries are
+        # namespaced by model and backend, whose vectors differ
+        cache_ttl = os.getenv("QUERY_CACHE_TTL")
+        self.embedding_cache = EmbeddingCache(
+            max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+            ttl=float(cache_ttl) if cache_ttl else None,
+            persist_path=os.getenv("QUERY_CACHE_PATH"),
+            namespace=f"{self.model_name}/{self.backend}"
+        )
+        METRICS.register_cache("query_embeddings", self.embedding_cache.stats)
+
+        # Micro-batching of concurrent encode calls (a window of 0 encodes each query alone)
+        self.batch_window_ms = float(os.getenv("ENCODER_BATCH_WINDOW_MS", "5"))
+        self.max_batch_size = int(os.getenv("ENCODER_MAX_BATCH_SIZE", "32"))
+        self.encoder = None
+
+        # Size of the first page of stream_similar_books, so the first results arrive early
+        self.stream_first_page = int(os.getenv("QDRANT_STREAM_FIRST_PAGE", "3"))
+        self._stream_executor = None
+
+        # LOG_LEVEL=debug also logs every result payload; the default skips them
+        self.log_level = os.getenv("LOG_LEVEL", "info").lower()
+
+    def log_enabled(self, level):
+        """Whether messages of this level pass log_level (checked before building costly messages)"""
+        return LOG_LEVELS.get(level, 20) >= LOG_LEVELS.get(self.log_level, 20)
+
     def log(self, message, level="info"):
         """Log message to console"""
-        print(f"[{level.upper()}] {message}")
+        if self.log_enabled(level):
+            print(f"[{level.upper()}] {message}")
 
     def connect(self):
-        """Connect to Qdrant and return success status and message"""
-        
+        """Connect to Qdrant (or the local snapshot, depending on search_mode) and return success status and message"""
+        if self.search_mode == "local":
+            return self.load_local_index()
+
+        status, message = self.connect_remote()
+        if not status and self.search_mode == "fallback":
+            self.log("Falling back to the local vector index", level="warning")
+            return self.load_local_index()
+        return status, message
+
+    def connect_remote(self):
+        """Connect to the Qdrant service and return success status and message"""
+        if self.client is not None and self._collection_verified:
+            return True, "Already connected to Qdrant"
+
         # Validate configuration
-        if not self.qdrant_url:
-            self.log("Qdrant URL is not set. Check your .env file.", level="error")
-            return False, "Qdrant URL is not set. Check your .env file."
-            
-        if not self.api_key:
-            self.log("Qdrant API key is not set. Check your .env file.", level="error")
-            return False, "Qdrant API key is not set. Check your .env file."
+        config_error = self._config_error()
+        if config_error:
+            self.log(config_error, level="error")
+            return False, config_error
         
-        self.log(f"Connecting to Qdrant at: {self.qdrant_url}")
+        self.log(f"Connecting to Qdrant at: {self.qdrant_url} ({'gRPC' if self.prefer_grpc else 'REST'})")
         
         try:
             # Create client with appropriate timeout
-            self.client = QdrantClient(
-                url=self.qdrant_url,
-                api_key=self.api_key,
-                timeout=30,
-                prefer_grpc=False
-            )
+            self.client = QdrantClient(**self._client_kwargs())
         
             # Test connection
             collections = self.client.get_collections()
-            available_collections = [c.name for c in collections.collections]
-            self.log(f"Connected to Qdrant. Available collections: {available_collections}", level="success")
-            
-            # Check if books collection exists
-            if self.collection_name not in available_collections:
-                self.log(f"'{self.collection_name}' collection not found in Qdrant", level="error")
-                return False, f"'{self.collection_name}' collection not found in Qdrant"
-                
-            return True, "Successfully connected to Qdrant"
+            return self._check_collection(collections, "_collection_verified")
             
         except Exception as e:
             error_message = f"Failed to connect to Qdrant: {str(e)}"
             self.log(error_message, level="error")
             return False, error_message
+
+    async def connect_async(self):
+        """Create the AsyncQdrantClient used by the *_async methods and return success status and message"""
+        if self.async_client is not None and self._async_collection_verified:
+            return True, "Already connected to Qdrant"
+
+        config_error = self._config_error()
+        if config_error:
+            self.log(config_error, level="error")
+            return False, config_error
+
+        try:
+            self.async_client = AsyncQdrantClient(**self._client_kwargs())
+            collections = await self.async_client.get_collections()
+            return self._check_collection(collections, "_async_collection_verified")
+        except Exception as e:
+            error_message = f"Failed to connect to Qdrant: {str(e)}"
+            self.log(error_message, level="error")
+            return False, error_message
+
+    def _config_error(self):
+        """Return an error message if the Qdrant configuration is incomplete, otherwise None"""
+        if not self.qdrant_url:
+            return "Qdrant URL is not set. Check your .env file."
+        if not self.api_key:
+            return "Qdrant API key is not set. Check your .env file."
+        return None
+
+    def _client_kwargs(self):
+        """Keyword arguments shared by the sync and async Qdrant clients"""
+        return {
+            "url": self.qdrant_url,
+            "api_key": self.api_key,
+            "timeout": self.timeout,
+            "prefer_grpc": self.prefer_grpc,
+            "grpc_port": self.grpc_port,
+            "limits": httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=self.keepalive_expiry
+            )
+        }
+
+    def _check_collection(self, collections, verified_flag):
+        """Check that the books collection exists; remember success so later connects skip the round trip"""
+        available_collections = [c.name for c in collections.collections]
+        self.log(f"Connected to Qdrant. Available collections: {available_collections}", level="success")
+
+        # Check if books collection exists
+        if self.collection_name not in available_collections:
+            self.log(f"'{self.collection_name}' collection not found in Qdrant", level="error")
+            return False, f"'{self.collection_name}' collection not found in Qdrant"
+
+        setattr(self, verified_flag, True)
+        return True, "Successfully connected to Qdrant"
     
-    def load_model(self):
-        """Load the sentence transformer model for encoding queries"""
+    def load_local_index(self, path=None):
+        """Open the local snapshot written by `python -m database.local_index` and return success status and message"""
+        path = path or self.local_index_path
+        if not path or not os.path.exists(os.path.join(path, "meta.json")):
+            message = f"Local vector index not found at: {path}"
+            self.log(message, level="error")
+            return False, message
+        try:
+            self.local_index = LocalVectorIndex(path)
+            message = f"Loaded local vector index with {len(self.local_index)} books"
+            self.log(message, level="success")
+            return True, message
+        except Exception as e:
+            message = f"Failed to load local vector index: {e}"
+            self.log(message, level="error")
+            return False, message
+
+    def use_local_index(self):
+        """Whether searches are served from the local snapshot instead of the Qdrant service"""
+        return self.local_index is not None and (self.search_mode == "local" or self.client is None)
+
+    def load_neighbor_table(self, path=None):
+        """Memory-map the neighbour table built by `python -m database.book_neighbors` (defaults to QDRANT_NEIGHBORS_PATH)"""
+        path = path or self.neighbor_table_path
+        if not BookNeighborTable.exists(path):
+            self.log(f"Neighbour table not found at: {path}", level="warning")
+            self.neighbor_table_path = None
+            return False
+        self.neighbor_table = BookNeighborTable.load(path)
+        self.log(f"Loaded neighbour table for {len(self.neighbor_table)} books (K={self.neighbor_table.k})",
+                 level="success")
+        return True
+
+    def _current_neighbor_table(self):
+        """The neighbour table, (re)loaded when none is loaded or a newer version was saved to its path"""
+        if not self.neighbor_table_path:
+            return self.neighbor_table
+        if self.neighbor_table is None or \
+                BookNeighborTable.current_version(self.neighbor_table_path) != self.neighbor_table.version:
+            try:
+                self.load_neighbor_table()
+            except (OSError, ValueError) as e:
+                # Keep serving the loaded table (or the live search) if the new one cannot be read
+                self.log(f"Failed to reload neighbour table: {e}", level="warning")
+        return self.neighbor_table
+
+    def _neighbor_lookup(self, book_id, exclude_ids, limit, filters):
+        """(point_id, score) pairs from the neighbour table, or None when the live search has to answer"""
+        if not book_id or filters:
+            return None
+        table = self._current_neighbor_table()
+        if table is None:
+            return None
+        with METRICS.timed("qdrant", "neighbor_table") as span:
+            pairs = table.lookup(book_id, limit=limit, exclude_ids=exclude_ids)
+            span.items = len(pairs) if pairs is not None else None
+        if pairs is None:
+            self.neighbor_misses += 1
+        return pairs
+
+    def neighbor_table_stats(self):
+        """Book-id lookups answered by the neighbour table (hits) or sent to the live search (misses)"""
+        total = self.neighbor_hits + self.neighbor_misses
+        return {
+            "hits": self.neighbor_hits,
+            "misses": self.neighbor_misses,
+            "hit_rate": self.neighbor_hits / total if total else 0.0,
+            "entries": len(self.neighbor_table) if self.neighbor_table is not None else 0
+        }
+
+    def _neighbor_points(self, pairs, records):
+        """
+        ScoredPoints for the table's (point_id, score) pairs, with the payloads of the retrieved
+        records. None when a neighbour is no longer in the collection (the table is stale).
+        """
+        payloads = {int(record.id): record.payload for record in records}
+        if any(point_id not in payloads for point_id, _ in pairs):
+            return None
+        return [
+            models.ScoredPoint(id=point_id, version=0, score=score, payload=payloads[point_id])
+            for point_id, score in pairs
+        ]
+
+    def _neighbor_results(self, book_id, exclude_ids, limit, filters):
+        """
+        Search results for book_id from the neighbour table: one payload fetch instead of a vector
+        retrieve plus a search. None when the table cannot answer.
+        """
+        pairs = self._neighbor_lookup(book_id, exclude_ids, limit, filters)
+        if pairs is None:
+            return None
+        ids = [point_id for point_id, _ in pairs]
+        if self.use_local_index():
+            records = [record for point_id in ids for record in self.local_index.retrieve(point_id)]
+        elif ids:
+            records = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=ids,
+                with_payload=RESULT_PAYLOAD_FIELDS
+            )
+        else:
+            records = []
+        points = self._neighbor_points(pairs, records)
+        if points is None:
+            self.log(f"Neighbour table is stale for book ID: {book_id}; using live search", level="warning")
+            self.neighbor_misses += 1
+            return None
+        self.neighbor_hits += 1
+        self.log(f"Using neighbour table for book ID: {book_id}")
+        return points
+
+    def load_model(self, backend=None):
+        """
+        Load the embedding model for encoding queries
+
+        Parameters:
+        - backend: "torch", "onnx" or "onnx-int8" (defaults to the EMBEDDING_BACKEND env variable).
+          The ONNX backends export and cache the model under ONNX_MODEL_DIR on first use.
+        """
+        backend = backend or self.backend
         try:
-            self.model = SentenceTransformer(self.model_name)
-            self.log(f"Model loaded: {self.model_name}")
+            if backend in ("onnx", "onnx-int8"):
+                quantized = backend == "onnx-int8"
+                if not OnnxSentenceEncoder.is_exported(self.onnx_model_dir, quantized=quantized):
+                    self.log(f"Exporting {self.model_name} to ONNX in {self.onnx_model_dir}")
+                    OnnxSentenceEncoder.export(self.model_name, self.onnx_model_dir, quantize=quantized)
+                self.model = OnnxSentenceEncoder(self.onnx_model_dir, quantized=quantized)
+            else:
+                from sentence_transformers import SentenceTransformer
+                self.model = SentenceTransformer(self.model_name)
+            self.backend = backend
+            self.embedding_cache.set_namespace(f"{self.model_name}/{backend}")
+            if self.encoder is not None:
+                self.encoder.close()
+                self.encoder = None
+            if self.batch_window_ms > 0:
+                self.encoder = BatchEncoder(
+                    self.model.encode,
+                    max_batch_size=self.max_batch_size,
+                    batch_window_ms=self.batch_window_ms
+                )
+            self.log(f"Model loaded: {self.model_name} ({backend} backend)")
             return True
         except Exception as e:
             self.log(f"Error loading model: {e}", level="error")
             return False
             
+    def encode_query(self, query_text):
+        """Encode a query into a vector, reusing cached embeddings for repeated queries"""
+        model_encode = self.encoder.encode if self.encoder else self.model.encode
+
+        def encode(text):
+            with METRICS.timed("qdrant", "encode"):
+                return model_encode(text)
+
+        return self.embedding_cache.get_or_compute(query_text, encode)
+
     def get_book_by_id(self, book_id):
         """Get a single book by ID from Qdrant"""
-        if not self.client:
+        if not self.client and self.local_index is None:
             self.log("Not connected to Qdrant. Call connect() first.", level="error")
             return None
             
-        try:
-            # Get the book by ID
-            points = self.client.retrieve(
-                collection_name=self.collection_name,
-                ids=[book_id]
-            )
-            
-            # Check if we found the book
-            if points and len(points) > 0:
-                return {
-                    "book_id": points[0].id,
-                    "title": points[0].payload.get("title", "Unknown"),
-                    "summary": points[0].payload.get("summary", "No summary available")
-                }
-            else:
-                self.log(f"Book with ID {book_id} not found", level="warning")
+        with METRICS.timed("qdrant", "retrieve") as span:
+            try:
+                # Get the book by ID
+                if self.use_local_index():
+                    points = self.local_index.retrieve(book_id)
+                else:
+                    points = self.client.retrieve(
+                        collection_name=self.collection_name,
+                        ids=[book_id],
+                        with_payload=["title", "summary"]
+                    )
+
+                span.items = len(points)
+                return self._book_from_points(points, book_id)
+
+            except Exception as e:
+                span.error = True
+                self.log(f"Error retrieving book by ID: {e}", level="error")
                 return None
-                
-        except Exception as e:
-            self.log(f"Error retrieving book by ID: {e}", level="error")
-            return None
     
-    def search_similar_books(self, query_text=None, book_id=None, exclude_ids=None, limit=5):
+    def search_similar_books(self, query_text=None, book_id=None, exclude_ids=None, limit=5, filters=None):
         """
         Search for books similar to the query text or a specific book
         
@@ -106,74 +393,307 @@ class QdrantConnector:
         - book_id: ID of a book to find similar books (optional)
         - exclude_ids: List of book IDs to exclude from results (optional)
         - limit: Maximum number of results to return
+        - filters: Metadata filters with the same keys as PostgresConnector.get_books_metadata (optional);
+          applied inside the vector search using the payload fields mirrored by database.payload_sync
         
         Returns:
         - List of search results
         """
-        if not self.client:
+        if not self.client and self.local_index is None:
             self.log("Not connected to Qdrant. Call connect() first.", level="error")
             return []
-            
+
+        try:
+            results = self._neighbor_results(book_id, exclude_ids, limit, filters)
+        except Exception as e:
+            self.log(f"Neighbour table lookup failed, using live search: {e}", level="warning")
+            results = None
+        if results is not None:
+            return self._finish_search(results)
+
         if not self.model:
             model_loaded = self.load_model()
             if not model_loaded:
                 self.log("Failed to load the embedding model.", level="error")
                 return []
         
+        with METRICS.timed("qdrant", "search") as span:
+            try:
+                query_vector = self._query_vector(query_text, book_id)
+                if query_vector is None:
+                    return []
+
+                if self.use_local_index():
+                    if filters:
+                        self.log("Payload filters are not supported by the local index; ignoring them", level="warning")
+                    search_results = self.local_index.search(query_vector, limit=limit, exclude_ids=exclude_ids)
+                    self.log(f"Found {len(search_results)} similar books (local index)", level="success")
+                    span.items = len(search_results)
+                    return search_results
+
+                # Search for similar books
+                search_results = self.client.search(**self._search_params(query_vector, exclude_ids, limit, filters))
+                span.items = len(search_results)
+                return self._finish_search(search_results)
+
+            except Exception as e:
+                span.error = True
+                self.log(f"Error searching for books: {e}", level="error")
+                return []
+
+    def stream_similar_books(self, query_text=None, book_id=None, exclude_ids=None, limit=5, filters=None,
+                             first_page=None):
+        """
+        Generator version of search_similar_books + format_results: yields formatted results
+        (see format_results) as they arrive instead of after the whole search.
+
+        The remote search is split in two concurrent requests: the first first_page hits (default
+        stream_first_page) and the rest with an offset, so the first results can be shown after
+        a small search while the rest is still being fetched. The local index yields its results one by one.
+        Errors are logged and end the stream.
+        """
+        if not self.client and self.local_index is None:
+            self.log("Not connected to Qdrant. Call connect() first.", level="error")
+            return
+
         try:
-            # Get vector from either query text or book ID
-            if book_id:
-                # Get the book vector from Qdrant
+            results = self._neighbor_results(book_id, exclude_ids, limit, filters)
+        except Exception as e:
+            self.log(f"Neighbour table lookup failed, using live search: {e}", level="warning")
+            results = None
+        if results is not None:
+            for rank, result in enumerate(results, 1):
+                yield self.format_result(result, rank)
+            self._finish_search(results)
+            return
+
+        if not self.model and not self.load_model():
+            self.log("Failed to load the embedding model.", level="error")
+            return
+
+        with METRICS.timed("qdrant", "stream_search") as span:
+            try:
+                query_vector = self._query_vector(query_text, book_id)
+                if query_vector is None:
+                    return
+
+                rank = 0
+                start = time.perf_counter()
+                for page in self._search_pages(query_vector, exclude_ids, limit, filters, first_page):
+                    if not rank and page:
+                        METRICS.observe("qdrant", "stream_first_page", time.perf_counter() - start, len(page))
+                    for result in page:
+                        rank += 1
+                        span.items = rank
+                        yield self.format_result(result, rank)
+                if rank:
+                    self.log(f"Found {rank} similar books", level="success")
+                else:
+                    self.log("No similar books found", level="warning")
+
+            except Exception as e:
+                span.error = True
+                self.log(f"Error searching for books: {e}", level="error")
+
+    def _search_pages(self, query_vector, exclude_ids, limit, filters, first_page):
+        """
+        Yield the search results page by page. The request for the rest runs in a background
+        thread alongside the first one, so streaming does not add a round trip to the total.
+        """
+        if self.use_local_index():
+            if filters:
+                self.log("Payload filters are not supported by the local index; ignoring them", level="warning")
+            yield self.local_index.search(query_vector, limit=limit, exclude_ids=exclude_ids)
+            return
+
+        first_page = min(limit, first_page or self.stream_first_page)
+        params = self._search_params(query_vector, exclude_ids, first_page, filters)
+        rest = None
+        if limit > first_page:
+            if self._stream_executor is None:
+                self._stream_executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="qdrant-stream")
+            rest = self._stream_executor.submit(
+                self.client.search, **{**params, "limit": limit - first_page, "offset": first_page})
+        yield self.client.search(**params)
+        if rest is not None:
+            yield rest.result()
+
+    def _query_vector(self, query_text, book_id):
+        """Vector of book_id (fetched from Qdrant) or of the encoded query_text; None if neither works"""
+        if book_id:
+            # Get the book vector from Qdrant
+            if self.use_local_index():
+                points = self.local_index.retrieve(book_id, with_vectors=True)
+            else:
                 points = self.client.retrieve(
                     collection_name=self.collection_name,
                     ids=[book_id],
+                    with_payload=False,
                     with_vectors=True
                 )
-                
-                if not points:
-                    self.log(f"Book with ID {book_id} not found", level="warning")
+
+            if not points:
+                self.log(f"Book with ID {book_id} not found", level="warning")
+                return None
+
+            self.log(f"Using vector from book ID: {book_id}")
+            return points[0].vector
+
+        if query_text:
+            # Encode the query text
+            self.log(f"Using vector from text: '{query_text}'")
+            return self.encode_query(query_text).tolist()
+
+        self.log("Either query_text or book_id must be provided", level="error")
+        return None
+
+    async def get_book_by_id_async(self, book_id):
+        """Async version of get_book_by_id using the AsyncQdrantClient (call connect_async() first)"""
+        if self.use_local_index():
+            return self.get_book_by_id(book_id)
+        if not self.async_client:
+            self.log("Not connected to Qdrant. Call connect_async() first.", level="error")
+            return None
+
+        with METRICS.timed("qdrant", "retrieve_async") as span:
+            try:
+                points = await self.async_client.retrieve(
+                    collection_name=self.collection_name,
+                    ids=[book_id],
+                    with_payload=["title", "summary"]
+                )
+                span.items = len(points)
+                return self._book_from_points(points, book_id)
+            except Exception as e:
+                span.error = True
+                self.log(f"Error retrieving book by ID: {e}", level="error")
+                return None
+
+    async def search_similar_books_async(self, query_text=None, book_id=None, exclude_ids=None, limit=5, filters=None):
+        """
+        Async version of search_similar_books, so many searches can be in flight at once.
+        Query encoding runs in a worker thread to keep the event loop free.
+        """
+        if self.use_local_index():
+            return await asyncio.to_thread(self.search_similar_books, query_text, book_id, exclude_ids, limit, filters)
+        if not self.async_client:
+            self.log("Not connected to Qdrant. Call connect_async() first.", level="error")
+            return []
+
+        try:
+            pairs = self._neighbor_lookup(book_id, exclude_ids, limit, filters)
+            if pairs is not None:
+                records = await self.async_client.retrieve(
+                    collection_name=self.collection_name,
+                    ids=[point_id for point_id, _ in pairs],
+                    with_payload=RESULT_PAYLOAD_FIELDS
+                ) if pairs else []
+                return self._finish_search(self._neighbor_points(pairs, records))
+        except Exception as e:
+            self.log(f"Neighbour table lookup failed, using live search: {e}", level="warning")
+
+        if not self.model:
+            model_loaded = await asyncio.to_thread(self.load_model)
+            if not model_loaded:
+                self.log("Failed to load the embedding model.", level="error")
+                return []
+
+        with METRICS.timed("qdrant", "search_async") as span:
+            try:
+                if book_id:
+                    points = await self.async_client.retrieve(
+                        collection_name=self.collection_name,
+                        ids=[book_id],
+                        with_payload=False,
+                        with_vectors=True
+                    )
+                    if not points:
+                        self.log(f"Book with ID {book_id} not found", level="warning")
+                        return []
+                    query_vector = points[0].vector
+                elif query_text:
+                    query_vector = (await asyncio.to_thread(self.encode_query, query_text)).tolist()
+                else:
+                    self.log("Either query_text or book_id must be provided", level="error")
                     return []
-                    
-                query_vector = points[0].vector
-                self.log(f"Using vector from book ID: {book_id}")
-                
-            elif query_text:
-                # Encode the query text
-                query_vector = self.model.encode(query_text).tolist()
-                self.log(f"Using vector from text: '{query_text}'")
-                
-            else:
-                self.log("Either query_text or book_id must be provided", level="error")
+
+                search_results = await self.async_client.search(**self._search_params(query_vector, exclude_ids, limit, filters))
+                span.items = len(search_results)
+                return self._finish_search(search_results)
+
+            except Exception as e:
+                span.error = True
+                self.log(f"Error searching for books: {e}", level="error")
                 return []
-            
-            # Configure search parameters
-            search_params = {
-                "collection_name": self.collection_name,
-                "query_vector": query_vector,
-                "limit": limit + (len(exclude_ids) if exclude_ids else 0),  # Get extra results to account for excluded IDs
-                "score_threshold": 0.0  # No threshold to get all results
+
+    def _book_from_points(self, points, book_id):
+        """Turn a retrieve() result into the dictionary returned by get_book_by_id"""
+        # Check if we found the book
+        if points and len(points) > 0:
+            return {
+                "book_id": points[0].id,
+                "title": points[0].payload.get("title", "Unknown"),
+                "summary": points[0].payload.get("summary", "No summary available")
             }
-            
-            # Search for similar books
-            search_results = self.client.search(**search_params)
-            
-            # Filter out excluded IDs if any
-            if exclude_ids:
-                search_results = [r for r in search_results if r.id not in exclude_ids]
-                # Limit results after filtering
-                search_results = search_results[:limit]
-            
-            # Check if we got results
-            if not search_results:
-                self.log(f"No similar books found", level="warning")
-            else:
-                self.log(f"Found {len(search_results)} similar books", level="success")
-                
-            return search_results
-            
-        except Exception as e:
-            self.log(f"Error searching for books: {e}", level="error")
+        self.log(f"Book with ID {book_id} not found", level="warning")
+        return None
+
+    def _search_params(self, query_vector, exclude_ids, limit, filters=None):
+        """Configure search parameters; exclusions and metadata filters run inside Qdrant"""
+        must = self._filter_conditions(filters)
+        must_not = [models.HasIdCondition(has_id=list(exclude_ids))] if exclude_ids else []
+        return {
+            "collection_name": self.collection_name,
+            "query_vector": query_vector,
+            "query_filter": models.Filter(must=must or None, must_not=must_not or None) if must or must_not else None,
+            "limit": limit,
+            "with_payload": models.PayloadSelectorInclude(include=RESULT_PAYLOAD_FIELDS),
+            "score_threshold": 0.0  # No threshold to get all results
+        }
+
+    def _filter_conditions(self, filters):
+        """Translate get_books_metadata-style filters into Qdrant payload conditions"""
+        if not filters:
             return []
+        conditions = []
+        if filters.get("max_pages") is not None:
+            conditions.append(models.FieldCondition(key="num_pages", range=models.Range(lte=filters["max_pages"])))
+        if filters.get("min_pub_date") is not None:
+            conditions.append(models.FieldCondition(
+                key="publication_date", range=models.Range(gte=date_to_payload(filters["min_pub_date"]))))
+        if filters.get("is_ebook") is not None:
+            conditions.append(models.FieldCondition(key="is_ebook", match=models.MatchValue(value=filters["is_ebook"])))
+        if filters.get("format") is not None:
+            conditions.append(models.FieldCondition(key="format", match=models.MatchValue(value=filters["format"])))
+        if filters.get("min_average_rating") is not None:
+            conditions.append(models.FieldCondition(
+                key="average_rating", range=models.Range(gte=filters["min_average_rating"])))
+        if filters.get("min_rating_count") is not None:
+            conditions.append(models.FieldCondition(
+                key="ratings_count", range=models.Range(gte=filters["min_rating_count"])))
+        return conditions
+
+    def ensure_payload_indexes(self):
+        """Create the payload indexes used by metadata filters (no-op for indexes that already exist)"""
+        if not self.client:
+            self.log("Not connected to Qdrant. Call connect() first.", level="error")
+            return False
+        existing = self.client.get_collection(self.collection_name).payload_schema or {}
+        for field, schema in FILTER_PAYLOAD_SCHEMA.items():
+            if field not in existing:
+                self.client.create_payload_index(self.collection_name, field_name=field, field_schema=schema)
+                self.log(f"Created payload index on '{field}'")
+        return True
+
+    def _finish_search(self, search_results):
+        """Log the outcome of a search"""
+        # Check if we got results
+        if not search_results:
+            self.log(f"No similar books found", level="warning")
+        else:
+            self.log(f"Found {len(search_results)} similar books", level="success")
+
+        return search_results
     
     def format_results(self, results):
         """
@@ -188,29 +708,29 @@ class QdrantConnector:
         if not results:
             return []
         
-        formatted_results = []
-        for i, result in enumerate(results):
-            print("DEBUG: Qdrant payload:", result.payload)
-
-            # Extract book information from payload
-            title = result.payload.get('title', 'Unknown')
-            summary = result.payload.get('summary', 'No summary available')
-            # Extract work_id from payload (if available)
-            work_id = result.payload.get('work_id')
-            
-            # Truncate long summaries
-            if len(summary) > 200:
-                summary = summary[:200] + "..."
-                
-            # Create a structured result
-            formatted_result = {
-                "rank": i+1,
-                "book_id": result.id,
-                "score": round(result.score, 4),
-                "title": title,
-                "summary": summary,
-                "work_id": work_id
-            }
-            formatted_results.append(formatted_result)
-            
-        return formatted_results
\ No newline at end of file
+        return [self.format_result(result, i + 1) for i, result in enumerate(results)]
+
+    def format_result(self, result, rank):
+        """Format a single search result; see format_results"""
+        if self.log_enabled("debug"):
+            self.log(f"Qdrant payload: {result.payload}", level="debug")
+
+        # Extract book information from payload
+        title = result.payload.get('title', 'Unknown')
+        summary = result.payload.get('summary', 'No summary available')
+        # Extract work_id from payload (if available)
+        work_id = result.payload.get('work_id')
+
+        # Truncate long summaries
+        if len(summary) > 200:
+            summary = summary[:200] + "..."
+
+        # Create a structured result
+        return {
+            "rank": rank,
+            "book_id": result.id,
+            "score": round(result.score, 4),
+            "title": title,
+            "summary": summary,
+            "work_id": work_id
+        }
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from database.ttl_cache import TTLCache
+
+
+def ratings_hash(rated_books_data):
+    """Order-independent hash of a {work_id: {"rating": ...}} rating set"""
+    pairs = sorted((str(work_id), float(data["rating"])) for work_id, data in rated_books_data.items())
+    return hashlib.sha1(json.dumps(pairs).encode("utf-8")).hexdigest()
+
+
+class RecommendationCache:
+    """
+    Cache of recommendation results keyed by user_id, a fingerprint of the user's ratings, the
+    kind of result ("cf", "vector", ...) and the call's parameters.
+
+    For calls that pass the ratings (rated_books_data) the fingerprint is their hash. For users
+    whose ratings live in the graph it is a hash chained over every record_ratings() call since
+    the user was last deleted (invalidate_user), so changing a user's ratings moves all of their
+    lookups to new keys: the old entries can never be served again and simply age out. A user
+    that is deleted and re-inserted with the same ratings (the temp_user flow) gets the same
+    fingerprint again, so those round trips hit the cache too.
+
+    The memory tier is a TTLCache. The optional SQLite tier (sqlite_path) is shared by every
+    process on the host and also holds the fingerprints, so a rating change made by one
+    Streamlit process is seen by the others.
+
+    get_or_compute() also remembers how each user's results were computed, so a
+    RecommendationRefresher can recompute them for the most active users in the background.
+    """
+
+    def __init__(self, max_entries=1000, ttl=None, sqlite_path=None, recipes_per_user=8):
+        """
+        Parameters:
+        - max_entries: maximum number of results kept in memory
+        - ttl: seconds a result stays valid (None = no expiry)
+        - sqlite_path: SQLite file for the shared tier (None = memory only)
+        - recipes_per_user: how many distinct requests per user the refresher recomputes
+        """
+        self.memory = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.ttl = ttl
+        self.sqlite_path = sqlite_path
+        self.recipes_per_user = recipes_per_user
+
+        self._lock = threading.Lock()
+        self._fingerprints = {}
+        self._activity = Counter()
+        self._recipes = {}
+        self._db = None
+
+        self.sqlite_hits = 0
+        self.refreshes = 0
+
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS recommendations (
+                    key TEXT PRIMARY KEY, user_id TEXT, created REAL, value TEXT
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS recommendations_user ON recommendations (user_id)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS fingerprints (user_id TEXT PRIMARY KEY, fingerprint TEXT)")
+
+    def fingerprint(self, user_id, rated_books_data=None):
+        """Hash of rated_books_data if given, else the user's recorded fingerprint ("" if none)"""
+        if rated_books_data is not None:
+            return ratings_hash(rated_books_data)
+        with self._lock:
+            return self._stored_fingerprint(user_id)
+
+    def _stored_fingerprint(self, user_id):
+        """The user's recorded fingerprint; call with _lock held"""
+        if self._db is not None:
+            row = self._db.execute("SELECT fingerprint FROM fingerprints WHERE user_id = ?", [user_id]).fetchone()
+            return row[0] if row else ""
+        return self._fingerprints.get(user_id, "")
+
+    def key(self, user_id, kind, rated_books_data=None, params=None):
+        params = json.dumps(params or {}, sort_keys=True, default=str)
+        return f"{kind}|{user_id or ''}|{self.fingerprint(user_id, rated_books_data)}|{params}"
+
+    def get(self, key):
+        """Return the cached result for key, or None"""
+        value = self.memory.get(key)
+        if value is not None or self._db is None:
+            return value
+        with self._lock:
+            row = self._db.execute("SELECT created, value FROM recommendations WHERE key = ?", [key]).fetchone()
+        if row is None or (self.ttl is not None and time.time() - row[0] > self.ttl):
+            return None
+        value = json.loads(row[1])
+        self.memory.put(key, value)
+        self.sqlite_hits += 1
+        return value
+
+    def put(self, key, value, user_id=None):
+        self.memory.put(key, value)
+        if self._db is not None:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO recommendations (key, user_id, created, value) VALUES (?, ?, ?, ?)",
+                    [key, user_id or "", time.time(), json.dumps(value, default=str)]
+                )
+
+    def get_or_compute(self, user_id, kind, compute, rated_books_data=None, refresh=False, **params):
+        """
+        Return the cached result for this request, or call compute() and cache what it returns.
+        Empty results are not cached, since the connectors also return [] on errors.
+        refresh=True always recomputes.
+        """
+        key = self.key(user_id, kind, rated_books_data, params)
+        if user_id:
+            self._remember(user_id, key, compute)
+        value = None if refresh else self.get(key)
+        if value is None:
+            value = compute()
+            if value:
+                self.put(key, value, user_id)
+        return value
+
+    def _remember(self, user_id, key, compute):
+        with self._lock:
+            self._activity[user_id] += 1
+            if len(self._activity) > 100_000:
+                self._activity = Counter(dict(self._activity.most_common(10_000)))
+            recipes = self._recipes.setdefault(user_id, OrderedDict())
+            recipes[key] = compute
+            recipes.move_to_end(key)
+            while len(recipes) > self.recipes_per_user:
+                recipes.popitem(last=False)
+
+    def record_ratings(self, user_id, rated_books_data):
+        """
+        Call after user_id's ratings change: moves the user to a new fingerprint (chained with the
+        previous one, since new ratings are merged into the existing ones) and drops their old results.
+        rated_books_data=None means the user was deleted, which resets the fingerprint to "".
+        The previous fingerprint is read and replaced atomically (across processes with the SQLite
+        tier), so concurrent updates of one user cannot chain from the same parent.
+        """
+        change = ratings_hash(rated_books_data) if rated_books_data is not None else None
+        with self._lock:
+            if self._db is not None:
+                self._db.execute("BEGIN IMMEDIATE")
+            try:
+                fingerprint = ""
+                if change is not None:
+                    previous = self._stored_fingerprint(user_id)
+                    fingerprint = hashlib.sha1(f"{previous}:{change}".encode("utf-8")).hexdigest()
+                self._fingerprints[user_id] = fingerprint
+                self._recipes.pop(user_id, None)
+                if self._db is not None:
+                    self._db.execute("INSERT OR REPLACE INTO fingerprints (user_id, fingerprint) VALUES (?, ?)",
+                                     [user_id, fingerprint])
+                    self._db.execute("DELETE FROM recommendations WHERE user_id = ?", [user_id])
+                    self._db.execute("COMMIT")
+            except Exception:
+                if self._db is not None:
+                    self._db.execute("ROLLBACK")
+                raise
+
+    def invalidate_user(self, user_id):
+        """Forget every cached result of user_id (e.g. after the user is deleted)"""
+        self.record_ratings(user_id, None)
+
+    def active_users(self, n):
+        """The n users with the most requests"""
+        with self._lock:
+            return [user_id for user_id, _ in self._activity.most_common(n)]
+
+    def refresh_user(self, user_id):
+        """Recompute and re-cache every remembered request of user_id; returns how many"""
+        with self._lock:
+            recipes = list(self._recipes.get(user_id, {}).items())
+        for key, compute in recipes:
+            value = compute()
+            # Skip results that were invalidated while they were being computed
+            if value and key in self._recipes.get(user_id, {}):
+                self.put(key, value, user_id)
+                self.refreshes += 1
+        return len(recipes)
+
+    def stats(self):
+        """Return hit/miss counters and size for the debug panel"""
+        stats = self.memory.stats()
+        stats.update(sqlite_hits=self.sqlite_hits, refreshes=self.refreshes, users=len(self._activity))
+        return stats
+
+
+class RecommendationRefresher:
+    """
+    Daemon thread that periodically recomputes the cached results of the most active users, so
+    their next requests are cache hits. Users come from the cache's request counts; seed_users
+    (a callable returning user_ids, e.g. the users with the most ratings) fills up the rest, and
+    seed_compute(user_id) computes the first result for those.
+    """
+
+    def __init__(self, cache, interval=300, top_users=50, seed_users=None, seed_compute=None):
+        self.cache = cache
+        self.interval = interval
+        self.top_users = top_users
+        self.seed_users = seed_users
+        self.seed_compute = seed_compute
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+
+    def log(self, message, level="info"):
+        """Log message to console"""
+        print(f"[{level.upper()}] {message}")
+
+    def refresh_once(self):
+        start = time.perf_counter()
+        users = self.cache.active_users(self.top_users)
+        refreshed = 0
+        for user_id in users:
+            refreshed += self.cache.refresh_user(user_id)
+        if self.seed_users and self.seed_compute and len(users) < self.top_users:
+            for user_id in self.seed_users(self.top_users):
+                if user_id not in users and len(users) < self.top_users:
+                    self.seed_compute(user_id)
+                    users.append(user_id)
+                    refreshed += 1
+        self.last_run = {"users": len(users), "results": refreshed, "seconds": time.perf_counter() - start}
+        return self.last_run
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                stats = self.refresh_once()
+                if stats["results"]:
+                    self.log(f"Refreshed {stats['results']} cached recommendations for {stats['users']} users "
+                             f"in {stats['seconds']:.1f}s")
+            except Exception as e:
+                self.log(f"Recommendation refresh failed: {e}", level="error")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None and self.interval:
+            self._thread = threading.Thread(target=self._run, name="recommendation-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,229 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from database.table_files import iter_chunks
+
+
+class ItemSimilarityIndex:
+    """
+    Sparse top-K item-item similarity index built offline from INTERACTED edges.
+
+    For every book the index keeps its K most similar books (cosine similarity over
+    the user rating columns, shrunk towards zero for pairs with few co-raters) in
+    flat arrays in CSR layout:
+      - work_ids: int64 work_id of every indexed book (sorted)
+      - indptr:   int64 row offsets into neighbors / similarities
+      - neighbors: int32 positions into work_ids
+      - similarities: float32 similarity of each neighbor
+
+    Serving a user is a lookup-and-merge over the neighbor lists of the books they
+    rated, so no graph traversal is needed at request time.
+    """
+
+    ARRAYS = ("work_ids", "indptr", "neighbors", "similarities")
+
+    def __init__(self, work_ids, indptr, neighbors, similarities):
+        self.work_ids = np.asarray(work_ids, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)
+        self.similarities = np.asarray(similarities, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.work_ids)
+
+    @classmethod
+    def build(cls, user_ids, work_ids, ratings, top_k=50, min_common_users=2, shrinkage=10.0,
+              block_size=2048, log=print):
+        """
+        Build the index from parallel arrays of (user_id, work_id, rating) edges.
+
+        Parameters:
+        - user_ids, work_ids, ratings: interaction edges (zero ratings are ignored)
+        - top_k: number of neighbors kept per book
+        - min_common_users: minimum number of co-raters for a pair to be kept
+        - shrinkage: similarity is scaled by n / (n + shrinkage) for n co-raters
+        - block_size: number of books scored per sparse matrix product
+
+        Returns:
+        - ItemSimilarityIndex
+        """
+        ratings = np.asarray(ratings, dtype=np.float32)
+        rated = ratings > 0
+        user_codes, _ = pd.factorize(np.asarray(user_ids)[rated])
+        book_codes, book_uniques = pd.factorize(np.asarray(work_ids).astype(np.int64)[rated], sort=True)
+        ratings = ratings[rated]
+
+        n_users = int(user_codes.max()) + 1 if len(user_codes) else 0
+        n_books = len(book_uniques)
+        log(f"Building item similarity index: {len(ratings)} ratings, {n_users} users, {n_books} books")
+
+        matrix = sparse.csr_matrix((ratings, (user_codes, book_codes)), shape=(n_users, n_books))
+        matrix.sum_duplicates()
+
+        # Cosine similarity is the dot product of L2-normalized item columns
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+        norms[norms == 0] = 1.0
+        normalized = (matrix @ sparse.diags(1.0 / norms)).tocsc()
+        binary = matrix.copy().tocsc()
+        binary.data[:] = 1.0
+        normalized_t = normalized.T.tocsr()
+        binary_t = binary.T.tocsr()
+
+        indptr = np.zeros(n_books + 1, dtype=np.int64)
+        neighbor_blocks = []
+        similarity_blocks = []
+        start_time = time.perf_counter()
+
+        for start in range(0, n_books, block_size):
+            stop = min(start + block_size, n_books)
+            sims = (normalized_t[start:stop] @ normalized).tocsr()
+            counts = (binary_t[start:stop] @ binary).tocsr()
+            sims.sort_indices()
+            counts.sort_indices()
+
+            for row in range(stop - start):
+                book = start + row
+                cols = sims.indices[sims.indptr[row]:sims.indptr[row + 1]]
+                values = sims.data[sims.indptr[row]:sims.indptr[row + 1]]
+                common = counts.data[counts.indptr[row]:counts.indptr[row + 1]]
+
+                keep = (cols != book) & (common >= min_common_users)
+                cols, values, common = cols[keep], values[keep], common[keep]
+                values = values * (common / (common + shrinkage))
+
+                if len(values) > top_k:
+                    best = np.argpartition(-values, top_k - 1)[:top_k]
+                    cols, values = cols[best], values[best]
+                order = np.argsort(-values, kind="stable")
+
+                neighbor_blocks.append(cols[order].astype(np.int32))
+                similarity_blocks.append(values[order].astype(np.float32))
+                indptr[book + 1] = indptr[book] + len(order)
+
+            log(f"Scored {stop}/{n_books} books ({time.perf_counter() - start_time:.1f}s)")
+
+        neighbors = np.concatenate(neighbor_blocks) if neighbor_blocks else np.zeros(0, dtype=np.int32)
+        similarities = np.concatenate(similarity_blocks) if similarity_blocks else np.zeros(0, dtype=np.float32)
+        return cls(book_uniques, indptr, neighbors, similarities)
+
+    @classmethod
+    def build_from_csv(cls, path, chunksize=1_000_000, **kwargs):
+        """
+        Build the index from the cleaned interactions CSV or Parquet file (user_id, work_id,
+        rating columns).
+        """
+        user_ids, work_ids, ratings = [], [], []
+        for chunk in iter_chunks(path, chunksize, columns=["user_id", "work_id", "rating"]):
+            chunk = chunk.dropna(subset=["work_id"])
+            user_ids.append(chunk["user_id"].to_numpy())
+            work_ids.append(chunk["work_id"].to_numpy(dtype=np.int64))
+            ratings.append(chunk["rating"].to_numpy(dtype=np.float32))
+        return cls.build(np.concatenate(user_ids), np.concatenate(work_ids), np.concatenate(ratings), **kwargs)
+
+    def save(self, path):
+        """Save the index as one .npy file per array inside the directory at path"""
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load an index saved with save(). With mmap=True the arrays are memory-mapped,
+        so loading is instant and several processes share the same pages.
+        """
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in cls.ARRAYS]
+        return cls(*arrays)
+
+    def neighbors_of(self, work_id):
+        """Return a list of (work_id, similarity) tuples for a single book"""
+        pos = np.searchsorted(self.work_ids, int(work_id))
+        if pos >= len(self.work_ids) or self.work_ids[pos] != int(work_id):
+            return []
+        lo, hi = self.indptr[pos], self.indptr[pos + 1]
+        return list(zip(self.work_ids[self.neighbors[lo:hi]].tolist(), self.similarities[lo:hi].tolist()))
+
+    def recommend(self, rated_books_data, limit=10, min_similarity=0.0):
+        """
+        Score unrated books for a user from the neighbor lists of the books they rated.
+
+        Parameters:
+        - rated_books_data: dict mapping work_id to a dict with at least a 'rating' key
+          (the same shape Neo4jConnector.insert_user_ratings accepts)
+        - limit: maximum number of recommendations
+        - min_similarity: neighbors below this similarity are ignored
+
+        Returns:
+        - List of dicts with keys work_id and cf_score (similarity-weighted average rating)
+        """
+        if not rated_books_data or len(self.work_ids) == 0:
+            return []
+
+        rated_ids = np.array([int(w) for w in rated_books_data], dtype=np.int64)
+        rated_values = np.array([float(d["rating"]) for d in rated_books_data.values()], dtype=np.float32)
+
+        pos = np.searchsorted(self.work_ids, rated_ids)
+        pos = np.minimum(pos, len(self.work_ids) - 1)
+        found = self.work_ids[pos] == rated_ids
+        pos, rated_values = pos[found], rated_values[found]
+        if len(pos) == 0:
+            return []
+
+        starts, stops = self.indptr[pos], self.indptr[pos + 1]
+        lengths = stops - starts
+        if lengths.sum() == 0:
+            return []
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        candidates = self.neighbors[offsets]
+        sims = self.similarities[offsets]
+        weights = np.repeat(rated_values, lengths)
+
+        keep = sims > min_similarity
+        keep &= ~np.isin(candidates, pos)
+        candidates, sims, weights = candidates[keep], sims[keep], weights[keep]
+        if len(candidates) == 0:
+            return []
+
+        unique, inverse = np.unique(candidates, return_inverse=True)
+        weighted_sum = np.bincount(inverse, weights=sims * weights)
+        sim_sum = np.bincount(inverse, weights=sims)
+        scores = weighted_sum / sim_sum
+
+        top = np.argsort(-scores, kind="stable")[:limit]
+        return [
+            {"work_id": str(self.work_ids[unique[i]]), "cf_score": float(scores[i])}
+            for i in top
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the item-item similarity index used for CF recommendations")
+    parser.add_argument("--interactions", required=True, help="Path to goodreads_interactions_comics_graphic_cleaned.csv")
+    parser.add_argument("--out", default=os.getenv("CF_INDEX_PATH", "item_similarity"), help="Output directory")
+    parser.add_argument("--top-k", type=int, default=50)
+    parser.add_argument("--min-common-users", type=int, default=2)
+    parser.add_argument("--shrinkage", type=float, default=10.0)
+    parser.add_argument("--block-size", type=int, default=2048)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = ItemSimilarityIndex.build_from_csv(
+        args.interactions,
+        top_k=args.top_k,
+        min_common_users=args.min_common_users,
+        shrinkage=args.shrinkage,
+        block_size=args.block_size
+    )
+    index.save(args.out)
+    print(f"Saved index with {len(index)} books and {len(index.neighbors)} neighbor entries "
+          f"to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import importlib
+import os
+import threading
+import time
+
+# Warm-up steps, in the order they run (the search path first, since that is what the UI uses)
+WARMUP_STEPS = ("qdrant", "model", "query", "postgres", "neo4j")
+
+# Connector attribute -> (module, class)
+CONNECTORS = {
+    "neo4j": ("database.neo4j_connector", "Neo4jConnector"),
+    "qdrant": ("database.qdrant_connector", "QdrantConnector"),
+    "postgres": ("database.postgres_connector", "PostgresConnector")
+}
+
+
+class Backends:
+    """
+    Lazily constructed connectors plus a background warm-up.
+
+    Each connector (and the module defining it) is only imported and constructed the first time
+    it is accessed. start_warmup() runs a daemon thread that connects Qdrant, loads the
+    embedding model, runs a dummy search and then connects Postgres and Neo4j, so the first real query does
+    not pay for any of it. status holds "pending" / "running" / "ready" / "failed: ..." for each
+    step, wait_for() lets a request block on just the steps it needs, and timings records how
+    long every import, construction and warm-up step took.
+
+    Once Neo4j is up, a RecommendationRefresher keeps the cached recommendations of the most
+    active users fresh (RECOMMENDATION_REFRESH_INTERVAL seconds, 0 disables it).
+    With METRICS_PORT set, start_metrics_server() serves the connectors' metrics over HTTP.
+    """
+
+    def __init__(self, warmup_query="a book"):
+        self.warmup_query = warmup_query
+        self.timings = {}
+        self.status = {step: "pending" for step in WARMUP_STEPS}
+        self._done = {step: threading.Event() for step in WARMUP_STEPS}
+        self._connectors = {}
+        self._lock = threading.RLock()
+        self._thread = None
+        self._hybrid = None
+        self.refresher = None
+        self.metrics_server = None
+
+    def log(self, message, level="info"):
+        """Log message to console"""
+        print(f"[{level.upper()}] {message}")
+
+    def record_timing(self, name, seconds):
+        """Add a step to the startup time breakdown"""
+        self.timings[name] = seconds
+        self.log(f"Startup: {name} took {seconds:.3f}s")
+
+    def _connector(self, name):
+        with self._lock:
+            if name not in self._connectors:
+                module_name, class_name = CONNECTORS[name]
+                start = time.perf_counter()
+                module = importlib.import_module(module_name)
+                self.record_timing(f"import {name}", time.perf_counter() - start)
+                start = time.perf_counter()
+                self._connectors[name] = getattr(module, class_name)()
+                self.record_timing(f"construct {name}", time.perf_counter() - start)
+            return self._connectors[name]
+
+    @property
+    def neo4j(self):
+        return self._connector("neo4j")
+
+    @property
+    def qdrant(self):
+        return self._connector("qdrant")
+
+    @property
+    def postgres(self):
+        return self._connector("postgres")
+
+    @property
+    def hybrid(self):
+        """HybridRecommender over the three connectors"""
+        with self._lock:
+            if self._hybrid is None:
+                from database.hybrid_recommender import HybridRecommender
+                self._hybrid = HybridRecommender(self.neo4j, self.qdrant, self.postgres)
+            return self._hybrid
+
+    def start_warmup(self):
+        """Start the warm-up thread (once); returns immediately"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._warmup, name="backend-warmup", daemon=True)
+                self._thread.start()
+
+    def _warmup(self):
+        start = time.perf_counter()
+        self._step("qdrant", self._warm_qdrant)
+        self._step("model", self._warm_model)
+        # The dummy search needs both a collection (or local index) and a model
+        if self.status["qdrant"] == "ready" and self.status["model"] == "ready":
+            self._step("query", self._warm_query)
+        else:
+            self.status["query"] = "failed: skipped"
+            self._done["query"].set()
+        self._step("postgres", self._warm_postgres)
+        self._step("neo4j", self._warm_neo4j)
+        if self.status["neo4j"] == "ready":
+            self.start_refresher()
+        self.record_timing("warm-up total", time.perf_counter() - start)
+        self.log(self.startup_report())
+
+    def _step(self, name, fn):
+        self.status[name] = "running"
+        start = time.perf_counter()
+        try:
+            fn()
+            self.status[name] = "ready"
+        except Exception as e:
+            self.status[name] = f"failed: {e}"
+            self.log(f"Warm-up step '{name}' failed: {e}", level="warning")
+        finally:
+            self.record_timing(f"warm-up {name}", time.perf_counter() - start)
+            self._done[name].set()
+
+    def _warm_postgres(self):
+        if not self.postgres.connect():
+            raise RuntimeError("could not connect")
+        with self.postgres.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1")
+
+    def _warm_neo4j(self):
+        if not self.neo4j.connect():
+            raise RuntimeError("could not connect")
+        self.neo4j.driver.verify_connectivity()
+
+    def _warm_qdrant(self):
+        status, message = self.qdrant.connect()
+        if not status:
+            raise RuntimeError(message)
+
+    def _warm_model(self):
+        if not self.qdrant.load_model():
+            raise RuntimeError("could not load the embedding model")
+
+    def _warm_query(self):
+        # Exercises tokenizer, model, transport and collection once; the result is discarded
+        self.qdrant.search_similar_books(query_text=self.warmup_query, limit=1)
+
+    def start_refresher(self):
+        """
+        Start the background refresher of the Neo4j connector's recommendation cache. With
+        RECOMMENDATION_REFRESH_SEED=1 the users with the most ratings in the graph are
+        precomputed as well, before they make any request.
+        """
+        from database.recommendation_cache import RecommendationRefresher
+        neo4j = self.neo4j
+        seed = os.getenv("RECOMMENDATION_REFRESH_SEED", "0") == "1"
+        with self._lock:
+            if self.refresher is None:
+                self.refresher = RecommendationRefresher(
+                    neo4j.recommendation_cache,
+                    interval=float(os.getenv("RECOMMENDATION_REFRESH_INTERVAL", "300")),
+                    top_users=int(os.getenv("RECOMMENDATION_REFRESH_USERS", "20")),
+                    seed_users=neo4j.get_most_active_users if seed else None,
+                    seed_compute=neo4j.get_collaborative_recommendations
+                ).start()
+        return self.refresher
+
+    def start_metrics_server(self):
+        """
+        Serve the shared connector metrics (database.metrics.METRICS) on METRICS_PORT:
+        /metrics in the Prometheus text format and /metrics.json as a snapshot.
+        Does nothing when METRICS_PORT is not set.
+        """
+        port = os.getenv("METRICS_PORT")
+        if not port:
+            return None
+        from database.metrics import METRICS
+        with self._lock:
+            if self.metrics_server is None:
+                try:
+                    self.metrics_server = METRICS.serve(int(port), host=os.getenv("METRICS_HOST", "0.0.0.0"))
+                    self.log(f"Serving metrics on port {port}")
+                except OSError as e:
+                    self.log(f"Could not start the metrics server on port {port}: {e}", level="error")
+        return self.metrics_server
+
+    def wait_for(self, *steps, timeout=None):
+        """Block until the given warm-up steps finished (all steps if none given); returns True if they did"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for step in steps or WARMUP_STEPS:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            if not self._done[step].wait(remaining):
+                return False
+        return True
+
+    def is_ready(self, *steps):
+        """True once the given steps (all steps if none given) finished successfully"""
+        return all(self.status[step] == "ready" for step in steps or WARMUP_STEPS)
+
+    def startup_report(self):
+        """One line per recorded import, construction and warm-up step"""
+        lines = [f"{name:<24} {seconds * 1000:9.1f} ms" for name, seconds in self.timings.items()]
+        return "Startup time breakdown:\n" + "\n".join(lines)
@@ -0,0 +1,58 @@
+import pandas as pd
+
+# The loaders take either the CSVs written by the cleaning notebooks or the Parquet files
+# written by data-processing/goodreads_pipeline.py; these helpers hide the difference.
+
+
+def is_parquet(path):
+    return str(path).endswith((".parquet", ".pq"))
+
+
+def _as_str(series):
+    """Strings for every non-null value (ints stay "123", not "123.0"), None for nulls"""
+    values = series.astype("string")
+    return values.astype(object).where(values.notna(), None)
+
+
+def _apply_dtype(frame, dtype):
+    if dtype is None:
+        return frame
+    dtypes = dtype if isinstance(dtype, dict) else {column: dtype for column in frame.columns}
+    for column, kind in dtypes.items():
+        if column in frame:
+            frame[column] = _as_str(frame[column]) if kind is str else frame[column].astype(kind)
+    return frame
+
+
+def column_names(path):
+    """Column names of a CSV or Parquet file"""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(path).names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def read_table(path, columns=None, dtype=None, **csv_kwargs):
+    """Read a whole CSV or Parquet file. dtype works like read_csv's (str converts to strings)."""
+    if is_parquet(path):
+        return _apply_dtype(pd.read_parquet(path, columns=columns), dtype)
+    return pd.read_csv(path, usecols=columns, dtype=dtype, **csv_kwargs)
+
+
+def iter_chunks(path, chunksize, columns=None, dtype=None, skip_rows=0, **csv_kwargs):
+    """
+    Yield DataFrames of up to chunksize rows from a CSV or Parquet file, starting after the
+    first skip_rows data rows. Parquet files are read one record batch at a time.
+    """
+    if not is_parquet(path):
+        yield from pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=chunksize,
+                               skiprows=range(1, skip_rows + 1), **csv_kwargs)
+        return
+
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+        if skip_rows >= batch.num_rows:
+            skip_rows -= batch.num_rows
+            continue
+        batch, skip_rows = batch.slice(skip_rows), 0
+        yield _apply_dtype(batch.to_pandas(), dtype)
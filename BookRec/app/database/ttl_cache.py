@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-entry time-to-live.
+
+    Shared by connectors that sit behind st.cache_resource, so lookups from concurrent
+    Streamlit sessions go through one lock.
+    """
+
+    def __init__(self, max_entries=10_000, ttl=None):
+        """
+        Parameters:
+        - max_entries: maximum number of entries before the least recently used are evicted
+        - ttl: seconds an entry stays valid (None = no expiry)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            return _MISSING
+        value, created = entry
+        if self.ttl is not None and now - created > self.ttl:
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default"""
+        with self._lock:
+            value = self._lookup(key, time.time())
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def get_many(self, keys):
+        """Return (found, missing): a dict of cached values and a list of keys that were not cached"""
+        found, missing = {}, []
+        with self._lock:
+            now = time.time()
+            for key in keys:
+                value = self._lookup(key, now)
+                if value is _MISSING:
+                    missing.append(key)
+                else:
+                    found[key] = value
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put(self, key, value, created=None):
+        """Store value under key"""
+        self.put_many({key: value}, created=created)
+
+    def put_many(self, items, created=None):
+        """
+        Store every key/value pair of the items dict. created is the time the TTL counts from
+        (default now), e.g. the write time of a value read back from a slower tier.
+        """
+        with self._lock:
+            now = time.time() if created is None else created
+            for key, value in items.items():
+                self._entries[key] = (value, now)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop key from the cache if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and size for the debug panel"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries)
+        }
@@ -0,0 +1,207 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from database.table_files import iter_chunks
+
+# Largest prime below 2**32: hash values fit in uint32 and a * x + b cannot overflow uint64
+PRIME = 4294967291
+
+
+class UserLSHIndex:
+    """
+    MinHash / LSH index over each user's set of rated work_ids, for finding collaborative
+    filtering neighbours without intersecting the target's books with every other user's.
+
+    Every user gets a signature of num_perm MinHash values (the minimum of a random hash
+    (a * work_id + b) mod PRIME over their books); the signature is cut into bands of
+    rows_per_band values and each band is hashed into a bucket key. Users sharing a bucket in
+    any band are candidates, and the more bands they share the higher their Jaccard similarity
+    is likely to be. The index keeps, per band, the users sorted by bucket key in flat arrays:
+      - user_ids: user_id of every indexed user
+      - coefficients: uint64 (2, num_perm) hash coefficients a and b
+      - mixers: uint64 (rows_per_band,) multipliers combining a band's values into its key
+      - band_keys: uint64 (bands, users) sorted bucket keys of each band
+      - band_users: int32 (bands, users) positions into user_ids, in band_keys order
+
+    A lookup is a binary search per band, so it does not grow with the number of users; the
+    caller applies the exact similarity formula to the candidates only.
+    """
+
+    ARRAYS = ("user_ids", "coefficients", "mixers", "band_keys", "band_users")
+
+    def __init__(self, user_ids, coefficients, mixers, band_keys, band_users):
+        self.user_ids = np.asarray(user_ids)
+        self.coefficients = np.asarray(coefficients, dtype=np.uint64)
+        self.mixers = np.asarray(mixers, dtype=np.uint64)
+        self.band_keys = np.asarray(band_keys, dtype=np.uint64)
+        self.band_users = np.asarray(band_users, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def bands(self):
+        return self.band_keys.shape[0]
+
+    @classmethod
+    def build(cls, user_ids, work_ids, num_perm=128, rows_per_band=1, min_books=2, seed=0,
+              max_block_bytes=256 * 2 ** 20, log=print):
+        """
+        Build the index from parallel arrays of (user_id, work_id) edges.
+
+        Parameters:
+        - user_ids, work_ids: interaction edges (every edge counts, whatever its rating)
+        - num_perm: MinHash values per user; must be a multiple of rows_per_band
+        - rows_per_band: values per band. Fewer rows find pairs with lower Jaccard
+          similarity at the cost of more candidates. CF neighbours mostly share only a few
+          books, so anything above 1 loses most of them (neighbour recall@50 drops from 0.95 to
+          0.26 with 2 rows on the 20k-user benchmark)
+        - min_books: users with fewer books cannot reach min_common_books and are not indexed
+        - seed: seed of the hash coefficients
+        - max_block_bytes: memory used for hashing edges at a time
+
+        Returns:
+        - UserLSHIndex
+        """
+        if num_perm % rows_per_band:
+            raise ValueError("num_perm must be a multiple of rows_per_band")
+        edges = pd.DataFrame({
+            "user_id": np.asarray(user_ids).astype(str),
+            "work_id": np.asarray(work_ids).astype(np.int64)
+        }).drop_duplicates()
+        counts = edges["user_id"].value_counts()
+        edges = edges[edges["user_id"].isin(counts.index[counts >= min_books])]
+        edges = edges.sort_values("user_id", kind="stable")
+
+        users, starts = np.unique(edges["user_id"].to_numpy(), return_index=True)
+        log(f"Building user LSH index: {len(edges)} edges, {len(users)} users, {num_perm} hashes "
+            f"in {num_perm // rows_per_band} bands")
+
+        rng = np.random.default_rng(seed)
+        coefficients = np.stack([rng.integers(1, PRIME, num_perm), rng.integers(0, PRIME, num_perm)]).astype(np.uint64)
+        mixers = rng.integers(1, 2 ** 63, rows_per_band, dtype=np.uint64) | np.uint64(1)
+
+        x = _hash_input(edges["work_id"].to_numpy())
+        signatures = np.empty((len(users), num_perm), dtype=np.uint32)
+        block = max(1, min(num_perm, max_block_bytes // max(1, 8 * len(x))))
+        start_time = time.perf_counter()
+        for lo in range(0, num_perm, block):
+            hi = min(lo + block, num_perm)
+            hashes = (x[:, None] * coefficients[0, lo:hi] + coefficients[1, lo:hi]) % np.uint64(PRIME)
+            signatures[:, lo:hi] = np.minimum.reduceat(hashes, starts, axis=0)
+        log(f"Computed signatures ({time.perf_counter() - start_time:.1f}s)")
+
+        keys = _band_keys(signatures, mixers)
+        order = np.argsort(keys, axis=1, kind="stable")
+        band_keys = np.take_along_axis(keys, order, axis=1)
+        return cls(users.astype(str), coefficients, mixers, band_keys, order.astype(np.int32))
+
+    @classmethod
+    def build_from_csv(cls, path, chunksize=1_000_000, **kwargs):
+        """Build the index from the cleaned interactions CSV or Parquet file (user_id, work_id columns)"""
+        user_ids, work_ids = [], []
+        for chunk in iter_chunks(path, chunksize, columns=["user_id", "work_id"]):
+            chunk = chunk.dropna(subset=["work_id"])
+            user_ids.append(chunk["user_id"].to_numpy())
+            work_ids.append(chunk["work_id"].to_numpy(dtype=np.int64))
+        return cls.build(np.concatenate(user_ids), np.concatenate(work_ids), **kwargs)
+
+    def save(self, path):
+        """Save the index as one .npy file per array inside the directory at path"""
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load an index saved with save(). With mmap=True the arrays are memory-mapped,
+        so loading is instant and several processes share the same pages.
+        """
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in cls.ARRAYS]
+        return cls(*arrays)
+
+    def signature(self, work_ids):
+        """MinHash signature of a set of work_ids"""
+        x = _hash_input(np.unique(np.asarray([int(w) for w in work_ids], dtype=np.int64)))
+        hashes = (x[:, None] * self.coefficients[0] + self.coefficients[1]) % np.uint64(PRIME)
+        return hashes.min(axis=0).astype(np.uint32)
+
+    def candidates(self, work_ids, max_candidates=5000, max_bucket=1000, exclude=None):
+        """
+        Return the user_ids that share at least one band with the set of work_ids, most shared
+        bands first.
+
+        Parameters:
+        - work_ids: the target's rated work_ids
+        - max_candidates: maximum number of user_ids returned
+        - max_bucket: users sampled from any one bucket, so a few huge buckets (users who rated
+          only the most popular books) do not dominate the lookup. The sample is random but
+          seeded by the bucket key, so a lookup always returns the same candidates
+        - exclude: user_id to leave out (the target itself)
+        """
+        if len(work_ids) == 0 or len(self.user_ids) == 0:
+            return []
+        keys = _band_keys(self.signature(work_ids)[None, :], self.mixers)[:, 0]
+        matches = []
+        for band, key in enumerate(keys):
+            lo = np.searchsorted(self.band_keys[band], key, side="left")
+            hi = np.searchsorted(self.band_keys[band], key, side="right")
+            if hi - lo > max_bucket:
+                # Buckets are in user order; a prefix would favour the users indexed first
+                sample = np.random.default_rng(int(key)).choice(hi - lo, max_bucket, replace=False)
+                matches.append(self.band_users[band, lo + np.sort(sample)])
+            elif hi > lo:
+                matches.append(self.band_users[band, lo:hi])
+        if not matches:
+            return []
+
+        users, shared = np.unique(np.concatenate(matches), return_counts=True)
+        order = np.argsort(-shared, kind="stable")
+        result = self.user_ids[users[order]].tolist()
+        if exclude is not None:
+            result = [user_id for user_id in result if user_id != exclude]
+        return result[:max_candidates]
+
+
+def _hash_input(work_ids):
+    return (np.asarray(work_ids, dtype=np.int64) % PRIME).astype(np.uint64)
+
+
+def _band_keys(signatures, mixers):
+    """Combine each band of rows_per_band signature values into one uint64 key; returns (bands, users)"""
+    rows = len(mixers)
+    bands = signatures.reshape(len(signatures), -1, rows).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        keys = (bands * mixers).sum(axis=2, dtype=np.uint64)
+    return np.ascontiguousarray(keys.T)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the MinHash LSH index used to find CF neighbours")
+    parser.add_argument("--interactions", required=True, help="Path to goodreads_interactions_comics_graphic_cleaned.csv")
+    parser.add_argument("--out", default=os.getenv("CF_LSH_PATH", "user_lsh"), help="Output directory")
+    parser.add_argument("--num-perm", type=int, default=128)
+    parser.add_argument("--rows-per-band", type=int, default=1)
+    parser.add_argument("--min-books", type=int, default=2)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = UserLSHIndex.build_from_csv(
+        args.interactions,
+        num_perm=args.num_perm,
+        rows_per_band=args.rows_per_band,
+        min_books=args.min_books
+    )
+    index.save(args.out)
+    print(f"Saved index with {len(index)} users in {index.bands} bands to {args.out} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
+import time
+_import_start = time.perf_counter()
+
 import streamlit as st
-from database.neo4j_connector import Neo4jConnector
-from database.qdrant_connector import QdrantConnector
-from database.postgres_connector import PostgresConnector
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from database.startup import Backends
+from database.metrics import METRICS
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import datetime
+import json
+import os
+
+_import_time = time.perf_counter() - _import_start
 
 # Set page configuration
 st.set_page_config(
@@ -17,28 +25,83 @@ if "debug_messages" not in st.session_state:
 
 # Function to log messages in a stable way
 def log_to_debug(message, level="info"):
-    st.session_state.debug_messages.append({"message": message, "level": level})
+    # The warm-up thread logs through the same connectors but has no session to write to
+    if get_script_run_ctx() is not None:
+        st.session_state.debug_messages.append({"message": message, "level": level})
     print(message)  # Also print to console
 
 # --------------------------
 # Initialize Database Connections
 # --------------------------
 @st.cache_resource
-def init_connections():
-    neo4j_conn = Neo4jConnector()
-    qdrant_conn = QdrantConnector()
-    pg_conn = PostgresConnector()
-    pg_conn.connect()  # Connect to PostgreSQL
-    return neo4j_conn, qdrant_conn, pg_conn
+def init_backends():
+    # Connectors are created on first use; the warm-up thread connects them in the background
+    backends = Backends()
+    backends.record_timing("import app", _import_time)
+    backends.start_metrics_server()
+    backends.start_warmup()
+    return backends
 
-neo4j_conn, qdrant_conn = init_connections()
+@st.cache_resource
+def init_enrichment_pool():
+    # Postgres metadata for the result cards is fetched here, so a slow query can be timed out
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="enrich")
+
+backends = init_backends()
+qdrant_conn = backends.qdrant
+enrichment_pool = init_enrichment_pool()
+ENRICHMENT_TIMEOUT = float(os.getenv("HYBRID_METADATA_TIMEOUT", "2.0"))
 
 # Override Qdrant connector's log method
 qdrant_conn.log = log_to_debug
 
+def describe_metadata(metadata):
+    """One-line summary of a get_books_metadata row for a result card"""
+    parts = []
+    if metadata.get("author_names"):
+        parts.append(metadata["author_names"])
+    if metadata.get("publication_date"):
+        parts.append(str(metadata["publication_date"]))
+    if metadata.get("num_pages"):
+        parts.append(f"{metadata['num_pages']} pages")
+    if metadata.get("average_rating") is not None:
+        parts.append(f"rated {float(metadata['average_rating']):.2f}")
+    return " · ".join(parts)
+
+def render_card(placeholder, result, metadata=None):
+    """Draw a result card into placeholder; called again once its metadata arrives"""
+    with placeholder.container():
+        col1, col2 = st.columns([1, 4])
+        with col1:
+            st.metric("Score", f"{result['score']:.2f}")
+        with col2:
+            st.markdown(f"### {result['title']}")
+            if metadata:
+                st.caption(describe_metadata(metadata))
+            st.markdown(f"{result['summary']}")
+        st.divider()
+
+def parse_ratings(text):
+    """{work_id: {"rating": ...}} from "work_id, rating" lines, plus the lines that could not be read"""
+    ratings, invalid = {}, []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            work_id, rating = (part.strip() for part in line.replace(":", ",").split(","))
+            ratings[int(work_id)] = {"rating": float(rating)}
+        except ValueError:
+            invalid.append(line.strip())
+    return ratings, invalid
+
 # Set up the UI
 st.title("Book Recommender System")
 
+STATUS_ICONS = {"pending": "⏳", "running": "⏳", "ready": "✅"}
+st.caption("Backends: " + " · ".join(
+    f"{step} {STATUS_ICONS.get(status, '❌')}" for step, status in backends.status.items()
+))
+
 # Create two columns for database status
 col1, col2 = st.columns(2)
 
@@ -46,7 +109,7 @@ col1, col2 = st.columns(2)
 with col1:
     st.header("Neo4j Database")
     if st.button("Test Neo4j Connection", key="neo4j_test"):
-        if neo4j_conn.connect():
+        if backends.neo4j.connect():
             st.success("Neo4j Connection Successful")
             log_to_debug("Connected to Neo4j successfully", "success")
         else:
@@ -83,8 +146,13 @@ if submit_button:
     if not query:
         st.warning("Please enter a search query")
     else:
+        # Let the warm-up finish connecting and loading the model instead of doing it twice
+        if not backends.is_ready("qdrant", "model"):
+            with st.spinner("Warming up the search backend..."):
+                backends.wait_for("qdrant", "model", timeout=120)
+
         # Connect to Qdrant if not already connected
-        if not hasattr(qdrant_conn, 'client') or qdrant_conn.client is None:
+        if qdrant_conn.client is None and qdrant_conn.local_index is None:
             status, message = qdrant_conn.connect()
             if not status:
                 st.error(f"Failed to connect to Qdrant: {message}")
@@ -97,33 +165,105 @@ if submit_button:
                     st.error("Failed to load embedding model")
                     st.stop()
         
-        # Perform the search
-        with st.spinner("Searching for books..."):
-            results = qdrant_conn.search_similar_books(
-                query_text=query,
-                limit=num_results
-            )
-            
-            formatted_results = qdrant_conn.format_results(results)
-            
-            if formatted_results:
-                st.success(f"Found {len(formatted_results)} books that match your query")
-                
-                # Display results in cards
-                for result in formatted_results:
-                    with st.container():
-                        col1, col2 = st.columns([1, 4])
-                        with col1:
-                            st.metric("Score", f"{result['score']:.2f}")
-                        with col2:
-                            st.markdown(f"### {result['title']}")
-                            st.markdown(f"{result['summary']}")
-                        st.divider()
-            else:
-                st.warning("No matching books found. Try a different search.")
+        # Stream the search: each card is drawn as soon as its hit arrives. Their metadata is then
+        # looked up with one batched query (only if Postgres is already up) and filled in
+        status_area = st.empty()
+        status_area.info("Searching for books...")
+        enrich = backends.postgres.get_books_metadata if backends.is_ready("postgres") else None
+        cards = []
+        for result in qdrant_conn.stream_similar_books(query_text=query, limit=num_results):
+            placeholder = st.empty()
+            render_card(placeholder, result)
+            cards.append((placeholder, result))
+
+        if cards:
+            status_area.success(f"Found {len(cards)} books that match your query")
+        else:
+            status_area.warning("No matching books found. Try a different search.")
+
+        work_ids = [result["work_id"] for _, result in cards if result["work_id"] is not None]
+        if enrich and work_ids:
+            try:
+                rows = enrichment_pool.submit(enrich, work_ids).result(timeout=ENRICHMENT_TIMEOUT)
+            except FutureTimeoutError:
+                log_to_debug(f"Metadata lookup did not finish within {ENRICHMENT_TIMEOUT}s", "warning")
+                rows = []
+            except Exception as e:
+                log_to_debug(f"Metadata lookup failed: {e}", "warning")
+                rows = []
+            metadata = {}
+            for row in rows:
+                metadata.setdefault(str(row["work_id"]), row)
+            for placeholder, result in cards:
+                if str(result["work_id"]) in metadata:
+                    render_card(placeholder, result, metadata[str(result["work_id"])])
+
+# Personalized recommendations section
+st.header("Personalized Recommendations")
+st.write("Combine books you have rated with an optional description; "
+         "ratings go to collaborative filtering and the description to the vector search")
+
+with st.form("hybrid_form"):
+    rated_text = st.text_area("Books you have rated (one per line: work_id, rating from 1 to 5)",
+                              placeholder="5333265, 5\n1333909, 3")
+    user_id = st.text_input("Or an existing user ID (optional)")
+    hybrid_query = st.text_input("Describe what you are in the mood for (optional)")
+    hybrid_results = st.slider("Number of recommendations:", min_value=1, max_value=20, value=5)
+    hybrid_button = st.form_submit_button("Recommend Books")
+
+if hybrid_button:
+    rated_books_data, invalid = parse_ratings(rated_text)
+    if invalid:
+        st.warning("Ignoring lines that are not 'work_id, rating': " + "; ".join(invalid))
+    if not rated_books_data and not user_id.strip() and not hybrid_query:
+        st.warning("Please enter some ratings, a user ID or a description")
+    else:
+        # Only wait for the backends this request uses; the rest are reported as degraded
+        steps = ["postgres"]
+        if rated_books_data or user_id.strip():
+            steps.append("neo4j")
+        if hybrid_query:
+            steps += ["qdrant", "model"]
+        if not backends.is_ready(*steps):
+            with st.spinner("Warming up the recommendation backends..."):
+                backends.wait_for(*steps, timeout=120)
+
+        hybrid = backends.hybrid
+        hybrid.log = log_to_debug
+        with st.spinner("Finding recommendations..."):
+            response = hybrid.recommend(query_text=hybrid_query or None, rated_books_data=rated_books_data or None,
+                                        user_id=user_id.strip() or None, limit=hybrid_results)
+        if response["degraded"]:
+            st.warning("Partial results: " + ", ".join(response["degraded"]) + " did not answer in time or failed")
+        if response["results"]:
+            st.success(f"Found {len(response['results'])} recommendations in {response['timings']['total']:.2f}s")
+        else:
+            st.warning("No recommendations found. Try rating more books or adding a description.")
+        for entry in response["results"]:
+            render_card(st.empty(), {
+                "score": entry["score"],
+                "title": entry["title"] or f"Book {entry['work_id']}",
+                "summary": entry["summary"] or f"Recommended by: {', '.join(entry['sources'])}"
+            }, entry["metadata"])
 
 # Debug messages expander
 with st.expander("Debug Messages", expanded=False):
+    cache_stats = qdrant_conn.embedding_cache.stats()
+    st.caption(
+        f"Query embedding cache: {cache_stats['hits']} hits, {cache_stats['disk_hits']} disk hits, "
+        f"{cache_stats['misses']} misses (hit rate {cache_stats['hit_rate']:.0%}), "
+        f"{cache_stats['memory_entries']} cached queries"
+    )
+    st.text(backends.startup_report())
+    metrics = METRICS.snapshot()
+    if metrics["operations"]:
+        st.caption("Connector operations (latency percentiles over the most recent calls)")
+        st.dataframe([{"operation": name, **stats} for name, stats in metrics["operations"].items()])
+    if metrics["caches"]:
+        st.caption("Caches")
+        st.dataframe([{"cache": name, **stats} for name, stats in metrics["caches"].items()])
+    st.download_button("Download metrics (JSON)", json.dumps(metrics, default=str),
+                       file_name="metrics.json", mime="application/json")
     if not st.session_state.debug_messages:
         st.write("No debug messages yet. Click the test buttons above to see connection debug messages.")
     else:
@@ -131,9 +271,9 @@ with st.expander("Debug Messages", expanded=False):
         for msg in reversed(st.session_state.debug_messages):
             if msg["level"] == "error":
                 st.error(msg["message"])
-            elif level == "warning":
+            elif msg["level"] == "warning":
                 st.warning(msg["message"])
-            elif level == "success":
+            elif msg["level"] == "success":
                 st.success(msg["message"])
             else:
                 st.info(msg["message"])
\ No newline at end of file
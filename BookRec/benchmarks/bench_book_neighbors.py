@@ -0,0 +1,160 @@
+"""
+Book-id searches served from the precomputed neighbour table (database.book_neighbors) versus
+the live retrieve + search, plus the table's build and incremental refresh times.
+
+    python benchmarks/bench_book_neighbors.py
+    python benchmarks/bench_book_neighbors.py --sizes 10000 40000 --rtt-ms 20
+
+For every collection size the script:
+  - builds the table from random 384-d vectors with 1 worker and with all cores
+  - checks every book's table entry against an exact brute-force search (recall@10; float16
+    scores can swap near-ties)
+  - times search_similar_books(book_id=...) on an in-memory Qdrant whose calls sleep --rtt-ms
+    first, standing in for the network round trip to the service: the live path needs
+    retrieve(with_vectors) + search, the table path a single payload retrieve
+  - upserts --changed books (new vectors and as many new points), then compares refresh() with
+    a full rebuild: time, and whether the (possibly shorter) refreshed lists match the rebuild
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+from common import latency_stats, print_row
+from database.book_neighbors import BookNeighborTable
+from database.qdrant_connector import QdrantConnector
+
+
+class RemoteClient:
+    """In-memory Qdrant client whose retrieve and search calls pay a simulated round trip"""
+
+    def __init__(self, client, rtt_ms):
+        self.client = client
+        self.rtt = rtt_ms / 1000.0
+        self.calls = 0
+
+    def retrieve(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.rtt)
+        return self.client.retrieve(**kwargs)
+
+    def search(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.rtt)
+        return self.client.search(**kwargs)
+
+
+def seed(client, ids, vectors, batch_size=1000):
+    client.recreate_collection("books", vectors_config=models.VectorParams(size=vectors.shape[1],
+                                                                           distance=models.Distance.COSINE))
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        client.upsert("books", points=models.Batch(
+            ids=batch.tolist(),
+            vectors=vectors[start:start + batch_size].tolist(),
+            payloads=[{"title": f"Book {i}", "summary": "A synthetic summary.", "work_id": 1000 + int(i)} for i in batch]
+        ))
+
+
+def exact_recall(table, ids, vectors, k=10, block=2048):
+    """Mean share of each book's exact top-k neighbours that its table entry contains"""
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    recall = []
+    for lo in range(0, len(ids), block):
+        sims = normalized[lo:lo + block] @ normalized.T
+        sims[np.arange(len(sims)), np.arange(lo, lo + len(sims))] = -np.inf
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        for row, expected in zip(range(lo, lo + len(sims)), ids[top]):
+            found = table.neighbors[table.row(ids[row])][:k]
+            recall.append(len(set(expected) & set(found)) / k)
+    return float(np.mean(recall))
+
+
+def time_searches(connector, book_ids, limit):
+    durations = []
+    for book_id in book_ids:
+        start = time.perf_counter()
+        connector.search_similar_books(book_id=int(book_id), limit=limit)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 40_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=5.0, help="simulated round trip per Qdrant call")
+    parser.add_argument("--changed", type=float, default=0.01, help="share of books upserted before the refresh")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{os.cpu_count()} cores, K={args.k}, {args.rtt_ms:.0f}ms simulated round trip")
+    for n in args.sizes:
+        print(f"\n== {n} books")
+        ids = np.arange(n, dtype=np.int64)
+        vectors = rng.normal(size=(n, args.dim)).astype(np.float32)
+
+        for workers in sorted({1, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            table = BookNeighborTable.build(ids, vectors, k=args.k, workers=workers, log=lambda _: None)
+            print(f"{f'build, {workers} worker(s)':<40} "
+                  f"{time.perf_counter() - start:.2f}s "
+                  f"({(table.neighbors.nbytes + table.scores.nbytes) / 2 ** 20:.1f} MB of neighbours)")
+        print(f"{'':<40} recall@10 against exact search: {exact_recall(table, ids, vectors):.4f}")
+
+        client = RemoteClient(QdrantClient(":memory:"), args.rtt_ms)
+        seed(client.client, ids, vectors)
+        connector = QdrantConnector()
+        connector.log = lambda message, level="info": None
+        connector.client, connector.model, connector.neighbor_table_path = client, object(), None
+        book_ids = rng.integers(0, n, args.queries)
+
+        client.calls = 0
+        live = time_searches(connector, book_ids, args.limit)
+        print_row("live retrieve + search", latency_stats(live), f"qdrant calls/search={client.calls / len(book_ids):.1f}")
+        live_results = [connector.search_similar_books(book_id=int(b), limit=args.limit) for b in book_ids[:20]]
+
+        connector.neighbor_table = table
+        client.calls = 0
+        served = time_searches(connector, book_ids, args.limit)
+        print_row("neighbour table", latency_stats(served), f"qdrant calls/search={client.calls / len(book_ids):.1f}")
+        table_results = [connector.search_similar_books(book_id=int(b), limit=args.limit) for b in book_ids[:20]]
+        same = np.mean([len({p.id for p in a} & {p.id for p in b}) / args.limit
+                        for a, b in zip(live_results, table_results)])
+        print(f"{'':<40} result overlap with the live search: {same:.3f}")
+
+        start = time.perf_counter()
+        for book_id in book_ids:
+            table.lookup(book_id, limit=args.limit)
+        print(f"{'table lookup alone':<40} {(time.perf_counter() - start) / len(book_ids) * 1e6:.1f}us per lookup")
+
+        # Upsert: a share of the books get new vectors and as many new books are added
+        n_changed = max(1, int(n * args.changed))
+        changed = rng.choice(n, n_changed, replace=False)
+        new_vectors = vectors.copy()
+        new_vectors[changed] = rng.normal(size=(n_changed, args.dim))
+        new_ids = np.concatenate([ids, np.arange(n, n + n_changed)])
+        new_vectors = np.vstack([new_vectors, rng.normal(size=(n_changed, args.dim)).astype(np.float32)])
+
+        start = time.perf_counter()
+        refreshed, stats = table.refresh(new_ids, new_vectors, log=lambda _: None)
+        refresh_time = time.perf_counter() - start
+        start = time.perf_counter()
+        rebuilt = BookNeighborTable.build(new_ids, new_vectors, k=args.k, log=lambda _: None)
+        rebuild_time = time.perf_counter() - start
+        depth = (refreshed.neighbors >= 0).sum(axis=1)
+        # Refreshed lists may be shorter; the part they keep must score like the rebuild
+        # (compared by score, since float16 near-ties can come out in either order)
+        exact = np.mean([np.array_equal(refreshed.scores[i, :d], rebuilt.scores[i, :d]) for i, d in enumerate(depth)])
+        print(f"{'refresh after upserting ' + str(2 * n_changed) + ' books':<40} {refresh_time:.2f}s "
+              f"({stats['rescored']} rows rescored, {stats['merged']} merged) vs full rebuild {rebuild_time:.2f}s")
+        print(f"{'':<40} rows matching the rebuild: {exact:.4f}, mean list length {depth.mean():.1f} of {args.k}")
+
+
+if __name__ == "__main__":
+    main()
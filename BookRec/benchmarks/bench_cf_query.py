@@ -0,0 +1,239 @@
+"""
+Compare the original collaborative-filtering Cypher with the parameterized CF_QUERY for target
+users with 10, 100 and 1000 ratings.
+
+    python benchmarks/bench_cf_query.py            # Python transcriptions of both plans, no database
+    python benchmarks/bench_cf_query.py --neo4j    # seed Neo4j (NEO4J_* env), time and PROFILE both queries
+
+The original query looks up the target's rating of every co-rated book with a scan of the
+targetRatings list, and checks every candidate against a list of the target's work_ids, so its
+work grows with (rows x history). CF_QUERY reads the target's rating from the matched
+relationship and checks candidates with a pattern lookup. Without a database the script counts
+the rows and list comparisons each plan does and times the new plan in Python; with --neo4j it
+reports latency and total db hits from PROFILE.
+
+The run fails (exit status 1) unless, in both modes:
+  - CF_QUERY with pruning disabled returns the same scores as the original query
+  - CF_QUERY with the pruning settings (--min-similarity / --max-neighbors, defaulting to the
+    connector's CF_MIN_SIMILARITY / CF_MAX_NEIGHBORS) keeps at least --min-overlap of the exact
+    top-10. cf_score averages over every neighbour that rated a book, so a neighbour cap drops
+    the books only a few neighbours rated and changes the top results
+
+WARNING: --neo4j deletes everything in the target database before seeding it.
+"""
+import argparse
+import os
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from bench_collaborative_engine import reference_recommendations, same_scores
+from common import latency_stats, print_row, seed_neo4j, synthetic_interactions
+
+HISTORY_SIZES = [10, 100, 1000]
+
+# CF_QUERY before it was parameterized, kept here as the baseline
+LEGACY_CF_QUERY = """
+MATCH (target:User {user_id: $user_id})-[r:INTERACTED]->(b:Book)
+WITH target, collect({work_id: b.work_id, rating: r.rating}) AS targetRatings
+MATCH (target)-[:INTERACTED]->(b:Book)<-[r1:INTERACTED]-(other:User)
+WHERE other.user_id <> target.user_id
+WITH target, targetRatings, other, b.work_id AS commonBook, r1.rating AS otherRating,
+        head([t IN targetRatings WHERE t.work_id = b.work_id]) AS targetRating
+WITH target, targetRatings, other, (1 - abs(targetRating.rating - otherRating)/4.0) AS simScore
+WITH target, targetRatings, other, collect(simScore) AS simScores, count(*) AS commonCount
+WHERE commonCount >= 2
+WITH target, targetRatings, other, reduce(s = 0.0, x IN simScores | s + x) / size(simScores) AS user_similarity
+MATCH (other)-[r2:INTERACTED]->(rec:Book)
+WHERE NOT rec.work_id IN [t IN targetRatings | t.work_id]
+WITH rec, user_similarity, r2.rating AS candidateRating
+WITH rec, sum(user_similarity * candidateRating) AS weightedSum, count(candidateRating) AS ratingCount
+RETURN rec.work_id AS work_id, rec.title AS title, weightedSum / ratingCount AS cf_score
+ORDER BY cf_score DESC
+LIMIT 10
+"""
+
+
+def target_profiles(n_books, rng):
+    """Profiles of HISTORY_SIZES ratings, drawn with the same popularity skew as the synthetic graph"""
+    popularity = 1.0 / np.arange(1, n_books + 1) ** 0.8
+    popularity /= popularity.sum()
+    profiles = {}
+    for size in HISTORY_SIZES:
+        books = rng.choice(n_books, size=size, replace=False, p=popularity) + 1000
+        profiles[size] = {str(w): {"rating": float(rng.integers(1, 6))} for w in books}
+    return profiles
+
+
+def legacy_work(by_book, by_user, profile, min_common_books=2):
+    """
+    Rows and list comparisons of the original query: head() stops at the matching entry of
+    targetRatings, NOT IN scans the whole list for books the target has not rated.
+    """
+    position = {work_id: i + 1 for i, work_id in enumerate(profile)}
+    common = defaultdict(int)
+    rows = comparisons = 0
+    for work_id in profile:
+        for user, _ in by_book.get(work_id, ()):
+            rows += 1
+            comparisons += position[work_id]
+            common[user] += 1
+    for user, count in common.items():
+        if count >= min_common_books:
+            for work_id in by_user[user]:
+                rows += 1
+                comparisons += position.get(work_id, len(profile))
+    return rows, comparisons
+
+
+def cf_query(by_book, by_user, profile, min_common_books=2, min_similarity=0.0, max_neighbors=None,
+             min_rating=None, limit=10):
+    """Python transcription of CF_QUERY; returns (recommendations, neighbours expanded, candidate rows)"""
+    target = {str(w): d["rating"] for w, d in profile.items()}
+    sims = defaultdict(list)
+    for work_id, rating in target.items():
+        for user, other_rating in by_book.get(work_id, ()):
+            sims[user].append(1 - abs(rating - other_rating) / 4.0)
+
+    neighbors = [(sum(s) / len(s), len(s), user) for user, s in sims.items()
+                 if len(s) >= min_common_books and sum(s) / len(s) >= min_similarity]
+    neighbors.sort(key=lambda n: (-n[1], -n[0], n[2]))
+    kept = neighbors[:max_neighbors] if max_neighbors else neighbors
+
+    weighted, counts = defaultdict(float), defaultdict(int)
+    candidate_rows = 0
+    for similarity, _, user in kept:
+        for work_id, rating in by_user[user].items():
+            candidate_rows += 1
+            if (min_rating is None or rating >= min_rating) and work_id not in target:
+                weighted[work_id] += similarity * rating
+                counts[work_id] += 1
+    scores = sorted(((weighted[w] / counts[w], w) for w in counts), reverse=True)
+    return [{"work_id": w, "cf_score": s} for s, w in scores[:limit]], len(kept), candidate_rows
+
+
+def compare_pruned(exact, pruned):
+    """
+    Top-N overlap of the pruned result with the exact one, and a line reporting it next to both
+    mean scores. cf_score averages over the neighbours that rated a book, so dropping neighbours
+    changes the scores too.
+    """
+    exact_ids = {row["work_id"] for row in exact}
+    overlap = len(exact_ids & {row["work_id"] for row in pruned}) / max(1, len(exact_ids))
+    mean_score = lambda rows: float(np.mean([row["cf_score"] for row in rows])) if rows else 0.0
+    return overlap, f"overlap={overlap:.2f} mean cf_score {mean_score(pruned):.3f} vs exact {mean_score(exact):.3f}"
+
+
+def overlap_ok(overlap, args):
+    if overlap >= args.min_overlap:
+        return True
+    print(f"{'':<40} OVERLAP BELOW --min-overlap {args.min_overlap:.2f}")
+    return False
+
+
+def run_offline(user_ids, work_ids, ratings, profiles, args):
+    by_book, by_user = defaultdict(list), defaultdict(dict)
+    for u, w, r in zip(user_ids, work_ids.astype(str), ratings.tolist()):
+        by_book[w].append((u, r))
+        by_user[u][w] = r
+    edges = {(u, w): r for u, rated in by_user.items() for w, r in rated.items()}
+
+    ok = True
+    for size, profile in profiles.items():
+        print(f"\n-- target with {size} ratings")
+        rows, comparisons = legacy_work(by_book, by_user, profile)
+        print(f"{'original query':<40} rows={rows:<9} list comparisons={comparisons}")
+
+        for label, pruning in (("CF_QUERY exact", {}),
+                               ("CF_QUERY pruned", {"min_similarity": args.min_similarity,
+                                                    "max_neighbors": args.max_neighbors})):
+            durations = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                result, neighbors, candidate_rows = cf_query(by_book, by_user, profile, **pruning)
+                durations.append(time.perf_counter() - start)
+            print_row(label, latency_stats(durations),
+                      f"neighbours expanded={neighbors} candidate rows={candidate_rows}")
+            if pruning:
+                overlap, line = compare_pruned(exact, result)
+                print(f"{'':<40} {line}")
+                ok &= overlap_ok(overlap, args)
+            else:
+                exact = result
+                same = same_scores(reference_recommendations(edges, profile), result)
+                ok &= same
+                print(f"{'':<40} {'matches the original query' if same else 'MISMATCH with the original query'}")
+    return ok
+
+
+def profile_db_hits(connector, query, params):
+    """Total db hits of one PROFILE run"""
+    with connector.session() as session:
+        summary = session.run("PROFILE " + query, params).consume()
+
+    def hits(plan):
+        return plan.get("dbHits", 0) + sum(hits(child) for child in plan.get("children", []))
+    return hits(summary.profile)
+
+
+def run_neo4j(user_ids, work_ids, ratings, profiles, args):
+    from database.neo4j_connector import CF_QUERY, Neo4jConnector
+    connector = Neo4jConnector()
+    if not connector.connect():
+        return False
+    seed_neo4j(connector, user_ids, work_ids, ratings)
+    for size, profile in profiles.items():
+        connector.insert_user_ratings(f"target_{size}", profile)
+
+    ok = True
+    for size in profiles:
+        user_id = f"target_{size}"
+        print(f"\n-- target with {size} ratings")
+        exact = connector._cf_params(None, 2, 10, 0.0, 0)
+        pruned = connector._cf_params(None, 2, 10, args.min_similarity, args.max_neighbors)
+        results = {}
+        for label, query, params in (("original query", LEGACY_CF_QUERY, {"user_id": user_id}),
+                                     ("CF_QUERY exact", CF_QUERY, {**exact, "user_id": user_id}),
+                                     ("CF_QUERY pruned", CF_QUERY, {**pruned, "user_id": user_id})):
+            connector.execute_query(query, params)  # plan and warm the page cache
+            durations = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                results[label] = connector.execute_query(query, params)
+                durations.append(time.perf_counter() - start)
+            print_row(label, latency_stats(durations), f"db_hits={profile_db_hits(connector, query, params)}")
+        same = same_scores(results["original query"], results["CF_QUERY exact"])
+        ok &= same
+        print(f"{'':<40} exact {'matches the original query' if same else 'MISMATCH with the original query'}")
+        overlap, line = compare_pruned(results["CF_QUERY exact"], results["CF_QUERY pruned"])
+        print(f"{'':<40} pruned: {line}")
+        ok &= overlap_ok(overlap, args)
+    connector.close()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--neo4j", action="store_true", help="Seed Neo4j and time the Cypher queries")
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--books", type=int, default=5_000)
+    parser.add_argument("--ratings-per-user", type=int, default=30)
+    parser.add_argument("--min-similarity", type=float, default=float(os.getenv("CF_MIN_SIMILARITY", "0.0")))
+    parser.add_argument("--max-neighbors", type=int, default=int(os.getenv("CF_MAX_NEIGHBORS") or 0),
+                        help="0 = no cap")
+    parser.add_argument("--min-overlap", type=float, default=0.9,
+                        help="smallest share of the exact top-10 the pruned query must keep")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    user_ids, work_ids, ratings = synthetic_interactions(args.users, args.books, args.ratings_per_user)
+    profiles = target_profiles(args.books, np.random.default_rng(4))
+    print(f"{args.users} users, {args.books} books, {len(ratings)} interactions; pruning keeps neighbours with "
+          f"similarity >= {args.min_similarity}, at most {args.max_neighbors or 'all'}")
+    ok = (run_neo4j if args.neo4j else run_offline)(user_ids, work_ids, ratings, profiles, args)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
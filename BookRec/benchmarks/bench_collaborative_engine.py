@@ -0,0 +1,116 @@
+"""
+Parity check and latency benchmark for the in-process CollaborativeEngine.
+
+    python benchmarks/bench_collaborative_engine.py            # parity against a Python transcription of the Cypher
+    python benchmarks/bench_collaborative_engine.py --neo4j    # parity against the live Cypher query (NEO4J_* env)
+
+The run exits with status 1 when any profile's scores differ from the reference.
+
+WARNING: --neo4j deletes everything in the target database before seeding it.
+"""
+import argparse
+import math
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from common import latency_stats, print_row, seed_neo4j, synthetic_interactions, time_calls
+from database.collaborative_engine import CollaborativeEngine
+
+SIZES = [(2_000, 1_000), (20_000, 10_000), (100_000, 40_000)]
+
+
+def reference_recommendations(edges, profile, min_common_books=2, limit=10):
+    """Straight transcription of the get_collaborative_recommendations Cypher, one row at a time"""
+    target = {str(w): d["rating"] for w, d in profile.items()}
+    sims = defaultdict(list)
+    for (user, work_id), rating in edges.items():
+        if work_id in target:
+            sims[user].append(1 - abs(target[work_id] - rating) / 4.0)
+
+    weighted, counts = defaultdict(float), defaultdict(int)
+    similar = {u: sum(s) / len(s) for u, s in sims.items() if len(s) >= min_common_books}
+    for (user, work_id), rating in edges.items():
+        if user in similar and work_id not in target:
+            weighted[work_id] += similar[user] * rating
+            counts[work_id] += 1
+    scores = sorted(((weighted[w] / counts[w], w) for w in counts), reverse=True)
+    return [{"work_id": w, "cf_score": s} for s, w in scores[:limit]]
+
+
+def same_scores(expected, actual):
+    """Compare top-N score lists; ties may be broken differently so only the scores are compared"""
+    return len(expected) == len(actual) and all(
+        math.isclose(e["cf_score"], a["cf_score"], rel_tol=1e-5) for e, a in zip(expected, actual)
+    )
+
+
+def sample_profiles(user_ids, work_ids, ratings, n_samples, rng):
+    users = rng.choice(np.unique(user_ids), size=n_samples, replace=False)
+    return [
+        {str(w): {"rating": float(r)} for w, r in zip(work_ids[user_ids == u], ratings[user_ids == u])}
+        for u in users
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--neo4j", action="store_true", help="Check parity against the live Cypher query")
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(2)
+
+    # Parity on a small synthetic graph
+    user_ids, work_ids, ratings = synthetic_interactions(500, 200, seed=3)
+    engine = CollaborativeEngine(user_ids, work_ids, ratings)
+    # Drop part of each sampled user's history so profiles are not copies of existing users
+    profiles = [{w: d for w, d in p.items() if int(w) % 3}
+                for p in sample_profiles(user_ids, work_ids, ratings, args.samples, rng)]
+
+    if args.neo4j:
+        from database.neo4j_connector import Neo4jConnector
+        connector = Neo4jConnector()
+        if not connector.connect():
+            raise SystemExit(1)
+        seed_neo4j(connector, user_ids, work_ids, ratings)
+
+        def expected_for(profile):
+            connector.insert_user_ratings("temp_user", profile)
+            rows = connector.get_collaborative_recommendations("temp_user", min_similarity=0.0, max_neighbors=0)
+            connector.clear_temp_user("temp_user")
+            return rows
+    else:
+        edges = {(u, str(w)): float(r) for u, w, r in zip(user_ids, work_ids, ratings)}
+
+        def expected_for(profile):
+            return reference_recommendations(edges, profile)
+
+    mismatches = sum(not same_scores(expected_for(p), engine.recommend(p)) for p in profiles)
+    print(f"parity: {len(profiles) - mismatches}/{len(profiles)} profiles match"
+          f"{'' if not mismatches else ' - MISMATCH with the Cypher scoring'}")
+
+    # Latency at several graph sizes
+    for n_users, n_books in SIZES:
+        user_ids, work_ids, ratings = synthetic_interactions(n_users, n_books)
+        start = time.perf_counter()
+        engine = CollaborativeEngine(user_ids, work_ids, ratings)
+        print(f"\n== {n_users} users, {n_books} books, {len(ratings)} interactions "
+              f"(load {time.perf_counter() - start:.2f}s)")
+
+        profiles = sample_profiles(user_ids, work_ids, ratings, args.samples, rng)
+        print_row("recommend (single profile)", latency_stats(time_calls(engine.recommend, [(p,) for p in profiles])))
+
+        batch = list(np.unique(user_ids)[:1000])
+        start = time.perf_counter()
+        engine.recommend_for_users(batch)
+        elapsed = time.perf_counter() - start
+        print(f"recommend_for_users: {len(batch)} users in {elapsed:.2f}s ({len(batch) / elapsed:.0f} users/s)")
+
+    # A parity regression fails the run (after the latency report)
+    raise SystemExit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
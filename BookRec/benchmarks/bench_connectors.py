@@ -0,0 +1,261 @@
+"""
+Throughput and p50/p95/p99 latency of every public connector method at several data scales,
+followed by the breakdown the shared instrumentation (database.metrics) recorded meanwhile.
+
+    python benchmarks/bench_connectors.py                           # Qdrant in memory + Postgres if reachable
+    python benchmarks/bench_connectors.py --scales small medium --neo4j --json results.json
+
+Stand-ins for the backends:
+  - Qdrant: in-memory QdrantClient / AsyncQdrantClient (":memory:") seeded with random 384-d
+    vectors; a stub model that hashes the query text replaces the embedding model, so text
+    searches measure the search path and the query cache, not the model
+  - Postgres: the server from the POSTGRES_* settings; every scale is loaded into its own scratch
+    database (bench_connectors_<scale>) with the COPY ingest and the post-load indexes
+  - Neo4j (--neo4j only): the server from the NEO4J_* settings, reseeded with seed_neo4j at
+    every scale. WARNING: this deletes everything in the target database
+
+Throwaway servers for both, on ports that do not clash with the app's:
+
+    docker compose -f benchmarks/docker-compose.yml up -d
+    POSTGRES_HOST=localhost POSTGRES_PORT=15432 POSTGRES_PASSWORD=bench \\
+    NEO4J_URI=bolt://localhost:17687 NEO4J_USER=neo4j NEO4J_PASSWORD=benchpassword \\
+    python benchmarks/bench_connectors.py --neo4j
+
+Calls run one at a time, so throughput is calls per second of a single client. Request
+parameters (query texts, work_ids, users) come from Zipf distributions with a fixed seed, so the
+caches see the same repeat rate in every run.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from bench_postgres_metadata import prepare_database, write_csvs
+from bench_qdrant_transports import seed, seed_async
+from common import APP_DIR, latency_stats, print_row, seed_neo4j, synthetic_interactions
+from database.metrics import METRICS
+from database.qdrant_connector import QdrantConnector
+
+# name -> (users, books); the Qdrant collection and the Postgres books table have one row per book
+SCALES = {
+    "small": (2_000, 1_000),
+    "medium": (20_000, 10_000),
+    "large": (100_000, 40_000)
+}
+
+
+class StubModel:
+    """Deterministic stand-in for the sentence-transformer: a unit vector seeded by the text's hash"""
+
+    def encode(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).normal(size=384).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+def zipf_choice(rng, values, n, a=1.3):
+    """n draws from values, the first ones most often"""
+    return [values[(i - 1) % len(values)] for i in rng.zipf(a, n)]
+
+
+class Suite:
+    """Times calls and keeps one result row per method for the report and --json"""
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.results = []
+
+    def measure(self, backend, label, fn, args_list):
+        durations = []
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            durations.append(time.perf_counter() - start)
+        self.record(backend, label, durations)
+
+    def record(self, backend, label, durations):
+        stats = latency_stats(durations)
+        stats["throughput"] = len(durations) / sum(durations) if sum(durations) else float("inf")
+        print_row(f"{backend}.{label}", stats, f"{stats['throughput']:9.1f} ops/s")
+        self.results.append({"scale": self.scale, "backend": backend, "method": label, **stats})
+
+
+def run_qdrant(suite, n_books, args, rng):
+    client = QdrantClient(":memory:")
+    seed(client, n_books)
+    connector = QdrantConnector()
+    connector.log = lambda message, level="info": None
+    connector.client, connector.model, connector.encoder = client, StubModel(), None
+
+    queries = zipf_choice(rng, [f"graphic novel about topic {i}" for i in range(args.calls)], args.calls)
+    book_ids = [int(i) for i in zipf_choice(rng, rng.permutation(n_books), args.calls)]
+    results = connector.search_similar_books(book_id=book_ids[0], limit=args.limit)
+
+    suite.measure("qdrant", "encode_query", connector.encode_query, [(q,) for q in queries])
+    connector.embedding_cache.clear()
+    suite.measure("qdrant", "search_similar_books(text)",
+                  lambda q: connector.search_similar_books(query_text=q, limit=args.limit), [(q,) for q in queries])
+    suite.measure("qdrant", "search_similar_books(book_id)",
+                  lambda b: connector.search_similar_books(book_id=b, limit=args.limit), [(b,) for b in book_ids])
+    suite.measure("qdrant", "search_similar_books(filters)",
+                  lambda b: connector.search_similar_books(book_id=b, limit=args.limit, filters={"max_pages": 300}),
+                  [(b,) for b in book_ids])
+    suite.measure("qdrant", "stream_similar_books",
+                  lambda q: list(connector.stream_similar_books(query_text=q, limit=args.limit)),
+                  [(q,) for q in queries])
+    suite.measure("qdrant", "get_book_by_id", connector.get_book_by_id, [(b,) for b in book_ids])
+    suite.measure("qdrant", "format_results", connector.format_results, [(results,)] * args.calls)
+
+    async def run_async():
+        # Async clients are created inside the event loop that uses them
+        connector.async_client = AsyncQdrantClient(":memory:")
+        await seed_async(connector.async_client, n_books)
+        for label, call in (("get_book_by_id_async", lambda b: connector.get_book_by_id_async(b)),
+                            ("search_similar_books_async",
+                             lambda b: connector.search_similar_books_async(book_id=b, limit=args.limit))):
+            durations = []
+            for book_id in book_ids:
+                start = time.perf_counter()
+                await call(book_id)
+                durations.append(time.perf_counter() - start)
+            suite.record("qdrant", label, durations)
+
+    asyncio.run(run_async())
+
+
+def run_postgres(suite, n_books, args, rng):
+    from database.postgres_connector import PostgresConnector
+    from database.postgres_ingest import analyze, create_indexes
+
+    database = f"bench_connectors_{suite.scale}"
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            books_path, authors_path = write_csvs(tmp, n_books, max(1, n_books // 5))
+            conn = prepare_database(database, books_path, authors_path, args.schema)
+        with conn:
+            create_indexes(conn, log=lambda message: None)
+            analyze(conn)
+        conn.close()
+    except Exception as e:
+        print(f"postgres: skipped ({e})")
+        return
+
+    connector = PostgresConnector()
+    connector.database = database
+    if not connector.connect():
+        return
+    work_ids = zipf_choice(rng, (rng.permutation(n_books) + 1001).tolist(), args.calls * args.page_size)
+    pages = [(work_ids[i:i + args.page_size],) for i in range(0, len(work_ids), args.page_size)]
+
+    suite.measure("postgres", "get_books_metadata", connector.get_books_metadata, pages)
+    suite.measure("postgres", "get_books_metadata(filters)",
+                  lambda ids: connector.get_books_metadata(ids, {"max_pages": 300, "min_average_rating": 3.5}), pages)
+    suite.measure("postgres", "get_filter_metadata", connector.get_filter_metadata, pages)
+    scans = [()] * args.scan_calls
+    suite.measure("postgres", "iter_description_batches", lambda: sum(1 for _ in connector.iter_description_batches()),
+                  scans)
+    suite.measure("postgres", "get_description_mapping", connector.get_description_mapping, scans)
+    suite.measure("postgres", "get_compact_description_mapping", connector.get_compact_description_mapping, scans)
+    connector.close()
+
+
+def run_neo4j(suite, n_users, n_books, args, rng):
+    from database.neo4j_connector import Neo4jConnector
+    from database.similarity_index import ItemSimilarityIndex
+
+    connector = Neo4jConnector()
+    if not connector.connect():
+        return
+    try:
+        connector.driver.verify_connectivity()
+    except Exception as e:
+        print(f"neo4j: skipped ({e})")
+        return
+
+    user_ids, work_ids, ratings = synthetic_interactions(n_users, n_books)
+    seed_neo4j(connector, user_ids, work_ids, ratings)
+    connector.similarity_index = ItemSimilarityIndex.build(user_ids, work_ids, ratings, log=lambda _: None)
+
+    users = zipf_choice(rng, np.unique(user_ids).tolist(), args.calls)
+    books = [str(w) for w in np.unique(work_ids)]
+    profiles = [{books[i]: {"rating": float(rng.integers(1, 6))} for i in rng.choice(len(books), 10, replace=False)}
+                for _ in range(args.calls)]
+
+    suite.measure("neo4j", "execute_query", connector.execute_query,
+                  [("MATCH (u:User {user_id: $user_id})-[r:INTERACTED]->(b:Book) RETURN b.work_id AS work_id",
+                    {"user_id": u}) for u in users])
+    suite.measure("neo4j", "get_collaborative_recommendations(refresh)",
+                  lambda u: connector.get_collaborative_recommendations(u, refresh=True), [(u,) for u in users])
+    suite.measure("neo4j", "get_collaborative_recommendations",
+                  connector.get_collaborative_recommendations, [(u,) for u in users])
+    for mode in ("parameter", "rollback"):
+        connector.recommendation_cache.memory.clear()
+        suite.measure("neo4j", f"get_ephemeral_recommendations({mode})",
+                      lambda p: connector.get_ephemeral_recommendations(p, mode=mode), [(p,) for p in profiles])
+    suite.measure("neo4j", "get_item_based_recommendations",
+                  connector.get_item_based_recommendations, [(p,) for p in profiles])
+    suite.measure("neo4j", "get_all_book_titles", connector.get_all_book_titles, [()] * args.scan_calls)
+    suite.measure("neo4j", "get_most_active_users", connector.get_most_active_users, [()] * args.scan_calls)
+    temp_users = [(f"bench_temp_{i}", p) for i, p in enumerate(profiles)]
+    suite.measure("neo4j", "insert_user_ratings", connector.insert_user_ratings, temp_users)
+    suite.measure("neo4j", "clear_temp_user", connector.clear_temp_user, [(u,) for u, _ in temp_users])
+    connector.close()
+
+
+def print_metrics():
+    snapshot = METRICS.snapshot()
+    print("\ninstrumented operations (database.metrics):")
+    for name, stats in snapshot["operations"].items():
+        print(f"  {name:<38} count={stats['count']:<6} errors={stats['errors']:<4} items={stats['items']:<8} "
+              f"p50={stats['p50_ms']:8.3f}ms p95={stats['p95_ms']:8.3f}ms p99={stats['p99_ms']:8.3f}ms")
+    for name, stats in snapshot["caches"].items():
+        print(f"  cache {name:<32} hits={stats.get('hits')} misses={stats.get('misses')} "
+              f"hit_rate={stats.get('hit_rate', 0):.2f}")
+    return snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    parser.add_argument("--backends", nargs="+", choices=["qdrant", "postgres"], default=["qdrant", "postgres"])
+    parser.add_argument("--neo4j", action="store_true", help="Also seed and measure Neo4j (wipes the database)")
+    parser.add_argument("--calls", type=int, default=300, help="calls per method")
+    parser.add_argument("--scan-calls", type=int, default=5, help="calls of the full-table methods")
+    parser.add_argument("--page-size", type=int, default=20, help="work_ids per Postgres lookup")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--schema", default=os.path.join(APP_DIR, "..", "..", "data-processing", "postgres_schema.txt"))
+    parser.add_argument("--json", help="Write the results and metrics snapshots to this file")
+    args = parser.parse_args()
+
+    report = {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+              "args": vars(args), "results": [], "metrics": {}}
+    for scale in args.scales:
+        n_users, n_books = SCALES[scale]
+        print(f"\n== {scale}: {n_users} users, {n_books} books, {args.calls} calls per method")
+        METRICS.reset()
+        suite = Suite(scale)
+        rng = np.random.default_rng(0)
+        if "qdrant" in args.backends:
+            run_qdrant(suite, n_books, args, rng)
+        if "postgres" in args.backends:
+            run_postgres(suite, n_books, args, rng)
+        if args.neo4j:
+            run_neo4j(suite, n_users, n_books, args, rng)
+        report["results"].extend(suite.results)
+        report["metrics"][scale] = print_metrics()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Compare the cleaning notebooks with data-processing/goodreads_pipeline.py on synthetic Goodreads
+dumps: wall time, peak RSS and identical output.
+
+    python benchmarks/bench_data_pipeline.py --books 50000 --interactions 2000000
+
+Each variant runs in a fresh subprocess so peak RSS is measured cleanly:
+  - notebook-interactions: interactions_work_id.ipynb (read_json of the whole file,
+    ast.literal_eval over the book_id lists, Series.map, CSV)
+  - pipeline-interactions: chunked read, searchsorted mapping, Parquet
+  - notebook-books: the per-work get_best_row loop of goodreads_data_pipeline.ipynb
+  - pipeline-books: the vectorized aggregate_works
+Work ids per interaction and the aggregated works must match between notebook and pipeline.
+"""
+import argparse
+import gzip
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import APP_DIR
+
+sys.path.insert(0, os.path.join(APP_DIR, "..", "..", "data-processing"))
+
+VARIANTS = ["notebook-interactions", "pipeline-interactions", "notebook-books", "pipeline-books"]
+LANGUAGES = ["eng", "en-US", "fre", "", "spa"]
+
+
+def write_dumps(directory, n_books, n_interactions, seed=0):
+    """Synthetic books and interactions JSON-lines dumps with the Goodreads field formats"""
+    rng = np.random.default_rng(seed)
+    books_path = os.path.join(directory, "books.json.gz")
+    with gzip.open(books_path, "wt") as f:
+        for book_id in range(1, n_books + 1):
+            f.write(json.dumps({
+                "book_id": str(book_id),
+                "work_id": str(1_000_000 + int(rng.integers(0, max(1, n_books // 3)))),
+                "isbn": "", "isbn13": "", "asin": "", "kindle_asin": "",
+                "format": "Paperback", "publisher": "", "link": f"https://www.goodreads.com/book/show/{book_id}",
+                "title": f"Book {book_id}", "title_without_series": f"Book {book_id}",
+                "description": "" if rng.random() < 0.3 else f"Description {book_id}",
+                "publication_year": "" if rng.random() < 0.3 else str(int(rng.integers(1950, 2018))),
+                "publication_month": str(int(rng.integers(1, 13))), "publication_day": "",
+                "num_pages": "" if rng.random() < 0.3 else str(int(rng.integers(20, 800))),
+                "ratings_count": str(int(rng.integers(0, 1000))), "text_reviews_count": "3",
+                "average_rating": f"{rng.uniform(1, 5):.2f}", "is_ebook": "false",
+                "language_code": LANGUAGES[int(rng.integers(0, len(LANGUAGES)))],
+                "authors": [{"author_id": str(int(rng.integers(1, 5000))), "role": ""}],
+                "series": []
+            }) + "\n")
+
+    interactions_path = os.path.join(directory, "interactions.json.gz")
+    users = rng.integers(0, max(1, n_interactions // 50), n_interactions)
+    book_ids = rng.integers(1, n_books + 1, n_interactions)
+    ratings = rng.integers(0, 6, n_interactions)
+    date = "Tue Dec 05 10:24:37 -0800 2017"
+    with gzip.open(interactions_path, "wt") as f:
+        for i in range(n_interactions):
+            f.write(json.dumps({
+                "user_id": f"{users[i]:032x}", "book_id": str(book_ids[i]), "review_id": f"{i:032x}",
+                "is_read": bool(ratings[i]), "rating": int(ratings[i]), "review_text_incomplete": "",
+                "date_added": date, "date_updated": date, "read_at": "", "started_at": ""
+            }) + "\n")
+    return books_path, interactions_path
+
+
+def notebook_lookup_csv(books_path, out_path):
+    """work_id_book_id_dict.csv as goodreads_data_pipeline.ipynb writes it"""
+    goodreads = pd.read_json(books_path, lines=True, compression="gzip")
+    goodreads.groupby("work_id").agg({"book_id": list}).to_csv(out_path)
+
+
+def notebook_interactions(interactions_path, lookup_csv, out_path):
+    import ast
+    interactions = pd.read_json(interactions_path, lines=True, compression="gzip")
+    work_id_book_id_dict = pd.read_csv(lookup_csv)
+    work_id_book_id_dict["book_id"] = work_id_book_id_dict["book_id"].apply(
+        lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
+    book_id_to_work_id = work_id_book_id_dict.explode("book_id").sort_values("book_id")
+    interactions["work_id"] = interactions["book_id"].map(book_id_to_work_id.set_index("book_id")["work_id"])
+    interactions.drop(columns=["review_text_incomplete"], inplace=True)
+    interactions.to_csv(out_path, index=False)
+    return interactions["work_id"].to_numpy(dtype=float)
+
+
+def notebook_books(books_path):
+    """The per-work loop of goodreads_data_pipeline.ipynb"""
+    goodreads = pd.read_json(books_path, lines=True, compression="gzip")
+    cols_to_keep = ["work_id", "title", "description", "publication_year", "ratings_count", "average_rating",
+                    "num_pages"]
+    sorted_df = goodreads.sort_values(["work_id", "ratings_count"], ascending=[True, False], kind="stable")
+
+    def get_best_row(group):
+        best_row = group.iloc[0].copy()
+        for col in ["description", "publication_year", "num_pages"]:
+            if pd.isna(best_row[col]) or best_row[col] == "":
+                non_empty = group[(~group[col].isna()) & (group[col] != "")]
+                if len(non_empty) > 0:
+                    best_row[col] = non_empty.iloc[0][col]
+        return best_row
+
+    best_rows = [get_best_row(group) for _, group in sorted_df.groupby("work_id")]
+    max_ratings_data = pd.DataFrame(best_rows)[cols_to_keep]
+    agg_stats = goodreads.groupby("work_id").agg({"ratings_count": "sum", "average_rating": "mean"}).reset_index()
+    works = max_ratings_data.merge(agg_stats, on="work_id", suffixes=("_orig", ""))[cols_to_keep]
+    description_criterion = works[works["description"].apply(lambda x: len(x) != 0)]["work_id"]
+    language_criterion = goodreads[goodreads["language_code"].apply(
+        lambda x: x in ["", "eng", "en-US", "en-GB", "en-CA"])]["work_id"]
+    return works[works["work_id"].isin(description_criterion) & works["work_id"].isin(language_criterion)]
+
+
+def works_digest(works):
+    """Comparable summary of an aggregated works table"""
+    works = works.sort_values("work_id")
+    return {
+        "work_ids": works["work_id"].astype(int).tolist()[:200],
+        "n": len(works),
+        "descriptions": works["description"].astype(str).tolist()[:200],
+        "years": [None if pd.isna(y) or y == "" else int(y) for y in works["publication_year"]][:200],
+        "ratings_count": int(works["ratings_count"].astype(int).sum()),
+        "average_rating": round(float(works["average_rating"].astype(float).sum()), 4)
+    }
+
+
+def child(variant, books_path, interactions_path, tmp):
+    import goodreads_pipeline
+    start = time.perf_counter()
+    if variant == "notebook-interactions":
+        lookup_csv = os.path.join(tmp, "work_id_book_id_dict.csv")
+        notebook_lookup_csv(books_path, lookup_csv)
+        start = time.perf_counter()
+        work_ids = notebook_interactions(interactions_path, lookup_csv, os.path.join(tmp, "interactions.csv"))
+        result = {"work_id_sum": float(np.nansum(work_ids)), "unmapped": int(np.isnan(work_ids).sum())}
+    elif variant == "pipeline-interactions":
+        books = goodreads_pipeline.read_books(books_path, log=lambda message: None)
+        lookup_path = os.path.join(tmp, "book_work_ids.parquet")
+        goodreads_pipeline.book_work_lookup(books).to_parquet(lookup_path, index=False)
+        del books
+        start = time.perf_counter()
+        out_path = os.path.join(tmp, "interactions.parquet")
+        goodreads_pipeline.process_interactions(interactions_path, lookup_path, out_path, chunk_mb=16,
+                                                log=lambda message: None)
+        work_ids = pd.read_parquet(out_path, columns=["work_id"])["work_id"].to_numpy(dtype=float, na_value=np.nan)
+        result = {"work_id_sum": float(np.nansum(work_ids)), "unmapped": int(np.isnan(work_ids).sum())}
+    elif variant == "notebook-books":
+        result = works_digest(notebook_books(books_path))
+    else:
+        books = goodreads_pipeline.read_books(books_path, log=lambda message: None)
+        result = works_digest(goodreads_pipeline.aggregate_works(books))
+    result["seconds"] = time.perf_counter() - start
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", choices=VARIANTS)
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--interactions", type=int, default=2_000_000)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, os.path.join(args.dir, "books.json.gz"),
+              os.path.join(args.dir, "interactions.json.gz"), args.dir)
+        return
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Writing {args.books} books and {args.interactions} interactions")
+        write_dumps(tmp, args.books, args.interactions)
+        results = {}
+        for variant in VARIANTS:
+            result = subprocess.run([sys.executable, __file__, "--child", variant, "--dir", tmp],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"{variant}: failed\n{result.stderr[-2000:]}")
+                ok = False
+                continue
+            results[variant] = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"{variant:<22} {results[variant]['seconds']:8.2f}s peak_rss={results[variant]['peak_rss_mb']:8.1f}MB")
+
+    for kind in ["interactions", "books"]:
+        notebook, pipeline = results.get(f"notebook-{kind}"), results.get(f"pipeline-{kind}")
+        if notebook and pipeline:
+            same = {k: v for k, v in notebook.items() if k not in ("seconds", "peak_rss_mb")} == \
+                   {k: v for k, v in pipeline.items() if k not in ("seconds", "peak_rss_mb")}
+            ok &= same
+            print(f"{kind}: {'pipeline output matches the notebook' if same else 'MISMATCH'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
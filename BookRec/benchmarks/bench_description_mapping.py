@@ -0,0 +1,160 @@
+"""
+Compare peak RSS and wall time of the ways to load the work_id -> description mapping.
+
+    python benchmarks/bench_description_mapping.py --rows 1000000
+
+Needs a PostgreSQL server reachable with the POSTGRES_* settings. The script creates a scratch
+database (--database, reused if it already holds --rows rows) with a synthetic books table,
+then runs each variant in a fresh subprocess so peak RSS is measured cleanly:
+  - fetchall: the previous implementation (RealDictCursor + fetchall, then a second dict)
+  - stream-dict: get_description_mapping built from the server-side cursor stream
+  - compact: get_compact_description_mapping held in memory
+  - compact-mmap: get_compact_description_mapping saved to disk and memory-mapped
+Every variant must return the same descriptions as fetchall for a sample of work_ids.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+VARIANTS = ["fetchall", "stream-dict", "compact", "compact-mmap"]
+
+
+def fetchall_mapping(connector):
+    """The original get_description_mapping: every row as a dict, then a second full dict"""
+    from psycopg2.extras import RealDictCursor
+    with connector.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT work_id, description FROM books")
+        results = cur.fetchall()
+        mapping = {int(row['work_id']): row['description'] for row in results}
+        return mapping
+
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(variant, database, sample_ids, batch_size):
+    from common import APP_DIR  # noqa: F401 (puts the app on sys.path)
+    from database.postgres_connector import PostgresConnector
+    connector = PostgresConnector()
+    connector.database = database
+    if not connector.connect():
+        sys.exit(1)
+    baseline = rss_mb()
+
+    tmp = tempfile.mkdtemp()
+    start = time.perf_counter()
+    if variant == "fetchall":
+        mapping = fetchall_mapping(connector)
+    elif variant == "stream-dict":
+        mapping = connector.get_description_mapping()
+    elif variant == "compact":
+        mapping = connector.get_compact_description_mapping(batch_size=batch_size)
+    else:
+        mapping = connector.get_compact_description_mapping(path=tmp, batch_size=batch_size)
+    load_time = time.perf_counter() - start
+    peak = rss_mb()
+
+    start = time.perf_counter()
+    sample = {str(work_id): mapping.get(work_id) for work_id in sample_ids}
+    lookup_us = (time.perf_counter() - start) / len(sample_ids) * 1e6
+    shutil.rmtree(tmp, ignore_errors=True)
+    connector.close()
+
+    print(json.dumps({
+        "entries": len(mapping),
+        "load_s": load_time,
+        "peak_rss_mb": peak,
+        "delta_rss_mb": peak - baseline,
+        "lookup_us": lookup_us,
+        "sample": sample
+    }))
+
+
+def prepare_database(database, rows, avg_length):
+    """Create the scratch database and fill books(work_id, description) with synthetic text"""
+    from common import APP_DIR  # noqa: F401
+    import psycopg2
+    from database.postgres_connector import PostgresConnector
+    settings = PostgresConnector()
+    conn_args = dict(host=settings.host, port=settings.port, user=settings.user, password=settings.password)
+
+    admin = psycopg2.connect(dbname=settings.database, **conn_args)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", [database])
+        if cur.fetchone() is None:
+            cur.execute(f'CREATE DATABASE "{database}"')
+    admin.close()
+
+    conn = psycopg2.connect(dbname=database, **conn_args)
+    with conn, conn.cursor() as cur:
+        cur.execute("CREATE TABLE IF NOT EXISTS books (work_id INTEGER, description TEXT)")
+        cur.execute("SELECT count(*) FROM books")
+        if cur.fetchone()[0] != rows:
+            print(f"Generating {rows} synthetic descriptions in '{database}'")
+            cur.execute("TRUNCATE books")
+            # md5 chunks repeated to a random length around avg_length; 1% NULL descriptions
+            cur.execute("""
+                INSERT INTO books (work_id, description)
+                SELECT g,
+                       CASE WHEN g %% 100 = 0 THEN NULL
+                            ELSE repeat(md5(g::text), 1 + (random() * %s)::int) END
+                FROM generate_series(1, %s) g
+            """, [max(1, 2 * avg_length // 32), rows])
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", choices=VARIANTS)
+    parser.add_argument("--database", default="bench_descriptions")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--avg-length", type=int, default=400, help="average description length in characters")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--sample-ids", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.database, json.loads(args.sample_ids), args.batch_size)
+        return
+
+    prepare_database(args.database, args.rows, args.avg_length)
+    sample_ids = np.random.default_rng(0).integers(1, args.rows + 2, args.samples).tolist()
+
+    reference, ok = None, True
+    for variant in VARIANTS:
+        result = subprocess.run(
+            [sys.executable, __file__, "--child", variant, "--database", args.database,
+             "--batch-size", str(args.batch_size), "--sample-ids", json.dumps(sample_ids)],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"{variant}: failed\n{result.stderr[-2000:]}")
+            ok = False
+            continue
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        line = (f"{variant:<13} entries={stats['entries']} load={stats['load_s']:6.2f}s "
+                f"peak_rss={stats['peak_rss_mb']:8.1f}MB (+{stats['delta_rss_mb']:.1f}MB) "
+                f"lookup={stats['lookup_us']:6.2f}us")
+        if reference is None:
+            reference = stats["sample"]
+        else:
+            same = stats["sample"] == reference
+            ok &= same
+            line += " (matches fetchall)" if same else " MISMATCH"
+        print(line)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
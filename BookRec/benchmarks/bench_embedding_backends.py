@@ -0,0 +1,99 @@
+"""
+Compare the torch, onnx and onnx-int8 embedding backends of QdrantConnector.load_model.
+
+    python benchmarks/bench_embedding_backends.py
+
+Each backend runs in a fresh subprocess so import time and peak RSS are measured cleanly.
+Reports load time (imports included), peak RSS, single-query latency, and the cosine similarity
+of each backend's embeddings to the torch embeddings, which must stay within TOLERANCE.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+# Minimum cosine similarity to the torch embedding for every test sentence
+TOLERANCE = {"onnx": 0.9999, "onnx-int8": 0.97}
+SENTENCES = [
+    "a graphic novel about a detective in a rainy city",
+    "superheroes fighting an alien invasion",
+    "a coming of age story about friendship and first love in high school",
+    "manga about cooking",
+    "Batman",
+    "a historical memoir of growing up during the Iranian revolution, told in black and white panels",
+    "space opera with robots, smugglers and a galactic empire",
+    "funny comic strips about a boy and his tiger",
+]
+
+
+def child(backend, out_path, queries):
+    start = time.perf_counter()
+    from common import APP_DIR  # noqa: F401 (puts the app on sys.path)
+    from database.qdrant_connector import QdrantConnector
+    connector = QdrantConnector()
+    connector.batch_window_ms = 0
+    if not connector.load_model(backend=backend):
+        sys.exit(1)
+    load_time = time.perf_counter() - start
+
+    np.save(out_path, np.asarray(connector.model.encode(SENTENCES)))
+    durations = []
+    for i in range(queries):
+        start = time.perf_counter()
+        connector.model.encode(f"{SENTENCES[i % len(SENTENCES)]} {i}")
+        durations.append(time.perf_counter() - start)
+
+    from common import latency_stats
+    print(json.dumps({
+        "load_s": load_time,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        **latency_stats(durations)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child", choices=BACKENDS)
+    parser.add_argument("--out")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.out, args.queries)
+        return
+
+    tmp = tempfile.mkdtemp()
+    embeddings, ok = {}, True
+    for backend in BACKENDS:
+        out = os.path.join(tmp, f"{backend}.npy")
+        result = subprocess.run(
+            [sys.executable, __file__, "--child", backend, "--out", out, "--queries", str(args.queries)],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"{backend}: failed\n{result.stderr[-2000:]}")
+            ok = False
+            continue
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        embeddings[backend] = np.load(out)
+        line = (f"{backend:<10} load={stats['load_s']:6.2f}s rss={stats['peak_rss_mb']:7.1f}MB "
+                f"p50={stats['p50_ms']:7.2f}ms p99={stats['p99_ms']:7.2f}ms")
+        if backend != "torch" and "torch" in embeddings:
+            cosine = (embeddings[backend] * embeddings["torch"]).sum(axis=1) / (
+                np.linalg.norm(embeddings[backend], axis=1) * np.linalg.norm(embeddings["torch"], axis=1))
+            within = bool(cosine.min() >= TOLERANCE[backend])
+            ok &= within
+            line += f" min cosine vs torch={cosine.min():.5f} ({'ok' if within else 'OUT OF TOLERANCE'})"
+        print(line)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
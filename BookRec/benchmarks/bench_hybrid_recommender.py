@@ -0,0 +1,143 @@
+"""
+End-to-end latency of HybridRecommender.recommend against calling the backends one after another.
+
+    python benchmarks/bench_hybrid_recommender.py                 # simulated backends (no services needed)
+    python benchmarks/bench_hybrid_recommender.py --live --query "space opera" --ratings 1001:5,1002:4
+
+The simulated run wraps stand-in connectors that sleep for --cf-ms / --vector-ms / --metadata-ms
+(plus jitter) and return synthetic rows, so the numbers isolate the orchestration: the
+parallel fan-out should cost about max(cf, vector) + metadata instead of cf + vector + metadata.
+A third scenario makes the CF backend slower than its timeout to show graceful degradation.
+--live uses the real connectors configured in .env instead.
+"""
+import argparse
+import time
+
+import numpy as np
+from qdrant_client.http import models
+
+from common import latency_stats, print_row
+from database.hybrid_recommender import HybridRecommender
+
+
+class _Delay:
+    def __init__(self, ms, rng):
+        self.ms = ms
+        self.rng = rng
+
+    def sleep(self):
+        time.sleep(max(0.0, self.ms * (1 + 0.1 * self.rng.standard_normal())) / 1000.0)
+
+
+class SimulatedNeo4j:
+    driver = object()
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def get_ephemeral_recommendations(self, rated_books_data, limit=10, **kwargs):
+        self.delay.sleep()
+        return [{"work_id": str(2000 + i), "title": f"CF book {i}", "cf_score": 5.0 - i * 0.1} for i in range(limit)]
+
+
+class SimulatedQdrant:
+    client = object()
+    local_index = None
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def search_similar_books(self, query_text=None, limit=5, filters=None, **kwargs):
+        self.delay.sleep()
+        # Half of the vector candidates overlap with the CF candidates
+        return [
+            models.ScoredPoint(id=i, version=0, score=0.9 - i * 0.01,
+                               payload={"work_id": 2000 + 2 * i, "title": f"Vector book {i}", "summary": "..."})
+            for i in range(limit)
+        ]
+
+
+class SimulatedPostgres:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def get_books_metadata(self, work_ids, filters=None):
+        self.delay.sleep()
+        return [{"work_id": work_id, "title": f"Book {work_id}", "author_names": "Someone"} for work_id in work_ids]
+
+
+def sequential(recommender, query, ratings, limit):
+    """The naive pipeline: CF, then vector search, then enrichment, one after another"""
+    candidates = limit * recommender.candidate_multiplier
+    cf_rows = recommender._cf_candidates(ratings, None, candidates)
+    vector_rows = recommender._vector_candidates(query, candidates, None)
+    merged = recommender.merge(cf_rows, vector_rows)
+    recommender.pg_conn.get_books_metadata([entry["work_id"] for entry in merged])
+    return merged[:limit]
+
+
+def run(label, fn, requests):
+    durations = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    print_row(label, latency_stats(durations))
+
+
+def parse_ratings(text):
+    ratings = {}
+    for item in filter(None, (text or "").split(",")):
+        work_id, rating = item.split(":")
+        ratings[work_id] = {"rating": float(rating)}
+    return ratings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--cf-ms", type=float, default=120.0)
+    parser.add_argument("--vector-ms", type=float, default=80.0)
+    parser.add_argument("--metadata-ms", type=float, default=15.0)
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--query", default="a graphic novel about a detective in a rainy city")
+    parser.add_argument("--ratings", help="work_id:rating pairs for the live CF query, e.g. 1001:5,1002:4")
+    args = parser.parse_args()
+
+    if args.live:
+        from database.neo4j_connector import Neo4jConnector
+        from database.postgres_connector import PostgresConnector
+        from database.qdrant_connector import QdrantConnector
+        recommender = HybridRecommender(Neo4jConnector(), QdrantConnector(), PostgresConnector())
+        ratings = parse_ratings(args.ratings)
+        recommender.recommend(query_text=args.query, rated_books_data=ratings, limit=args.limit)  # warm-up
+    else:
+        rng = np.random.default_rng(0)
+        recommender = HybridRecommender(
+            SimulatedNeo4j(_Delay(args.cf_ms, rng)),
+            SimulatedQdrant(_Delay(args.vector_ms, rng)),
+            SimulatedPostgres(_Delay(args.metadata_ms, rng)),
+            timeouts={"cf": 2.0, "vector": 2.0, "metadata": 2.0}
+        )
+        ratings = {"1001": {"rating": 5.0}, "1002": {"rating": 4.0}}
+        print(f"Simulated backends: cf={args.cf_ms}ms vector={args.vector_ms}ms metadata={args.metadata_ms}ms")
+
+    run("sequential", lambda: sequential(recommender, args.query, ratings, args.limit), args.requests)
+    run("hybrid (parallel)", lambda: recommender.recommend(
+        query_text=args.query, rated_books_data=ratings, limit=args.limit), args.requests)
+
+    if not args.live:
+        # CF slower than its deadline: results come from the vector search alone
+        recommender.neo4j_conn.delay.ms = 1000.0
+        recommender.timeouts["cf"] = args.vector_ms * 2 / 1000.0
+        result = recommender.recommend(query_text=args.query, rated_books_data=ratings, limit=args.limit)
+        run(f"hybrid, cf timeout {recommender.timeouts['cf']:.2f}s", lambda: recommender.recommend(
+            query_text=args.query, rated_books_data=ratings, limit=args.limit), max(1, args.requests // 5))
+        print(f"degraded={result['degraded']} results={len(result['results'])} "
+              f"sources={sorted({s for r in result['results'] for s in r['sources']})}")
+    recommender.close()
+
+
+if __name__ == "__main__":
+    main()
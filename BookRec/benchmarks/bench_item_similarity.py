@@ -0,0 +1,72 @@
+"""
+Compare the live Cypher collaborative-filtering query with the precomputed item-item index.
+
+    python benchmarks/bench_item_similarity.py                # index only
+    python benchmarks/bench_item_similarity.py --neo4j        # also seed Neo4j (NEO4J_* env) and time Cypher
+
+WARNING: --neo4j deletes everything in the target database before seeding it.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import latency_stats, print_row, seed_neo4j, synthetic_interactions, time_calls
+from database.similarity_index import ItemSimilarityIndex
+
+SIZES = [(2_000, 1_000), (10_000, 5_000), (50_000, 20_000)]
+
+
+def sample_profiles(user_ids, work_ids, ratings, n_samples, rng):
+    """Use real synthetic users' rating sets as the 'temp_user' profiles to score"""
+    users = np.unique(user_ids)
+    profiles = []
+    for user in rng.choice(users, size=min(n_samples, len(users)), replace=False):
+        mask = user_ids == user
+        profiles.append({str(w): {"rating": float(r)} for w, r in zip(work_ids[mask], ratings[mask])})
+    return profiles
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--neo4j", action="store_true", help="Seed Neo4j and time the Cypher query too")
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+
+    connector = None
+    if args.neo4j:
+        from database.neo4j_connector import Neo4jConnector
+        connector = Neo4jConnector()
+        if not connector.connect():
+            return
+
+    rng = np.random.default_rng(1)
+    for n_users, n_books in SIZES:
+        user_ids, work_ids, ratings = synthetic_interactions(n_users, n_books)
+        print(f"\n== {n_users} users, {n_books} books, {len(ratings)} interactions")
+
+        start = time.perf_counter()
+        index = ItemSimilarityIndex.build(user_ids, work_ids, ratings, log=lambda _: None)
+        print(f"index build: {time.perf_counter() - start:.2f}s, {len(index.neighbors)} neighbor entries")
+
+        profiles = sample_profiles(user_ids, work_ids, ratings, args.samples, rng)
+        stats = latency_stats(time_calls(index.recommend, [(p,) for p in profiles]))
+        print_row("item index recommend", stats)
+
+        if connector is not None:
+            seed_neo4j(connector, user_ids, work_ids, ratings)
+
+            def cypher_round_trip(profile):
+                connector.insert_user_ratings("temp_user", profile)
+                connector.get_collaborative_recommendations("temp_user")
+                connector.clear_temp_user("temp_user")
+
+            stats = latency_stats(time_calls(cypher_round_trip, [(p,) for p in profiles]))
+            print_row("cypher get_collaborative_recommendations", stats)
+
+    if connector is not None:
+        connector.close()
+
+
+if __name__ == "__main__":
+    main()
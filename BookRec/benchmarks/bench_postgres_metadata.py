@@ -0,0 +1,194 @@
+"""
+Query plans and latency of get_books_metadata before and after the post-load indexes built by
+database.postgres_ingest.
+
+    python benchmarks/bench_postgres_metadata.py --books 500000
+
+Needs a PostgreSQL server reachable with the POSTGRES_* settings. The script writes synthetic
+books/authors CSVs in the format of the cleaning notebook (Python set reprs for author_ids,
+timestamps for publication_date), loads them into a scratch database (--database) with the COPY
+ingest but without secondary indexes, and then for each filter combination:
+  - times get_books_metadata for pages of random work_ids with the metadata cache disabled
+  - records the plan of the metadata query (EXPLAIN ANALYZE)
+  - times the same filters as a catalogue query (the filters in a WHERE clause), which is what
+    the filter-column indexes are for
+The indexes are then built, the tables analyzed and everything measured again.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from common import APP_DIR, latency_stats, print_row, time_calls
+from database.postgres_connector import BOOKS_METADATA_QUERY, METADATA_FILTERS, PostgresConnector
+from database.postgres_ingest import analyze, create_indexes, ingest
+from database.ttl_cache import TTLCache
+
+FILTER_COMBINATIONS = {
+    "no filters": {},
+    "max_pages": {"max_pages": 150},
+    "min_average_rating": {"min_average_rating": 4.2},
+    "is_ebook + format": {"is_ebook": True, "format": "Paperback"},
+    "min_pub_date + min_rating_count": {"min_pub_date": pd.Timestamp("2010-01-01").date(), "min_rating_count": 5000},
+    "all filters": {"max_pages": 300, "min_pub_date": pd.Timestamp("2000-01-01").date(), "is_ebook": False,
+                    "format": "Paperback", "min_average_rating": 3.5, "min_rating_count": 100}
+}
+
+METADATA_COLUMNS = {key: column for key, (column, _) in METADATA_FILTERS.items()}
+
+SQL_OPERATORS = {
+    "max_pages": "<=", "min_pub_date": ">=", "is_ebook": "=",
+    "format": "=", "min_average_rating": ">=", "min_rating_count": ">="
+}
+
+FORMATS = np.array(["Paperback", "Hardcover", "ebook", "Kindle Edition", "Comic"])
+
+
+def write_csvs(directory, n_books, n_authors, seed=0):
+    """Synthetic books/authors CSVs with the columns and value formats the notebook writes"""
+    rng = np.random.default_rng(seed)
+    authors = pd.DataFrame({
+        "author_id": np.arange(1, n_authors + 1),
+        "name": [f"Author {i}" for i in range(1, n_authors + 1)],
+        "average_rating": rng.uniform(1, 5, n_authors).round(2),
+        "text_reviews_count": rng.integers(0, 1000, n_authors),
+        "ratings_count": rng.integers(0, 10000, n_authors)
+    })
+
+    book_ids = np.arange(1, n_books + 1)
+    n_authors_per_book = rng.integers(1, 4, n_books)
+    author_ids = ["{" + ", ".join(map(str, rng.integers(1, n_authors + 1, k))) + "}" for k in n_authors_per_book]
+    dates = pd.to_datetime("1950-01-01") + pd.to_timedelta(rng.integers(0, 26000, n_books), unit="D")
+    num_pages = pd.Series(rng.integers(20, 1200, n_books), dtype="Int64")
+    num_pages[rng.random(n_books) < 0.1] = pd.NA
+    books = pd.DataFrame({
+        "book_id": book_ids,
+        "work_id": book_ids + 1000,
+        "isbn": book_ids.astype(str),
+        "isbn13": None, "asin": None, "kindle_asin": None,
+        "series_ids": np.where(rng.random(n_books) < 0.3, [f"{{'{i}'}}" for i in book_ids % 5000], None),
+        "format": FORMATS[rng.integers(0, len(FORMATS), n_books)],
+        "publisher": "Publisher",
+        "author_ids": author_ids,
+        "link": [f"https://www.goodreads.com/book/show/{i}" for i in book_ids],
+        "publication_date": list(dates),
+        "publication_year": dates.year, "publication_month": dates.month, "publication_day": dates.day,
+        "title": [f"Book {i}" for i in book_ids],
+        "title_without_series": [f"Book {i}" for i in book_ids],
+        "is_ebook": rng.random(n_books) < 0.3,
+        "average_rating": rng.uniform(1, 5, n_books).round(2),
+        "text_reviews_count": rng.integers(0, 500, n_books),
+        "ratings_count": rng.zipf(1.5, n_books).clip(0, 10**7),
+        "description": "A synthetic description.",
+        "num_pages": num_pages
+    })
+    books_path, authors_path = os.path.join(directory, "books.csv"), os.path.join(directory, "authors.csv")
+    books.to_csv(books_path, index=False)
+    authors.to_csv(authors_path, index=False)
+    return books_path, authors_path
+
+
+def prepare_database(database, books_path, authors_path, schema_path):
+    """(Re)create the scratch database and COPY the CSVs in without secondary indexes"""
+    import psycopg2
+    settings = PostgresConnector()
+    conn_args = dict(host=settings.host, port=settings.port, user=settings.user, password=settings.password)
+
+    admin = psycopg2.connect(dbname=settings.database, **conn_args)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{database}"')
+        cur.execute(f'CREATE DATABASE "{database}"')
+    admin.close()
+
+    conn = psycopg2.connect(dbname=database, **conn_args)
+    ingest(conn, books_path, authors_path, schema_path=schema_path, build_indexes=False,
+           log=lambda message: None)
+    return conn
+
+
+def plan_summary(conn, query, params):
+    """Scan nodes and execution time from EXPLAIN ANALYZE, e.g. 'Seq Scan on books; 35.1ms'"""
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, params)
+        plan = cur.fetchone()[0][0]
+    scans = []
+
+    def walk(node):
+        if "Scan" in node["Node Type"] and node.get("Relation Name"):
+            scans.append(f"{node['Node Type']} on {node['Relation Name']}")
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    return f"{', '.join(dict.fromkeys(scans))}; {plan['Execution Time']:.1f}ms"
+
+
+def catalogue_query(filters):
+    clauses = [f"{METADATA_COLUMNS[key]} {SQL_OPERATORS[key]} %s" for key in filters]
+    where = " AND ".join(clauses) or "TRUE"
+    return f"SELECT work_id FROM books WHERE {where} ORDER BY ratings_count DESC LIMIT 50", list(filters.values())
+
+
+def run_query(conn, query, params):
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        return cur.fetchall()
+
+
+def measure(label, connector, conn, pages, runs):
+    print(f"\n== {label} ==")
+    for name, filters in FILTER_COMBINATIONS.items():
+        args = [(page, filters) for page in pages[:runs]]
+        stats = latency_stats(time_calls(connector.get_books_metadata, args))
+        plan = plan_summary(conn, BOOKS_METADATA_QUERY, [pages[0]])
+        print_row(f"metadata [{name}]", stats, plan)
+
+        query, params = catalogue_query(filters)
+        stats = latency_stats(time_calls(run_query, [(conn, query, params)] * max(1, runs // 10)))
+        print_row(f"catalogue [{name}]", stats, plan_summary(conn, query, params))
+        conn.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database", default="bench_metadata")
+    parser.add_argument("--books", type=int, default=500_000)
+    parser.add_argument("--authors", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=20, help="work_ids per get_books_metadata call")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--schema", default=os.path.join(APP_DIR, "..", "..", "data-processing", "postgres_schema.txt"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        books_path, authors_path = write_csvs(tmp, args.books, args.authors)
+        conn = prepare_database(args.database, books_path, authors_path, args.schema)
+
+    connector = PostgresConnector()
+    connector.database = args.database
+    if not connector.connect():
+        sys.exit(1)
+    # Every call goes to the database
+    connector.metadata_cache = TTLCache(max_entries=0)
+
+    rng = np.random.default_rng(1)
+    pages = [(rng.integers(1, args.books + 1, args.page_size) + 1000).tolist() for _ in range(args.runs)]
+
+    print(f"{args.books} books, {args.authors} authors, {args.page_size} work_ids per call")
+    measure("before indexes", connector, conn, pages, args.runs)
+
+    with conn:
+        timings = create_indexes(conn, log=lambda message: None)
+        analyze(conn)
+    print("\nBuilt " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in timings.items()))
+    measure("after indexes", connector, conn, pages, args.runs)
+
+    conn.close()
+    connector.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Throughput of QdrantConnector searches over REST, gRPC and the async client.
+
+    python benchmarks/bench_qdrant_transports.py                          # in-memory QdrantClient(":memory:")
+    python benchmarks/bench_qdrant_transports.py --url http://localhost:6333  # docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant
+
+Seeds a synthetic `books` collection of random 384-d vectors (WARNING: recreates the collection
+at --url) and times search_similar_books(book_id=...) so no embedding model is needed.
+gRPC is only measured against a real server.
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+
+from common import latency_stats, print_row
+from database.qdrant_connector import QdrantConnector
+
+
+def synthetic_batches(n_points, dim=384, batch_size=1000):
+    rng = np.random.default_rng(0)
+    for start in range(0, n_points, batch_size):
+        ids = list(range(start, min(start + batch_size, n_points)))
+        yield models.Batch(
+            ids=ids,
+            vectors=rng.normal(size=(len(ids), dim)).astype(np.float32).tolist(),
+            payloads=[{"title": f"Book {i}", "summary": "A synthetic summary. " * 10, "work_id": 1000 + i} for i in ids]
+        )
+
+
+VECTORS_CONFIG = models.VectorParams(size=384, distance=models.Distance.COSINE)
+
+
+def seed(client, n_points):
+    client.recreate_collection("books", vectors_config=VECTORS_CONFIG)
+    for batch in synthetic_batches(n_points):
+        client.upsert("books", points=batch)
+
+
+async def seed_async(client, n_points):
+    await client.recreate_collection("books", vectors_config=VECTORS_CONFIG)
+    for batch in synthetic_batches(n_points):
+        await client.upsert("books", points=batch)
+
+
+def connector_for(client=None, async_client=None):
+    connector = QdrantConnector()
+    connector.log = lambda message, level="info": None
+    connector.model = object()  # book_id searches never encode
+    connector.client, connector.async_client = client, async_client
+    return connector
+
+
+def run_sync(connector, ids):
+    durations = []
+    start = time.perf_counter()
+    for book_id in ids:
+        t = time.perf_counter()
+        connector.search_similar_books(book_id=int(book_id), limit=10)
+        durations.append(time.perf_counter() - t)
+    return durations, len(ids) / (time.perf_counter() - start)
+
+
+async def run_async(make_client, ids, concurrency):
+    # Async clients are created inside the event loop that uses them
+    connector = connector_for(async_client=await make_client())
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+
+    async def one(book_id):
+        async with semaphore:
+            t = time.perf_counter()
+            await connector.search_similar_books_async(book_id=int(book_id), limit=10)
+            durations.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in ids))
+    return durations, len(ids) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="Qdrant server URL (default: in-memory client)")
+    parser.add_argument("--points", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    ids = np.random.default_rng(1).integers(0, args.points, args.queries)
+
+    if args.url:
+        rest = QdrantClient(url=args.url, timeout=30)
+        seed(rest, args.points)
+        clients = {"REST": rest, "gRPC": QdrantClient(url=args.url, prefer_grpc=True, timeout=30)}
+
+        async def make_rest():
+            return AsyncQdrantClient(url=args.url, timeout=30)
+
+        async def make_grpc():
+            return AsyncQdrantClient(url=args.url, prefer_grpc=True, timeout=30)
+
+        async_clients = {"async REST": make_rest, "async gRPC": make_grpc}
+    else:
+        # In-memory clients run in process and do not share storage, so each one is seeded
+        rest = QdrantClient(":memory:")
+        seed(rest, args.points)
+        clients = {"in-memory": rest}
+
+        async def make_local():
+            client = AsyncQdrantClient(":memory:")
+            await seed_async(client, args.points)
+            return client
+
+        async_clients = {"async in-memory": make_local}
+
+    print(f"{args.points} points, {args.queries} queries")
+    for label, client in clients.items():
+        durations, qps = run_sync(connector_for(client=client), ids)
+        print_row(f"sync {label}", latency_stats(durations), f"{qps:.0f} q/s")
+    for label, make_client in async_clients.items():
+        durations, qps = asyncio.run(run_async(make_client, ids, args.concurrency))
+        print_row(f"{label} x{args.concurrency}", latency_stats(durations), f"{qps:.0f} q/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Latency of per-user collaborative recommendations with and without the recommendation cache.
+
+    python benchmarks/bench_recommendation_cache.py --users 200 --requests 2000 --cf-ms 150
+
+The Neo4j connector's execute_query is replaced by a simulation that sleeps --cf-ms per CF query
+and scores books from an in-memory ratings table, so the real caching, invalidation and refresh
+code paths run without a database. Requests come from a Zipf distribution over users (a few
+users return often) and every --update-every requests a user rates a new book through
+insert_user_ratings. Variants:
+  - no cache: every request runs the CF query
+  - memory: the in-process LRU tier
+  - memory + sqlite: a second connector shares the SQLite tier, half the requests go to each
+  - refresher: memory tier, with the most active users refreshed before the run
+Every response is checked against a fresh computation from the current ratings, so a stale
+result after insert_user_ratings counts as an error.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from common import APP_DIR, latency_stats, print_row  # noqa: F401 (APP_DIR puts the app on sys.path)
+from database.neo4j_connector import CF_QUERY, INSERT_RATINGS_QUERY, Neo4jConnector
+from database.recommendation_cache import RecommendationCache, RecommendationRefresher
+
+
+class SimulatedGraph:
+    """Ratings table shared by the simulated connectors, like one Neo4j database"""
+
+    def __init__(self, n_users, n_books, ratings_per_user, cf_ms, seed=0):
+        rng = np.random.default_rng(seed)
+        self.ratings = {
+            f"user_{u}": {str(b): float(rng.integers(1, 6)) for b in rng.choice(n_books, ratings_per_user, replace=False)}
+            for u in range(n_users)
+        }
+        self.cf_ms = cf_ms
+        self.queries = 0
+
+    def recommend(self, user_id, limit):
+        """Cheap deterministic stand-in for CF_QUERY: score books by the user's rating sum"""
+        rated = self.ratings.get(user_id, {})
+        seed = int(sum(float(work_id) * rating for work_id, rating in rated.items())) % 100_003
+        books = [str((seed * (i + 7)) % 10_007) for i in range(limit)]
+        return [{"work_id": work_id, "title": f"Book {work_id}", "cf_score": 1.0 / (i + 1)}
+                for i, work_id in enumerate(books) if work_id not in rated]
+
+
+class SimulatedNeo4j(Neo4jConnector):
+    def __init__(self, graph, cache):
+        super().__init__()
+        self.graph = graph
+        self.recommendation_cache = cache
+
+    def execute_query(self, query, parameters=None):
+        parameters = parameters or {}
+        if query == CF_QUERY:
+            self.graph.queries += 1
+            time.sleep(self.graph.cf_ms / 1000)
+            return self.graph.recommend(parameters["user_id"], parameters["limit"])
+        if query == INSERT_RATINGS_QUERY:
+            user = self.graph.ratings.setdefault(parameters["user_id"], {})
+            user.update({r["work_id"]: float(r["rating"]) for r in parameters["ratings"]})
+            return []
+        return []
+
+
+def run(label, connectors, graph, users, updates, limit, refresher=None):
+    graph.queries = 0
+    if refresher is not None:
+        start = time.perf_counter()
+        stats = refresher.refresh_once()
+        print(f"{'':<40} refresher warmed {stats['results']} results in {time.perf_counter() - start:.2f}s")
+        graph.queries = 0
+
+    durations, stale = [], 0
+    for i, user_id in enumerate(users):
+        connector = connectors[i % len(connectors)]
+        if i in updates:
+            connector.insert_user_ratings(user_id, {str(10_000 + i): {"rating": 5}})
+        start = time.perf_counter()
+        result = connector.get_collaborative_recommendations(user_id, limit=limit)
+        durations.append(time.perf_counter() - start)
+        stale += result != graph.recommend(user_id, limit)
+    stats = latency_stats(durations)
+    print_row(label, stats, f"cf_queries={graph.queries} stale={stale}")
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--ratings-per-user", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--zipf", type=float, default=1.3, help="skew of the user distribution")
+    parser.add_argument("--update-every", type=int, default=50, help="a rating change every N requests")
+    parser.add_argument("--cf-ms", type=float, default=150, help="simulated CF query latency")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    users = [f"user_{(u - 1) % args.users}" for u in rng.zipf(args.zipf, args.requests)]
+    updates = set(range(args.update_every, args.requests, args.update_every))
+    print(f"{args.requests} requests from {len(set(users))} distinct users, {len(updates)} rating updates, "
+          f"CF query {args.cf_ms:.0f}ms")
+
+    def graph():
+        return SimulatedGraph(args.users, args.books, args.ratings_per_user, args.cf_ms)
+
+    stale = 0
+    g = graph()
+    uncached = SimulatedNeo4j(g, RecommendationCache(max_entries=0))
+    stale += run("no cache", [uncached], g, users, updates, args.limit)
+
+    g = graph()
+    stale += run("memory", [SimulatedNeo4j(g, RecommendationCache())], g, users, updates, args.limit)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "recommendations.sqlite")
+        g = graph()
+        connectors = [SimulatedNeo4j(g, RecommendationCache(sqlite_path=path)) for _ in range(2)]
+        stale += run("memory + sqlite (2 processes)", connectors, g, users, updates, args.limit)
+        print(f"{'':<40} sqlite hits: {[c.recommendation_cache.sqlite_hits for c in connectors]}")
+
+    g = graph()
+    connector = SimulatedNeo4j(g, RecommendationCache())
+    # Requests from an earlier session tell the refresher who the active users are
+    for user_id in users[:args.requests // 4]:
+        connector.get_collaborative_recommendations(user_id, limit=args.limit)
+    # ...whose results have since expired
+    connector.recommendation_cache.memory.clear()
+    refresher = RecommendationRefresher(connector.recommendation_cache, top_users=args.users // 10)
+    stale += run("refresher", [connector], g, users, updates, args.limit, refresher)
+
+    sys.exit(1 if stale else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Time to first result of the Streamlit search flow: search_similar_books + format_results against
+stream_similar_books, with and without LOG_LEVEL=debug payload logging.
+
+    python benchmarks/bench_result_streaming.py --limit 20 --base-ms 40 --per-hit-ms 4
+
+The Qdrant client is simulated: a search sleeps --base-ms plus --per-hit-ms for every hit
+(search depth and payload transfer grow with the limit) and returns points with full-size
+summaries, so the numbers isolate the order in which results become available. The embedding
+model is a stub; no services are needed.
+"""
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+from qdrant_client.http import models
+
+from common import latency_stats, print_row
+from database.qdrant_connector import QdrantConnector
+
+
+class SimulatedClient:
+    def __init__(self, base_ms, per_hit_ms, summary_chars):
+        self.base_ms = base_ms
+        self.per_hit_ms = per_hit_ms
+        self.summary = "A long synthetic summary. " * (summary_chars // 26)
+
+    def search(self, limit, offset=None, **kwargs):
+        offset = offset or 0
+        time.sleep((self.base_ms + self.per_hit_ms * (offset + limit)) / 1000.0)
+        return [
+            models.ScoredPoint(id=i, version=0, score=1.0 - i * 0.01,
+                               payload={"title": f"Book {i}", "summary": self.summary, "work_id": 1000 + i})
+            for i in range(offset, offset + limit)
+        ]
+
+
+class StubModel:
+    def encode(self, text):
+        return np.ones(384, dtype=np.float32)
+
+
+def connector(client, log_level):
+    conn = QdrantConnector()
+    conn.client = client
+    conn.model = StubModel()
+    conn.encoder = None
+    conn.log_level = log_level
+    conn.log = lambda message, level="info": print(message) if conn.log_enabled(level) else None
+    return conn
+
+
+def blocking(conn, query, limit):
+    start = time.perf_counter()
+    results = conn.format_results(conn.search_similar_books(query_text=query, limit=limit))
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed, len(results)
+
+
+def streaming(conn, query, limit):
+    start = time.perf_counter()
+    first, count = None, 0
+    for _ in conn.stream_similar_books(query_text=query, limit=limit):
+        count += 1
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start, count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--base-ms", type=float, default=40)
+    parser.add_argument("--per-hit-ms", type=float, default=4)
+    parser.add_argument("--summary-chars", type=int, default=4000)
+    args = parser.parse_args()
+
+    client = SimulatedClient(args.base_ms, args.per_hit_ms, args.summary_chars)
+    for label, fn, log_level in (("blocking, LOG_LEVEL=debug", blocking, "debug"),
+                                 ("blocking, LOG_LEVEL=info", blocking, "info"),
+                                 ("streaming, LOG_LEVEL=info", streaming, "info")):
+        conn = connector(client, log_level)
+        firsts, totals = [], []
+        # The payload dump goes to a buffer instead of the terminal, which understates its cost
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            for i in range(args.requests):
+                first, total, count = fn(conn, f"query {i}", args.limit)
+                firsts.append(first)
+                totals.append(total)
+        print_row(f"{label} first", latency_stats(firsts), f"results={count}")
+        print_row(f"{label} all", latency_stats(totals), f"log={len(out.getvalue()) // args.requests} chars/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Recall and latency of collaborative filtering with MinHash/LSH candidate neighbours
+(database.user_lsh) against the exact neighbour search, across graph sizes.
+
+    python benchmarks/bench_user_lsh.py
+    python benchmarks/bench_user_lsh.py --rows-per-band 2 --max-candidates 500
+
+Both variants score with CollaborativeEngine, so the only difference is which users are
+compared with the target: every user sharing a book (exact) or the LSH candidates. Reported:
+  - neighbour recall@K: share of the exact K neighbours with the most common books that LSH returns
+  - recommendation recall@10: share of the exact top-10 books in the LSH top-10
+  - latency of the exact recommend, of the LSH lookup alone and of lookup + scoring
+The run exits with status 1 when scoring restricted to every user differs from the exact scoring.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from bench_collaborative_engine import same_scores, sample_profiles
+from common import latency_stats, print_row, synthetic_interactions
+from database.collaborative_engine import CollaborativeEngine
+from database.user_lsh import UserLSHIndex
+
+SIZES = [(2_000, 1_000), (20_000, 10_000), (100_000, 40_000)]
+
+
+def exact_neighbors(engine, profile, min_common_books, k):
+    """The k users with the most books in common with profile (at least min_common_books)"""
+    ids = np.array([int(w) for w in profile], dtype=np.int64)
+    cols = np.searchsorted(engine.work_ids, ids)
+    cols = cols[(cols < len(engine.work_ids)) & (engine.work_ids[np.minimum(cols, len(engine.work_ids) - 1)] == ids)]
+    common = np.asarray(engine.presence[:, cols].sum(axis=1)).ravel()
+    users = np.flatnonzero(common >= min_common_books)
+    top = users[np.argsort(-common[users], kind="stable")[:k]]
+    return set(engine.user_ids[top])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--num-perm", type=int, default=128)
+    parser.add_argument("--rows-per-band", type=int, default=1)
+    parser.add_argument("--max-candidates", type=int, default=5000)
+    parser.add_argument("--max-bucket", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=50, help="K of the neighbour recall")
+    parser.add_argument("--min-common-books", type=int, default=2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(5)
+    ok = True
+    for n_users, n_books in SIZES:
+        user_ids, work_ids, ratings = synthetic_interactions(n_users, n_books)
+        engine = CollaborativeEngine(user_ids, work_ids, ratings)
+        start = time.perf_counter()
+        index = UserLSHIndex.build(user_ids, work_ids, num_perm=args.num_perm, rows_per_band=args.rows_per_band,
+                                   log=lambda _: None)
+        print(f"\n== {n_users} users, {n_books} books, {len(ratings)} interactions "
+              f"(LSH build {time.perf_counter() - start:.2f}s, {index.bands} bands)")
+
+        # Drop part of each sampled user's history so profiles are not copies of existing users
+        profiles = [{w: d for w, d in p.items() if int(w) % 3} or p
+                    for p in sample_profiles(user_ids, work_ids, ratings, args.samples, rng)]
+
+        # With every user as a candidate the restricted scoring must match the exact one
+        same = all(same_scores(engine.recommend(p, args.min_common_books),
+                               engine.recommend(p, args.min_common_books, candidate_users=engine.user_ids))
+                   for p in profiles[:5])
+        ok &= same
+        print(f"candidate scoring with all users {'matches' if same else 'DOES NOT MATCH'} the exact scoring")
+
+        exact_times, lookup_times, lsh_times = [], [], []
+        neighbor_recall, recommendation_recall, n_candidates = [], [], []
+        for profile in profiles:
+            start = time.perf_counter()
+            exact = engine.recommend(profile, args.min_common_books)
+            exact_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            candidates = index.candidates(list(profile), max_candidates=args.max_candidates,
+                                          max_bucket=args.max_bucket)
+            lookup_times.append(time.perf_counter() - start)
+            approximate = engine.recommend(profile, args.min_common_books, candidate_users=candidates)
+            lsh_times.append(time.perf_counter() - start)
+
+            expected = exact_neighbors(engine, profile, args.min_common_books, args.k)
+            if expected:
+                neighbor_recall.append(len(expected & set(candidates)) / len(expected))
+            if exact:
+                exact_ids = {row["work_id"] for row in exact}
+                recommendation_recall.append(len(exact_ids & {row["work_id"] for row in approximate}) / len(exact_ids))
+            n_candidates.append(len(candidates))
+
+        exact_stats, lsh_stats = latency_stats(exact_times), latency_stats(lsh_times)
+        print_row("exact recommend", exact_stats)
+        print_row("LSH lookup", latency_stats(lookup_times), f"candidates={np.mean(n_candidates):.0f}")
+        print_row("LSH lookup + recommend", lsh_stats)
+        print(f"{'':<40} neighbour recall@{args.k}={np.mean(neighbor_recall):.3f} "
+              f"recommendation recall@10={np.mean(recommendation_recall):.3f}")
+        if lsh_stats["p50_ms"] >= exact_stats["p50_ms"]:
+            print(f"{'':<40} LSH is not faster than the exact search at this size")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
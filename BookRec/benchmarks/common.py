@@ -0,0 +1,91 @@
+"""
+Shared helpers for the benchmark scripts: synthetic Goodreads-shaped data and latency statistics.
+
+Benchmarks are run from the BookRec directory, e.g. `python benchmarks/bench_item_similarity.py`.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+def synthetic_interactions(n_users, n_books, ratings_per_user=20, seed=0):
+    """
+    Generate (user_ids, work_ids, ratings) arrays shaped like the Goodreads comics interactions:
+    book popularity follows a Zipf-like distribution and ratings are integers 1-5 with a
+    per-book bias, so popular books connect most of the graph the way they do in the real data.
+    """
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, n_books + 1) ** 0.8
+    popularity /= popularity.sum()
+    book_bias = rng.normal(3.8, 0.5, n_books)
+
+    counts = np.clip(rng.geometric(1.0 / ratings_per_user, n_users), 1, n_books)
+    user_ids, work_ids, ratings = [], [], []
+    for user, count in enumerate(counts):
+        books = np.unique(rng.choice(n_books, size=count, p=popularity))
+        user_ids.append(np.full(len(books), user))
+        work_ids.append(books)
+        ratings.append(np.clip(np.rint(book_bias[books] + rng.normal(0, 0.8, len(books))), 1, 5))
+
+    user_ids = np.char.add("user_", np.concatenate(user_ids).astype(str))
+    work_ids = np.concatenate(work_ids).astype(np.int64) + 1000
+    return user_ids, work_ids, np.concatenate(ratings).astype(np.float32)
+
+
+def latency_stats(samples):
+    """Return a dict with mean, p50, p95 and p99 (milliseconds) for a list of durations in seconds"""
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "n": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def time_calls(fn, args_list):
+    """Call fn(*args) for each args tuple and return the list of durations in seconds"""
+    durations = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def print_row(label, stats, extra=""):
+    print(f"{label:<40} n={stats['n']:<5} mean={stats['mean_ms']:9.3f}ms p50={stats['p50_ms']:9.3f}ms "
+          f"p95={stats['p95_ms']:9.3f}ms p99={stats['p99_ms']:9.3f}ms {extra}")
+
+
+def seed_neo4j(connector, user_ids, work_ids, ratings, batch_size=10000):
+    """Replace the contents of the Neo4j database behind connector with a synthetic graph"""
+    connector.execute_query("MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS")
+    connector.execute_query("CREATE CONSTRAINT book_unique IF NOT EXISTS FOR (b:Book) REQUIRE b.work_id IS UNIQUE")
+    connector.execute_query("CREATE CONSTRAINT user_unique IF NOT EXISTS FOR (u:User) REQUIRE u.user_id IS UNIQUE")
+    books = [{"work_id": str(w), "title": f"Book {w}"} for w in np.unique(work_ids)]
+    for i in range(0, len(books), batch_size):
+        connector.execute_query(
+            "UNWIND $books AS book MERGE (b:Book {work_id: book.work_id}) SET b.title = book.title",
+            {"books": books[i:i + batch_size]}
+        )
+    rows = [{"user_id": u, "work_id": str(w), "rating": float(r)} for u, w, r in zip(user_ids, work_ids, ratings)]
+    for i in range(0, len(rows), batch_size):
+        connector.execute_query(
+            """
+            UNWIND $rows AS row
+            MERGE (u:User {user_id: row.user_id})
+            WITH u, row
+            MATCH (b:Book {work_id: row.work_id})
+            MERGE (u)-[r:INTERACTED]->(b)
+            SET r.rating = row.rating
+            """,
+            {"rows": rows[i:i + batch_size]}
+        )
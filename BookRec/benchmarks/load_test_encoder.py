@@ -0,0 +1,71 @@
+"""
+Load test for query encoding with and without the micro-batching BatchEncoder.
+
+    python benchmarks/load_test_encoder.py --threads 16 --duration 10
+
+Each thread plays one Streamlit session issuing distinct queries back to back
+(the embedding cache is bypassed). Reports p50/p99 latency and queries per second.
+"""
+import argparse
+import threading
+import time
+
+from sentence_transformers import SentenceTransformer
+
+from common import latency_stats, print_row
+from database.batch_encoder import BatchEncoder
+
+WORDS = ["dragons", "detective", "space", "friendship", "superhero", "romance", "war", "magic",
+         "robots", "high school", "vampires", "history", "mystery", "adventure", "family", "city"]
+
+
+def make_query(thread, i):
+    return f"a graphic novel about {WORDS[(thread + i) % len(WORDS)]} and {WORDS[(thread * 7 + i) % len(WORDS)]} #{i}"
+
+
+def run(encode, threads, duration):
+    """Run `threads` closed-loop clients for `duration` seconds and return (durations, qps)"""
+    durations = [[] for _ in range(threads)]
+    stop_at = time.perf_counter() + duration
+
+    def client(thread):
+        i = 0
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            encode(make_query(thread, i))
+            durations[thread].append(time.perf_counter() - start)
+            i += 1
+
+    workers = [threading.Thread(target=client, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    samples = [d for per_thread in durations for d in per_thread]
+    return samples, len(samples) / duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--batch-window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    model = SentenceTransformer(args.model)
+    model.encode(["warm up"])
+
+    samples, qps = run(model.encode, args.threads, args.duration)
+    print_row(f"unbatched, {args.threads} threads", latency_stats(samples), f"{qps:.1f} q/s")
+
+    encoder = BatchEncoder(model.encode, max_batch_size=args.max_batch_size, batch_window_ms=args.batch_window_ms)
+    samples, qps = run(encoder.encode, args.threads, args.duration)
+    print_row(f"batched ({args.batch_window_ms}ms window), {args.threads} threads", latency_stats(samples),
+              f"{qps:.1f} q/s, mean batch {encoder.stats()['mean_batch_size']}")
+    encoder.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Book-id searches served from database.book_neighbors against an in-memory Qdrant: the saved
+table is picked up without a restart, and a table that names deleted books falls back to the
+live search. Run from the BookRec directory: `python -m pytest tests`.
+"""
+import os
+import sys
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from database.book_neighbors import BookNeighborTable  # noqa: E402
+from database.qdrant_connector import QdrantConnector  # noqa: E402
+
+
+def collection(n=40, dim=8):
+    ids = np.arange(n)
+    vectors = np.random.default_rng(7).normal(size=(n, dim)).astype(np.float32)
+    client = QdrantClient(":memory:")
+    client.create_collection("books", vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE))
+    client.upsert("books", points=[
+        models.PointStruct(id=int(i), vector=vectors[i].tolist(), payload={"title": f"Book {i}", "work_id": 1000 + int(i)})
+        for i in ids
+    ])
+    return client, ids, vectors
+
+
+def connector_for(client, path):
+    connector = QdrantConnector()
+    connector.log = lambda message, level="info": None
+    connector.client, connector.model, connector.collection_name = client, object(), "books"
+    connector.neighbor_table_path, connector.neighbor_table = str(path), None
+    return connector
+
+
+def test_save_switches_versions_atomically(tmp_path):
+    _, ids, vectors = collection()
+    first = BookNeighborTable.build(ids, vectors, k=5, log=lambda _: None)
+    first.save(tmp_path)
+    second = BookNeighborTable.build(ids[:30], vectors[:30], k=5, log=lambda _: None)
+    second.save(tmp_path)
+
+    loaded = BookNeighborTable.load(tmp_path)
+    assert loaded.version == second.version == BookNeighborTable.current_version(tmp_path)
+    assert len(loaded) == 30
+    # The replaced version stays on disk for readers that still have it mapped
+    assert sorted(e for e in os.listdir(tmp_path) if e.startswith("v")) == sorted([first.version, second.version])
+
+
+def test_connector_reloads_a_saved_table_and_skips_a_stale_one(tmp_path):
+    client, ids, vectors = collection()
+    BookNeighborTable.build(ids, vectors, k=5, log=lambda _: None).save(tmp_path)
+    connector = connector_for(client, tmp_path)
+
+    results = connector.search_similar_books(book_id=3, limit=4)
+    assert [p.id for p in results][0] == 3
+    assert connector.neighbor_table_stats()["hits"] == 1
+
+    # Deleted from the collection but still in the table: the live search answers
+    neighbour = results[1].id
+    client.delete("books", points_selector=models.PointIdsList(points=[neighbour]))
+    connector.model = None
+    connector.load_model = lambda: False
+    assert connector.search_similar_books(book_id=3, limit=4) == []
+    assert connector.neighbor_table_stats()["misses"] == 1
+
+    # A refreshed table saved by another process is used on the next lookup
+    keep = ids != neighbour
+    BookNeighborTable.load(tmp_path, mmap=False).refresh(ids[keep], vectors[keep], log=lambda _: None)[0].save(tmp_path)
+    results = connector.search_similar_books(book_id=3, limit=4)
+    assert neighbour not in [p.id for p in results]
+    assert connector.neighbor_table.version == BookNeighborTable.current_version(tmp_path)
+    assert connector.neighbor_table_stats()["hits"] == 2
@@ -0,0 +1,86 @@
+"""
+Incremental rebuilds with database.bulk_embed against an in-memory Qdrant, with a hashing
+stand-in for the embedding model. Run from the BookRec directory: `python -m pytest tests`.
+"""
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from qdrant_client import QdrantClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from database.bulk_embed import embed_books  # noqa: E402
+
+
+class Connector:
+    """The QdrantConnector attributes embed_books reads"""
+    collection_name = "books"
+    backend = "torch"
+    model_name = "stand-in"
+    onnx_model_dir = ""
+
+    def __init__(self):
+        self.client = QdrantClient(":memory:")
+
+
+def encode(texts):
+    return np.stack([
+        np.random.default_rng(int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little"))
+        .normal(size=8) for t in texts
+    ])
+
+
+def write_csv(path, rows):
+    pd.DataFrame(rows, columns=["work_id", "title", "summary"]).to_csv(path, index=False)
+
+
+def points(connector):
+    records, _ = connector.client.scroll("books", limit=1000)
+    return {p.payload["work_id"]: (p.id, p.payload["summary"]) for p in records}
+
+
+def run(connector, path, checkpoint):
+    return embed_books(connector, str(path), chunk_size=20, checkpoint_path=str(checkpoint),
+                       encode=encode, log=lambda message: None)
+
+
+def test_rerun_after_edit_embeds_only_new_and_changed_books(tmp_path):
+    connector, path, checkpoint = Connector(), tmp_path / "books.csv", tmp_path / "books.checkpoint.json"
+    rows = [(1000 + i, f"Book {i}", f"Summary {i}") for i in range(50)]
+    write_csv(path, rows)
+
+    first = run(connector, path, checkpoint)
+    assert (first["rows"], first["embedded"]) == (50, 50)
+    assert not checkpoint.exists()
+    before = points(connector)
+
+    # A new book at the top, an edited summary and a removed book
+    edited = [(999, "New", "New summary"), (1000, "Book 0", "Edited")] + rows[1:-1]
+    write_csv(path, edited)
+    second = run(connector, path, checkpoint)
+    assert (second["rows"], second["embedded"], second["deleted"]) == (50, 2, 1)
+
+    after = points(connector)
+    assert after[1000] == (before[1000][0], "Edited")
+    assert 999 in after and 1049 not in after
+    # Unchanged books keep their point ids although every row moved down by one
+    assert all(after[w][0] == before[w][0] for w in range(1001, 1049))
+
+    third = run(connector, path, checkpoint)
+    assert (third["rows"], third["embedded"], third["deleted"]) == (50, 0, 0)
+
+
+def test_checkpoint_of_a_changed_file_is_not_resumed(tmp_path):
+    connector, path, checkpoint = Connector(), tmp_path / "books.csv", tmp_path / "books.checkpoint.json"
+    write_csv(path, [(1000 + i, f"Book {i}", f"Summary {i}") for i in range(30)])
+    run(connector, path, checkpoint)
+
+    # Checkpoint left by an interrupted run over an older version of the file
+    checkpoint.write_text(json.dumps({"run": {"csv": str(path)}, "rows_done": 20}))
+    write_csv(path, [(2000 + i, f"Other {i}", f"Other summary {i}") for i in range(30)])
+    result = run(connector, path, checkpoint)
+    assert (result["rows"], result["embedded"], result["deleted"]) == (30, 30, 30)
@@ -0,0 +1,41 @@
+"""
+database.embedding_cache: the TTLCache memory tier in front of the shared disk tier.
+Run from the BookRec directory: `python -m pytest tests`.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from database.embedding_cache import EmbeddingCache  # noqa: E402
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    writer = EmbeddingCache(max_entries=2, persist_path=str(tmp_path), namespace="model/torch")
+    for i, text in enumerate(["a", "b", "c"]):
+        writer.put(text, np.full(4, i, dtype=np.float32))
+    assert writer.stats()["memory_entries"] == 2 and writer.stats()["evictions"] == 1
+    assert writer.get("  B ")[0] == 1
+
+    # Another process: served from disk, then from memory
+    reader = EmbeddingCache(max_entries=2, persist_path=str(tmp_path), namespace="model/torch")
+    assert reader.get("a")[0] == 0
+    assert reader.get("a")[0] == 0
+    assert reader.get("d") is None
+    stats = reader.stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+
+    assert EmbeddingCache(persist_path=str(tmp_path), namespace="model/onnx").get("a") is None
+
+
+def test_disk_entries_keep_their_age_in_memory(tmp_path):
+    writer = EmbeddingCache(ttl=0.2, persist_path=str(tmp_path), namespace="model/torch")
+    writer.put("a", np.ones(4, dtype=np.float32))
+    time.sleep(0.1)
+    reader = EmbeddingCache(ttl=0.2, persist_path=str(tmp_path), namespace="model/torch")
+    assert reader.get("a") is not None
+    time.sleep(0.15)
+    assert reader.get("a") is None
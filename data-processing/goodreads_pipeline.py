@@ -0,0 +1,271 @@
+"""
+Scriptable version of the cleaning notebooks that streams the Goodreads JSON-lines dumps in chunks
+and writes typed Parquet files, which the loaders in BookRec/app/database read directly.
+
+    python goodreads_pipeline.py books --books data/goodreads_books_comics_graphic.json.gz \
+        --authors data/goodreads_book_authors.json.gz --out-dir data
+    python goodreads_pipeline.py interactions --interactions data/goodreads_interactions_comics_graphic.json.gz \
+        --lookup data/book_work_ids.parquet --out data/goodreads_interactions_comics_graphic_cleaned.parquet
+
+The books step writes:
+  - book_work_ids.parquet: book_id -> work_id for every book, sorted by book_id
+  - goodreads_books_cleaned.parquet: one row per work (goodreads_data_pipeline.ipynb)
+  - goodreads_books_cleaned_postgres.parquet: the books table, in schema order
+    (goodreads_data_pipeline_postgres.ipynb)
+  - goodreads_authors_cleaned.parquet: the authors table, limited to authors of those books
+The interactions step replaces interactions_work_id.ipynb: book_ids are mapped to work_ids with
+a binary search over the lookup, one chunk at a time.
+"""
+import argparse
+import gzip
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+
+# Same filters as the notebooks
+LANGUAGES = ["", "eng", "en-US", "en-GB", "en-CA"]
+# Taken from another edition of the work when the most rated edition has none
+FILL_COLUMNS = ["description", "publication_year", "num_pages"]
+
+INT_COLUMNS = ["book_id", "work_id", "ratings_count", "text_reviews_count", "num_pages",
+               "publication_year", "publication_month", "publication_day"]
+STRING_COLUMNS = ["isbn", "isbn13", "asin", "kindle_asin", "format", "publisher", "link",
+                  "title", "title_without_series", "description"]
+
+WORKS_COLUMNS = ["work_id", "title", "author_ids", "description", "publication_year",
+                 "ratings_count", "average_rating", "num_pages"]
+POSTGRES_COLUMNS = ["book_id", "work_id", "isbn", "isbn13", "asin", "kindle_asin", "series_ids", "format",
+                    "publisher", "author_ids", "link", "publication_date", "publication_year",
+                    "publication_month", "publication_day", "title", "title_without_series", "is_ebook",
+                    "average_rating", "text_reviews_count", "ratings_count", "description", "num_pages"]
+
+INTERACTIONS_SCHEMA = pa.schema([
+    ("user_id", pa.string()),
+    ("book_id", pa.int64()),
+    ("review_id", pa.string()),
+    ("is_read", pa.bool_()),
+    ("rating", pa.int8()),
+    ("date_added", pa.timestamp("s", tz="UTC")),
+    ("date_updated", pa.timestamp("s", tz="UTC")),
+    ("read_at", pa.timestamp("s", tz="UTC")),
+    ("started_at", pa.timestamp("s", tz="UTC")),
+    ("work_id", pa.int64())
+])
+# e.g. "Tue Dec 05 10:24:37 -0800 2017"
+GOODREADS_DATE_FORMAT = "%a %b %d %H:%M:%S %z %Y"
+
+
+def iter_json_lines(path, chunk_mb=64):
+    """
+    Yield DataFrames from a (gzipped) JSON-lines file, about chunk_mb MB of (uncompressed) JSON
+    at a time. Each chunk is cut at a line break and parsed by Arrow's multithreaded JSON reader;
+    values keep their JSON types.
+    """
+    opener = gzip.open if str(path).endswith(".gz") else open
+    rest = b""
+    with opener(path, "rb") as f:
+        while True:
+            block = f.read(chunk_mb << 20)
+            data = rest + block
+            if block:
+                cut = data.rfind(b"\n") + 1
+                data, rest = data[:cut], data[cut:]
+            if data.strip():
+                yield pa_json.read_json(io.BytesIO(data)).to_pandas()
+            if not block:
+                return
+
+
+def _ints(series):
+    """Nullable Int64 from JSON strings or numbers ("" and garbage become NA)"""
+    return pd.to_numeric(series, errors="coerce").astype("Int64")
+
+
+def _strings(series):
+    return series.astype(object).where(series.notna() & (series != ""), None)
+
+
+def _books_chunk(chunk):
+    """Typed columns for one chunk of the books dump"""
+    out = pd.DataFrame(index=chunk.index)
+    for column in INT_COLUMNS:
+        out[column] = _ints(chunk[column])
+    for column in STRING_COLUMNS:
+        out[column] = _strings(chunk[column])
+    out["average_rating"] = pd.to_numeric(chunk["average_rating"], errors="coerce")
+    out["is_ebook"] = chunk["is_ebook"].astype(str) == "true"
+    out["language_code"] = chunk["language_code"].fillna("").astype(str)
+    # The nested lists are the only per-row Python left
+    out["author_ids"] = [[int(author["author_id"]) for author in authors] for authors in chunk["authors"]]
+    out["series_ids"] = [[int(s) for s in series] for series in chunk["series"]]
+    return out
+
+
+def read_books(path, chunk_mb=64, log=print):
+    chunks, start = [], time.perf_counter()
+    for chunk in iter_json_lines(path, chunk_mb):
+        chunks.append(_books_chunk(chunk))
+        log(f"Books: {sum(len(c) for c in chunks)} rows read ({time.perf_counter() - start:.1f}s)")
+    return pd.concat(chunks, ignore_index=True)
+
+
+def book_work_lookup(books):
+    """book_id -> work_id for every book with a work, sorted by book_id"""
+    lookup = books.loc[books["work_id"].notna(), ["book_id", "work_id"]].astype("int64")
+    return lookup.drop_duplicates("book_id").sort_values("book_id").reset_index(drop=True)
+
+
+def aggregate_works(books):
+    """
+    One row per work, like the notebooks: the edition with the most ratings, FILL_COLUMNS taken
+    from the first edition (in that order) that has them, ratings_count summed and
+    average_rating averaged over the editions. Only works with a description and at least
+    one edition in LANGUAGES are kept.
+    """
+    books = books.dropna(subset=["work_id"])
+    books = books.sort_values(["work_id", "ratings_count"], ascending=[True, False], kind="stable")
+    grouped = books.groupby("work_id", sort=True)
+
+    works = books.drop_duplicates("work_id").set_index("work_id")
+    # first() skips nulls, so this is the best edition's value unless it is missing
+    works[FILL_COLUMNS] = grouped[FILL_COLUMNS].first()
+    works["ratings_count"] = grouped["ratings_count"].sum()
+    works["average_rating"] = grouped["average_rating"].mean()
+
+    english = books.loc[books["language_code"].isin(LANGUAGES), "work_id"].unique()
+    works = works[works["description"].notna() & works.index.isin(english)]
+    return works.reset_index()
+
+
+def postgres_books(works):
+    """The books table: publication_date from year/month/day (month and day default to 1)"""
+    books = works.copy()
+    parts = pd.DataFrame({
+        "year": books["publication_year"],
+        "month": books["publication_month"].fillna(1),
+        "day": books["publication_day"].fillna(1)
+    })
+    dates = pd.to_datetime(parts.where(books["publication_year"].notna()).astype("float"), errors="coerce")
+    books["publication_date"] = dates.dt.date.where(dates.notna(), None)
+    for column in ["author_ids", "series_ids"]:
+        books[column] = books[column].map(lambda ids: ids if len(ids) else None)
+    return books[POSTGRES_COLUMNS]
+
+
+def read_authors(path, author_ids, chunk_mb=64):
+    """Authors of the given books, with whitespace in names collapsed"""
+    chunks = []
+    for chunk in iter_json_lines(path, chunk_mb):
+        ids = _ints(chunk["author_id"])
+        chunk = chunk[ids.isin(author_ids).to_numpy()]
+        chunks.append(pd.DataFrame({
+            "author_id": _ints(chunk["author_id"]),
+            "name": chunk["name"].astype(str).str.replace(r"\s+", " ", regex=True).str.strip(),
+            "average_rating": pd.to_numeric(chunk["average_rating"], errors="coerce"),
+            "text_reviews_count": _ints(chunk["text_reviews_count"]),
+            "ratings_count": _ints(chunk["ratings_count"])
+        }))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def process_books(books_path, out_dir, authors_path=None, chunk_mb=64, log=print):
+    os.makedirs(out_dir, exist_ok=True)
+    books = read_books(books_path, chunk_mb, log)
+
+    book_work_lookup(books).to_parquet(os.path.join(out_dir, "book_work_ids.parquet"), index=False)
+    works = aggregate_works(books)
+    log(f"{len(books)} books -> {len(works)} works")
+    works[WORKS_COLUMNS].to_parquet(os.path.join(out_dir, "goodreads_books_cleaned.parquet"), index=False)
+    postgres = postgres_books(works)
+    postgres.to_parquet(os.path.join(out_dir, "goodreads_books_cleaned_postgres.parquet"), index=False)
+
+    if authors_path:
+        author_ids = np.unique(np.concatenate([ids for ids in postgres["author_ids"] if ids is not None]))
+        authors = read_authors(authors_path, author_ids, chunk_mb)
+        authors.to_parquet(os.path.join(out_dir, "goodreads_authors_cleaned.parquet"), index=False)
+        log(f"{len(authors)} authors")
+
+
+def map_work_ids(book_ids, lookup_book_ids, lookup_work_ids):
+    """Vectorized book_id -> work_id through the sorted lookup arrays; unknown books get NA"""
+    book_ids = np.asarray(book_ids, dtype=np.int64)
+    if not len(lookup_book_ids):
+        return pd.arrays.IntegerArray(np.zeros(len(book_ids), dtype=np.int64), np.ones(len(book_ids), dtype=bool))
+    pos = np.minimum(np.searchsorted(lookup_book_ids, book_ids), len(lookup_book_ids) - 1)
+    found = lookup_book_ids[pos] == book_ids
+    return pd.arrays.IntegerArray(np.where(found, lookup_work_ids[pos], 0), ~found)
+
+
+def _dates(series):
+    return pd.to_datetime(series.where(series != ""), format=GOODREADS_DATE_FORMAT, errors="coerce", utc=True)
+
+
+def process_interactions(interactions_path, lookup_path, out_path, chunk_mb=64, log=print):
+    """
+    Stream the interactions dump into a Parquet file, one row group per chunk, with work_id
+    attached. Returns the number of rows written.
+    """
+    lookup = pd.read_parquet(lookup_path)
+    lookup_book_ids = lookup["book_id"].to_numpy(dtype=np.int64)
+    lookup_work_ids = lookup["work_id"].to_numpy(dtype=np.int64)
+
+    rows, unmapped, start = 0, 0, time.perf_counter()
+    with pq.ParquetWriter(out_path, INTERACTIONS_SCHEMA) as writer:
+        for chunk in iter_json_lines(interactions_path, chunk_mb):
+            book_ids = _ints(chunk["book_id"])
+            chunk = chunk[book_ids.notna().to_numpy()].reset_index(drop=True)
+            book_ids = book_ids.dropna().to_numpy(dtype=np.int64)
+            work_ids = map_work_ids(book_ids, lookup_book_ids, lookup_work_ids)
+            frame = pd.DataFrame({
+                "user_id": chunk["user_id"].astype(str),
+                "book_id": book_ids,
+                "review_id": chunk["review_id"].astype(str),
+                "is_read": chunk["is_read"].astype(bool),
+                "rating": pd.to_numeric(chunk["rating"], errors="coerce").fillna(0).astype(np.int8),
+                **{column: _dates(chunk[column]) for column in ["date_added", "date_updated", "read_at", "started_at"]},
+                "work_id": work_ids
+            })
+            writer.write_table(pa.Table.from_pandas(frame, schema=INTERACTIONS_SCHEMA, preserve_index=False))
+            rows += len(frame)
+            unmapped += int(work_ids.isna().sum())
+            elapsed = time.perf_counter() - start
+            log(f"Interactions: {rows} rows written ({rows / elapsed:.0f} rows/s)")
+    if unmapped:
+        log(f"{unmapped} interactions have no work_id")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean the Goodreads JSON-lines dumps into Parquet files")
+    steps = parser.add_subparsers(dest="step", required=True)
+
+    books = steps.add_parser("books", help="books (and authors) dump -> works, Postgres tables and book_id lookup")
+    books.add_argument("--books", required=True, help="e.g. data/goodreads_books_comics_graphic.json.gz")
+    books.add_argument("--authors", help="e.g. data/goodreads_book_authors.json.gz")
+    books.add_argument("--out-dir", default="data")
+    books.add_argument("--chunk-mb", type=int, default=64, help="MB of JSON parsed at a time")
+
+    interactions = steps.add_parser("interactions", help="interactions dump -> interactions with work_id")
+    interactions.add_argument("--interactions", required=True,
+                              help="e.g. data/goodreads_interactions_comics_graphic.json.gz")
+    interactions.add_argument("--lookup", default="data/book_work_ids.parquet", help="written by the books step")
+    interactions.add_argument("--out", default="data/goodreads_interactions_comics_graphic_cleaned.parquet")
+    interactions.add_argument("--chunk-mb", type=int, default=64, help="MB of JSON parsed at a time")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.step == "books":
+        process_books(args.books, args.out_dir, args.authors, args.chunk_mb)
+    else:
+        process_interactions(args.interactions, args.lookup, args.out, args.chunk_mb)
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()